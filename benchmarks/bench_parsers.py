@@ -0,0 +1,88 @@
+"""
+Benchmark Kraken and Kaiju report parsing on large synthetic reports
+
+Each report is parsed by parse_report, and by the row-by-row parser it
+replaced, kept here as baseline_parse_report, to report the speedup.
+
+Usage:
+    python benchmarks/bench_parsers.py [n_taxa] [repeats]
+"""
+
+import sys
+from collections import defaultdict
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from timeit import repeat
+from typing import Dict
+
+from numpy import nan
+from pandas import read_table
+from synthetic import generate_dataset
+
+from microview.file_finder import Sample
+from microview.parse_taxonomy import parse_report
+
+
+def baseline_parse_report(sample: Sample) -> Dict:
+    """
+    Parse a report the way MicroView did before parsing column-wise
+    """
+    header = None if sample.report_type == "kraken" else 0
+    df = read_table(sample.report, header=header).replace({"None": nan}, regex=True)
+
+    stats: Dict = defaultdict(lambda: {"n_reads": 0, "percent": 0})
+    stats.update({"assigned": {}})
+
+    if sample.report_type == "kaiju":
+        for row in df.itertuples():
+            row_dict = {"n_reads": row.reads, "percent": row.percent}
+            if row.taxon_name == "unclassified":
+                stats.update({"unclassified": row_dict})
+            elif row.taxon_name.startswith("cannot"):
+                stats.update({"cannot be assigned": row_dict})
+            else:
+                taxon_name = list(filter(None, row.taxon_name.split(";")))[-1]
+                stats["assigned"][taxon_name] = row_dict
+    else:
+        df.columns = [
+            "percent",
+            "reads_root",
+            "reads",
+            "rank_code",
+            "taxid",
+            "taxon_name",
+        ]
+        for row in df.itertuples():
+            row_dict = {"n_reads": row.reads, "percent": row.percent}
+            if row.rank_code == "U":
+                stats.update({"unclassified": row_dict})
+            elif row.reads > 0:
+                stats["assigned"][row.taxon_name.strip()] = row_dict
+
+    return stats
+
+
+def main(n_taxa: int = 50_000, repeats: int = 5) -> None:
+    with TemporaryDirectory() as tmp:
+        samples = [
+            Sample(report=report, report_type=report_type)
+            for report_type in ["kraken", "kaiju"]
+            for report in generate_dataset(
+                Path(tmp), 1, n_taxa, report_type=report_type
+            )
+        ]
+
+        print("report\ttaxa\tbaseline\tcurrent\tspeedup")
+        for sample in samples:
+            baseline, current = [
+                min(repeat(lambda: parse(sample), number=1, repeat=repeats))
+                for parse in [baseline_parse_report, parse_report]
+            ]
+            print(
+                f"{sample.report_type}\t{n_taxa}\t{baseline:.3f}s\t{current:.3f}s"
+                f"\t{baseline / current:.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
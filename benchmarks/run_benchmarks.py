@@ -0,0 +1,221 @@
+"""
+Benchmark every stage of MicroView on a synthetic cohort
+
+Each stage is timed separately, best of --repeats runs, and its peak
+memory is measured in one extra run under tracemalloc, so tracing
+doesn't skew the timings. Results are saved as JSON, and can be
+compared against the results of a previous version with --compare.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--samples N] [--taxa N] [--depth N]
+        [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import platform
+import resource
+import sys
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Dict
+
+from rich.console import Console
+from synthetic import generate_dataset
+
+from microview import __version__
+from microview.file_finder import detect_report_type
+from microview.parse_taxonomy import (
+    calculate_abund_diver,
+    get_taxon_counts,
+    parse_reports,
+    summarize_tax_data,
+)
+from microview.plotting import generate_taxo_plots
+from microview.rendering import render_base
+
+STAGES = [
+    "detect_report_type",
+    "parse_reports",
+    "get_taxon_counts",
+    "calculate_abund_diver",
+    "summarize_tax_data",
+    "generate_taxo_plots",
+    "render_base",
+]
+
+
+def run_pipeline(
+    report_dir: Path, output_dir: Path, jobs: int = 1, trace_memory: bool = False
+) -> Dict[str, Dict]:
+    """
+    Run every stage once, as the CLI would
+
+    Args:
+        report_dir (Path): Directory with the reports
+        output_dir (Path): Directory to write tables and the report to
+        jobs (int): Number of worker processes
+        trace_memory (bool): Measure the peak memory allocated by each stage.
+            Allocations made in worker processes aren't seen.
+
+    Returns:
+        dict: Dict with the 'time' (and 'peak_memory', in bytes) of each stage
+    """
+    results = {}
+
+    def stage(name, func, *args, **kwargs):
+        if trace_memory:
+            tracemalloc.start()
+        start = perf_counter()
+        result = func(*args, **kwargs)
+        results[name] = {"time": perf_counter() - start}
+        if trace_memory:
+            results[name]["peak_memory"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return result
+
+    console = Console(stderr=True, quiet=True)
+    output_path = output_dir / "microview_report.html"
+    report_paths = sorted(report_dir.glob("*txt"))
+
+    samples = stage("detect_report_type", detect_report_type, report_paths, console)
+    parsed_stats = stage("parse_reports", parse_reports, samples, jobs)
+    counts = stage("get_taxon_counts", get_taxon_counts, parsed_stats)
+    abund_div_df, betadiv_pcoa = stage(
+        "calculate_abund_diver", calculate_abund_diver, counts
+    )
+    tax_data = stage(
+        "summarize_tax_data", summarize_tax_data, counts, abund_div_df, betadiv_pcoa
+    )
+    tax_plots = stage(
+        "generate_taxo_plots", generate_taxo_plots, tax_data, output_path=output_path
+    )
+    stage(
+        "render_base",
+        render_base,
+        tax_plots=tax_plots,
+        dir_path=report_dir,
+        output_path=output_path,
+    )
+
+    return results
+
+
+def run_benchmarks(
+    report_dir: Path, output_dir: Path, repeats: int = 3, jobs: int = 1
+) -> Dict[str, Dict]:
+    """
+    Time every stage, best of repeats runs, then measure its peak memory
+
+    Returns:
+        dict: Dict with the best 'time', every run's 'times' and the
+            'peak_memory' of each stage
+    """
+    runs = [run_pipeline(report_dir, output_dir, jobs) for _ in range(repeats)]
+    memory = run_pipeline(report_dir, output_dir, jobs, trace_memory=True)
+
+    return {
+        name: {
+            "time": min(run[name]["time"] for run in runs),
+            "times": [run[name]["time"] for run in runs],
+            "peak_memory": memory[name]["peak_memory"],
+        }
+        for name in STAGES
+    }
+
+
+def compare(results: Dict, baseline: Dict) -> None:
+    """
+    Print the time and peak memory of each stage relative to a baseline
+    """
+    print(
+        f"Compared to MicroView {baseline['microview_version']} "
+        f"({baseline['date']}):"
+    )
+    print(f"{'stage':<24}{'baseline':>12}{'current':>12}{'time':>8}{'memory':>8}")
+    for name, stage in results["stages"].items():
+        if name not in baseline["stages"]:
+            continue
+        base = baseline["stages"][name]
+        time_ratio = stage["time"] / base["time"] if base["time"] else float("nan")
+        memory_ratio = (
+            stage["peak_memory"] / base["peak_memory"]
+            if base["peak_memory"]
+            else float("nan")
+        )
+        print(
+            f"{name:<24}{base['time']:>11.3f}s{stage['time']:>11.3f}s"
+            f"{time_ratio:>7.2f}x{memory_ratio:>7.2f}x"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--taxa", type=int, default=1000, help="Taxa per sample")
+    parser.add_argument("--depth", type=int, default=7, help="Taxonomy depth")
+    parser.add_argument("--type", choices=["kraken", "kaiju", "mixed"], default="mixed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=None,
+        help="Benchmark existing reports instead of generating them",
+    )
+    parser.add_argument("-o", "--output", type=Path, default=Path("benchmark.json"))
+    parser.add_argument(
+        "--compare", type=Path, default=None, help="Previous results to compare to"
+    )
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmp:
+        report_dir = args.data_dir
+        if report_dir is None:
+            report_dir = Path(tmp, "reports")
+            generate_dataset(
+                report_dir, args.samples, args.taxa, args.depth, args.type, args.seed
+            )
+        output_dir = Path(tmp, "output")
+        output_dir.mkdir()
+
+        stages = run_benchmarks(report_dir, output_dir, args.repeats, args.jobs)
+
+    results = {
+        "microview_version": __version__,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "parameters": {
+            "samples": args.samples,
+            "taxa": args.taxa,
+            "depth": args.depth,
+            "type": args.type,
+            "seed": args.seed,
+            "repeats": args.repeats,
+            "jobs": args.jobs,
+            "data_dir": None if args.data_dir is None else str(args.data_dir),
+        },
+        "stages": stages,
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        * (1 if sys.platform == "darwin" else 1024),
+    }
+    args.output.write_text(json.dumps(results, indent=2))
+
+    for name, stage in stages.items():
+        print(
+            f"{name:<24}{stage['time']:>8.3f}s{stage['peak_memory'] / 1024**2:>9.1f}MB"
+        )
+    print(f"Results saved to {args.output}")
+
+    if args.compare is not None:
+        compare(results, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Generate synthetic Kraken and Kaiju reports for benchmarking
+
+Every report draws its taxa from the leaves of one shared synthetic
+taxonomy, so samples overlap like real cohorts do.
+
+Usage:
+    python benchmarks/synthetic.py OUTPUT_DIR [--samples N] [--taxa N] [--depth N]
+"""
+
+import argparse
+from dataclasses import dataclass
+from math import ceil
+from pathlib import Path
+from random import Random
+from typing import List
+
+RANK_CODES = ["D", "K", "P", "C", "O", "F", "G", "S"]
+
+
+@dataclass
+class Taxonomy:
+    """
+    Synthetic taxonomy, as parallel lists indexed by node
+
+    Node 0 is the root, leaves are the nodes at the deepest level.
+    """
+
+    names: List[str]
+    parents: List[int]
+    ranks: List[str]
+    depths: List[int]
+    children: List[List[int]]
+    leaves: List[int]
+
+
+def rank_code(depth: int, max_depth: int) -> str:
+    """
+    Get a Kraken rank code for a node depth, leaves being species
+    """
+    if depth == 0:
+        return "R"
+    offset = len(RANK_CODES) - max_depth
+    return RANK_CODES[max(depth - 1 + offset, 0)] if offset >= 0 else "-"
+
+
+def make_taxonomy(n_leaves: int, depth: int = 7) -> Taxonomy:
+    """
+    Build a balanced taxonomy with n_leaves leaves, depth levels below the root
+
+    Args:
+        n_leaves (int): Number of leaf taxa
+        depth (int): Number of levels below the root
+
+    Returns:
+        Taxonomy: The synthetic taxonomy
+    """
+    branching = max(2, ceil(n_leaves ** (1 / depth)))
+    level_sizes = [n_leaves]
+    for _ in range(depth - 1):
+        level_sizes.insert(0, ceil(level_sizes[0] / branching))
+
+    names, parents, ranks, depths = ["root"], [-1], ["R"], [0]
+    previous_level = [0]
+    for level, size in enumerate(level_sizes, start=1):
+        current_level = []
+        for i in range(size):
+            node = len(names)
+            parent_index = min(i * len(previous_level) // size, len(previous_level) - 1)
+            names.append(f"Taxon {level}.{i}")
+            parents.append(previous_level[parent_index])
+            ranks.append(rank_code(level, depth))
+            depths.append(level)
+            current_level.append(node)
+        previous_level = current_level
+
+    children: List[List[int]] = [[] for _ in names]
+    for node, parent in enumerate(parents):
+        if parent >= 0:
+            children[parent].append(node)
+
+    return Taxonomy(names, parents, ranks, depths, children, previous_level)
+
+
+def lineage(taxonomy: Taxonomy, node: int) -> List[str]:
+    """
+    Get the names from the first level down to a node
+    """
+    names = []
+    while node > 0:
+        names.append(taxonomy.names[node])
+        node = taxonomy.parents[node]
+    return names[::-1]
+
+
+def sample_counts(taxonomy: Taxonomy, n_taxa: int, rng: Random) -> dict:
+    """
+    Draw read counts for n_taxa random leaves
+    """
+    leaves = rng.sample(taxonomy.leaves, min(n_taxa, len(taxonomy.leaves)))
+    return {leaf: int(rng.lognormvariate(3, 1.5)) + 1 for leaf in leaves}
+
+
+def write_kraken_report(
+    path: Path, taxonomy: Taxonomy, counts: dict, unclassified: int
+) -> None:
+    """
+    Write a Kraken-style report, with clade counts and indented names
+    """
+    clade = [0] * len(taxonomy.names)
+    for leaf, reads in counts.items():
+        node = leaf
+        while node >= 0:
+            clade[node] += reads
+            node = taxonomy.parents[node]
+
+    total = clade[0] + unclassified
+    lines = [
+        f"{100 * unclassified / total:6.2f}\t{unclassified}\t{unclassified}\tU\t0\tunclassified"
+    ]
+
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        direct = counts.get(node, 0)
+        name = "  " * taxonomy.depths[node] + taxonomy.names[node]
+        lines.append(
+            f"{100 * clade[node] / total:6.2f}\t{clade[node]}\t{direct}\t"
+            f"{taxonomy.ranks[node]}\t{node + 1}\t{name}"
+        )
+        stack.extend(
+            child for child in reversed(taxonomy.children[node]) if clade[child] > 0
+        )
+
+    path.write_text("\n".join(lines) + "\n")
+
+
+def write_kaiju_report(
+    path: Path, taxonomy: Taxonomy, counts: dict, unclassified: int
+) -> None:
+    """
+    Write a kaiju2table-style report, with semicolon-separated lineages
+    """
+    total = sum(counts.values()) + unclassified
+    lines = ["file\tpercent\treads\ttaxon_id\ttaxon_name"]
+    for leaf, reads in sorted(counts.items(), key=lambda item: -item[1]):
+        lines.append(
+            f"{path.stem}.out\t{100 * reads / total:.6f}\t{reads}\t{leaf + 1}\t"
+            + ";".join(lineage(taxonomy, leaf))
+            + ";"
+        )
+    lines.append(
+        f"{path.stem}.out\t{100 * unclassified / total:.6f}\t{unclassified}\tNA\tunclassified"
+    )
+
+    path.write_text("\n".join(lines) + "\n")
+
+
+def generate_dataset(
+    output_dir: Path,
+    n_samples: int,
+    taxa_per_sample: int,
+    depth: int = 7,
+    report_type: str = "kraken",
+    seed: int = 0,
+) -> List[Path]:
+    """
+    Write a synthetic cohort of reports
+
+    Args:
+        output_dir (Path): Directory to write reports to
+        n_samples (int): Number of reports to write
+        taxa_per_sample (int): Number of leaf taxa with reads in each report
+        depth (int): Number of taxonomy levels below the root
+        report_type (str): 'kraken', 'kaiju' or 'mixed', alternating both
+        seed (int): Seed for the random number generator
+
+    Returns:
+        list: Paths to the written reports
+    """
+    rng = Random(seed)
+    taxonomy = make_taxonomy(taxa_per_sample * 2, depth)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    for i in range(n_samples):
+        counts = sample_counts(taxonomy, taxa_per_sample, rng)
+        unclassified = rng.randint(0, sum(counts.values()) // 10)
+
+        sample_type = report_type
+        if report_type == "mixed":
+            sample_type = "kraken" if i % 2 == 0 else "kaiju"
+
+        path = output_dir / f"sample_{i:06d}_{sample_type}.txt"
+        if sample_type == "kraken":
+            write_kraken_report(path, taxonomy, counts, unclassified)
+        else:
+            write_kaiju_report(path, taxonomy, counts, unclassified)
+        paths.append(path)
+
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--taxa", type=int, default=1000, help="Taxa per sample")
+    parser.add_argument("--depth", type=int, default=7, help="Taxonomy depth")
+    parser.add_argument(
+        "--type", choices=["kraken", "kaiju", "mixed"], default="kraken"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = generate_dataset(
+        args.output_dir, args.samples, args.taxa, args.depth, args.type, args.seed
+    )
+    print(f"Wrote {len(paths)} reports to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
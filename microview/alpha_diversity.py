@@ -0,0 +1,207 @@
+"""
+MicroView module for calculating alpha diversity from sparse count matrices
+"""
+
+from functools import cached_property
+from typing import Callable, Dict, List, Optional
+
+from numpy import (
+    arange,
+    asarray,
+    bincount,
+    diff,
+    errstate,
+    float64,
+    log,
+    nan,
+    ndarray,
+    repeat,
+    where,
+)
+from scipy.sparse import csr_matrix
+
+# Counts up to which ACE considers a taxon rare
+ACE_RARE_THRESHOLD = 10
+
+
+class SparseRows:
+    """
+    Nonzero counts of each row of a sparse count matrix
+
+    Quantities several metrics need, like relative abundances, are
+    calculated once for every row, and shared by every metric.
+    """
+
+    def __init__(self, matrix: csr_matrix):
+        self.matrix = matrix
+        self.data = matrix.data.astype(float64)
+
+    @property
+    def n_rows(self) -> int:
+        return self.matrix.shape[0]
+
+    @cached_property
+    def rows(self) -> ndarray:
+        """
+        Row of each nonzero count
+        """
+        return repeat(arange(self.n_rows), diff(self.matrix.indptr))
+
+    def row_sum(self, values) -> ndarray:
+        """
+        Sum values of every nonzero count within each row
+        """
+        return bincount(self.rows, values, minlength=self.n_rows)
+
+    @cached_property
+    def totals(self) -> ndarray:
+        return self.row_sum(self.data)
+
+    @cached_property
+    def freqs(self) -> ndarray:
+        """
+        Relative abundance of each nonzero count within its row
+        """
+        return self.data / self.totals[self.rows]
+
+    @cached_property
+    def observed(self) -> ndarray:
+        return self.matrix.getnnz(axis=1)
+
+    @cached_property
+    def entropy(self) -> ndarray:
+        """
+        Shannon entropy of each row, in nats
+        """
+        return self.row_sum(-self.freqs * log(self.freqs))
+
+    @cached_property
+    def dominance(self) -> ndarray:
+        """
+        Sum of squared relative abundances of each row
+        """
+        return self.row_sum(self.freqs**2)
+
+
+def observed(rows: SparseRows) -> ndarray:
+    """
+    Number of taxa with reads
+    """
+    return rows.observed
+
+
+def shannon(rows: SparseRows, base: int = 2) -> ndarray:
+    """
+    Shannon's diversity index, equivalent to scikit-bio's shannon
+    """
+    return rows.entropy / log(base)
+
+
+def pielou(rows: SparseRows) -> ndarray:
+    """
+    Pielou's evenness, Shannon's index over its maximum for the taxa observed
+
+    Samples with a single taxon, or none, have no diversity to be even,
+    and get 0 instead of scikit-bio's NaN.
+    """
+    return where(rows.observed > 1, rows.entropy / log(rows.observed), 0.0)
+
+
+def simpson(rows: SparseRows) -> ndarray:
+    """
+    Simpson's diversity index, 1 - dominance, as scikit-bio's simpson
+
+    Samples without reads have no dominance, and get NaN.
+    """
+    return where(rows.observed > 0, 1 - rows.dominance, nan)
+
+
+def inverse_simpson(rows: SparseRows) -> ndarray:
+    """
+    Inverse Simpson's index, 1 / dominance, as scikit-bio's enspie
+
+    Samples without reads have no dominance, and get NaN.
+    """
+    return where(rows.observed > 0, 1 / rows.dominance, nan)
+
+
+def berger_parker(rows: SparseRows) -> ndarray:
+    """
+    Berger-Parker dominance, the relative abundance of the most abundant taxon
+    """
+    return rows.matrix.max(axis=1).toarray().ravel() / rows.totals
+
+
+def chao1(rows: SparseRows) -> ndarray:
+    """
+    Bias-corrected Chao1 richness estimate, as scikit-bio's chao1
+    """
+    singles = rows.row_sum(rows.data == 1)
+    doubles = rows.row_sum(rows.data == 2)
+    return rows.observed + singles * (singles - 1) / (2 * (doubles + 1))
+
+
+def ace(rows: SparseRows, rare_threshold: int = ACE_RARE_THRESHOLD) -> ndarray:
+    """
+    Abundance-based Coverage Estimator of richness, as scikit-bio's ace
+
+    Samples whose rare taxa are all singletons have no estimate, and get NaN.
+    """
+    rare = rows.data <= rare_threshold
+    s_rare = rows.row_sum(rare)
+    s_abund = rows.observed - s_rare
+    n_rare = rows.row_sum(rows.data * rare)
+    singles = rows.row_sum(rows.data == 1)
+
+    coverage = 1 - singles / n_rare
+    top = s_rare * rows.row_sum(rows.data * (rows.data - 1) * rare)
+    bottom = coverage * n_rare * (n_rare - 1)
+    gamma = (top / bottom - 1).clip(min=0)
+
+    estimate = s_abund + s_rare / coverage + singles / coverage * gamma
+    estimate[coverage == 0] = nan
+    # Without rare taxa there's nothing to estimate
+    return where(s_rare == 0, s_abund, estimate)
+
+
+# Alpha diversity metrics, by the name of their column in results
+ALPHA_METRICS: Dict[str, Callable[[SparseRows], ndarray]] = {
+    "Shannon Diversity": shannon,
+    "N Taxas": observed,
+    "Pielou Evenness": pielou,
+    "Simpson": simpson,
+    "Inverse Simpson": inverse_simpson,
+    "Berger-Parker": berger_parker,
+    "Chao1": chao1,
+    "ACE": ace,
+}
+
+
+def alpha_diversity(
+    matrix: csr_matrix, metrics: Optional[List[str]] = None
+) -> Dict[str, ndarray]:
+    """
+    Calculate alpha diversity metrics of every row of a sparse count matrix
+
+    Every metric is calculated for all rows at once, visiting only their
+    nonzero counts.
+
+    Args:
+        matrix (csr_matrix): Sample by taxon count matrix, without explicit zeros
+        metrics (List[str]): Names of the metrics to calculate, keys of
+            ALPHA_METRICS, or every metric if None.
+
+    Returns:
+        dict: Values of each metric, by name, for every row.
+    """
+    if metrics is None:
+        metrics = list(ALPHA_METRICS)
+
+    unknown = [metric for metric in metrics if metric not in ALPHA_METRICS]
+    if len(unknown) > 0:
+        raise ValueError(f"Unknown alpha diversity metrics: {', '.join(unknown)}")
+
+    rows = SparseRows(matrix)
+    # Empty rows and undefined estimates give NaN or inf, rather than warnings
+    with errstate(divide="ignore", invalid="ignore"):
+        return {metric: asarray(ALPHA_METRICS[metric](rows)) for metric in metrics}
@@ -0,0 +1,250 @@
+"""
+MicroView module for rendering many reports from one manifest
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from pandas import DataFrame, read_csv
+
+from microview.cache import ReportCache
+from microview.defaults import (
+    DEFAULT_MAX_BAR_SAMPLES,
+    DEFAULT_PCOA_DIMENSIONS,
+    DEFAULT_TOP_TAXA,
+)
+from microview.file_finder import detect_report_type, validate_paths
+from microview.parallel import parallel_map
+from microview.plotting import generate_taxo_plots
+from microview.profiling import Profiler, profile_stage
+from microview.rendering import preload_assets, render_base, write_assets
+from microview.state import (
+    AggregateState,
+    load_state,
+    save_state,
+    summarize_subset,
+    update_state,
+)
+
+MANIFEST_COLUMNS = ["report", "sample", "output"]
+
+# Aggregate state and settings of the current worker process
+_worker_state: Dict = {}
+
+
+@dataclass
+class BatchReport:
+    """
+    A report to render, from a subset of the samples in a manifest
+
+    Groups, when given, follow the order of samples.
+    """
+
+    name: str
+    output: Path
+    samples: List[Path]
+    groups: Optional[List[str]] = None
+
+    def contrast_df(self) -> Optional[DataFrame]:
+        """
+        Get the sample groups as a contrast table, like parse_source_table's
+        """
+        if self.groups is None:
+            return None
+        return DataFrame({"sample": self.samples, "group": self.groups})
+
+
+def read_manifest(manifest: Path) -> List[BatchReport]:
+    """
+    Read the reports to render from a manifest
+
+    The manifest is a CSV table with one row per sample of each report,
+    and the columns report (the report name), sample (the path to a
+    classification result) and output (the report file), plus an optional
+    group column. Relative paths are relative to the manifest.
+
+    Since tables are written next to each report, and samples are told
+    apart by file name, every report must be written to its own directory,
+    and different samples must have different file names.
+
+    Args:
+        manifest (Path): Path to the manifest
+
+    Returns:
+        List[BatchReport]: Reports in the order they first appear in.
+    """
+    manifest = Path(manifest)
+    df = read_csv(manifest, dtype=str)
+
+    missing = [column for column in MANIFEST_COLUMNS if column not in df.columns]
+    if len(missing) > 0:
+        raise Exception(f"Manifest is missing the columns: {', '.join(missing)}")
+
+    reports: List[BatchReport] = []
+    for name, rows in df.groupby("report", sort=False):
+        outputs = rows["output"].unique()
+        if len(outputs) > 1:
+            raise Exception(f"Report {name} has more than one output path")
+
+        samples = validate_paths([Path(sample) for sample in rows["sample"]], manifest)
+        reports.append(
+            BatchReport(
+                name=name,
+                output=manifest.parent.resolve().joinpath(outputs[0]),
+                samples=[sample.resolve() for sample in samples],
+                groups=rows["group"].tolist() if "group" in df.columns else None,
+            )
+        )
+
+    output_dirs = [report.output.parent for report in reports]
+    if len(set(output_dirs)) < len(output_dirs):
+        raise Exception("Each report must be written to a different directory")
+
+    sample_paths = {sample for report in reports for sample in report.samples}
+    if len({sample.name for sample in sample_paths}) < len(sample_paths):
+        raise Exception("Different samples must have different file names")
+
+    return reports
+
+
+def _init_worker(state: AggregateState, dir_path: Path, options: Dict):
+    preload_assets()
+    _worker_state.update(state=state, dir_path=dir_path, options=options)
+
+
+def _render_task(report: BatchReport) -> Path:
+    state = _worker_state["state"]
+    options = _worker_state["options"]
+
+    # Samples that weren't valid reports were left out of the state
+    sample_index = state.counts.sample_index
+    rows = [
+        sample_index[sample.name]
+        for sample in report.samples
+        if sample.name in sample_index
+    ]
+    tax_data = summarize_subset(
+        state,
+        rows,
+        options["pcoa_method"],
+        options["pcoa_dimensions"],
+        options["top_taxa"],
+        options["top_taxa_mode"],
+    )
+
+    report.output.parent.mkdir(parents=True, exist_ok=True)
+    tax_plots = generate_taxo_plots(
+        tax_data,
+        report.contrast_df(),
+        output_path=report.output,
+        table_format=options["table_format"],
+        max_bar_samples=options["max_bar_samples"],
+    )
+    render_base(
+        tax_plots=tax_plots,
+        dir_path=_worker_state["dir_path"],
+        output_path=report.output,
+        assets=options["assets"],
+        assets_dir=options["assets_dir"],
+        include_mathjax=options["include_mathjax"],
+    )
+
+    return report.output
+
+
+def run_batch(
+    reports: List[BatchReport],
+    dir_path: Path,
+    console,
+    strict_validation: bool = False,
+    jobs: int = 1,
+    cache: Optional[ReportCache] = None,
+    state_path: Optional[Path] = None,
+    profiler: Optional[Profiler] = None,
+    pcoa_method: str = "auto",
+    pcoa_dimensions: int = DEFAULT_PCOA_DIMENSIONS,
+    table_format: str = "tsv",
+    max_bar_samples: int = DEFAULT_MAX_BAR_SAMPLES,
+    assets: str = "embed",
+    assets_dir: Optional[Path] = None,
+    include_mathjax: bool = True,
+    rank: Optional[str] = None,
+    top_taxa: int = DEFAULT_TOP_TAXA,
+    top_taxa_mode: str = "sample",
+) -> List[Path]:
+    """
+    Render many reports, sharing the work their samples have in common
+
+    Every unique sample is detected and parsed once, and its alpha diversity
+    and distances to every other sample calculated once, in an aggregate
+    state. Each report then only takes its samples' rows of the state, and
+    runs its own PCoA, plots and rendering, in parallel with the others.
+
+    Args:
+        reports (List[BatchReport]): Reports to render, as read by read_manifest
+        dir_path (Path): Path shown as the source of the reports
+        console (rich.Console): Console to print messages to
+        strict_validation (bool): Fully validate reports instead of sniffing them.
+        jobs (int): Number of worker processes, 0 meaning one per available CPU.
+        cache (ReportCache): Cache of previously parsed reports, if any.
+        state_path (Path): Path to a file with the aggregate state of a previous
+            run, updated with every sample in the manifest.
+        profiler (Profiler): Profiler to record each stage with, if any.
+        pcoa_method (str): 'exact', 'approximate' or 'auto', see
+            microview.ordination.run_pcoa
+        pcoa_dimensions (int): Number of PCoA axes calculated when approximating.
+        table_format (str): Format to write tables in, one of TABLE_FORMATS
+        max_bar_samples (int): Number of samples above which bar plots bin samples
+        assets (str): 'embed' or 'external', see microview.rendering.render_base
+        assets_dir (Path): Directory to write shared assets to, if any.
+        include_mathjax (bool): Load MathJax in the reports
+        rank (str): Rank code to roll Kraken-style counts up to, if any.
+        top_taxa (int): Number of most common taxa to show for each sample
+        top_taxa_mode (str): 'sample' or 'global', see
+            microview.parse_taxonomy.get_common_taxas
+
+    Returns:
+        List[Path]: Paths to the rendered reports
+    """
+    unique_samples = list(
+        dict.fromkeys(sample for report in reports for sample in report.samples)
+    )
+
+    with profile_stage(profiler, "detect_report_type"):
+        samples = detect_report_type(
+            unique_samples, console, strict_validation, jobs, cache
+        )
+
+    with profile_stage(profiler, "update_state"):
+        previous = load_state(state_path, rank) if state_path is not None else None
+        state = update_state(previous, samples, jobs, cache, profiler, rank)
+        if state_path is not None:
+            save_state(state, state_path, rank)
+
+    if assets == "external" and assets_dir is not None:
+        # Written once here, rather than by every worker at the same time
+        write_assets(assets_dir)
+
+    options = dict(
+        pcoa_method=pcoa_method,
+        pcoa_dimensions=pcoa_dimensions,
+        table_format=table_format,
+        max_bar_samples=max_bar_samples,
+        assets=assets,
+        assets_dir=assets_dir,
+        include_mathjax=include_mathjax,
+        top_taxa=top_taxa,
+        top_taxa_mode=top_taxa_mode,
+    )
+    with profile_stage(profiler, "render_reports"):
+        try:
+            return parallel_map(
+                _render_task,
+                reports,
+                jobs,
+                initializer=_init_worker,
+                initargs=(state, dir_path, options),
+            )
+        finally:
+            _worker_state.clear()
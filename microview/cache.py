@@ -0,0 +1,230 @@
+"""
+MicroView module for caching parsed reports on disk
+"""
+
+import json
+import os
+import pickle
+from hashlib import sha256
+from pathlib import Path
+from time import time
+from typing import Dict, Optional
+
+from microview import __version__
+
+DEFAULT_CACHE_DIR = (
+    Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "microview"
+)
+
+# Default maximum size of cached entries, in bytes
+DEFAULT_CACHE_SIZE = 1024**3
+
+# Bump whenever the pickled entries change shape
+CACHE_FORMAT = 4
+
+
+def hash_file(path: Path, block_size: int = 1024**2) -> str:
+    """
+    Hash the contents of a file
+
+    Args:
+        path (Path): Path to the file to hash
+        block_size (int): Number of bytes read at a time
+
+    Returns:
+        str: Hex digest of the SHA-256 of the file contents
+    """
+    digest = sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ReportCache:
+    """
+    Persistent cache of parsed reports and their detected types
+
+    Entries are stored under the hash of a report's contents. An index
+    maps each report path to its size, modification time and content
+    hash, so unchanged reports are found with a single stat call and
+    only new or modified reports are hashed.
+
+    The whole cache is cleared when the MicroView version changes, and
+    the least recently used entries are evicted once their total size
+    exceeds max_size.
+
+    Args:
+        cache_dir (Path): Directory to keep the cache in
+        max_size (int): Maximum total size of cached entries, in bytes
+    """
+
+    def __init__(self, cache_dir: Path, max_size: int = DEFAULT_CACHE_SIZE):
+        self.cache_dir = Path(cache_dir)
+        self.entries_dir = self.cache_dir / "entries"
+        self.index_path = self.cache_dir / "index.json"
+        self.max_size = max_size
+
+        self.entries_dir.mkdir(parents=True, exist_ok=True)
+        self.index = self._load_index()
+        self._hashes: Dict[Path, str] = {}
+
+    def _empty_index(self) -> Dict:
+        return {
+            "version": __version__,
+            "format": CACHE_FORMAT,
+            "paths": {},
+            "entries": {},
+        }
+
+    def _load_index(self) -> Dict:
+        try:
+            index = json.loads(self.index_path.read_text())
+        except (OSError, ValueError):
+            index = None
+
+        if (
+            index is None
+            or index.get("version") != __version__
+            or index.get("format") != CACHE_FORMAT
+        ):
+            self.clear()
+            return self._empty_index()
+
+        return index
+
+    def clear(self) -> None:
+        """
+        Remove every cached entry
+        """
+        for entry in self.entries_dir.glob("*.pkl"):
+            entry.unlink()
+        self.index = self._empty_index()
+
+    def key(self, report: Path) -> str:
+        """
+        Get the cache key of a report
+
+        The content hash recorded for a path is reused while the report's
+        size and modification time don't change.
+
+        Args:
+            report (Path): Path to the report
+
+        Returns:
+            str: The report's content hash
+        """
+        report = Path(report).resolve()
+        if report in self._hashes:
+            return self._hashes[report]
+
+        stat = report.stat()
+        recorded = self.index["paths"].get(str(report))
+        if (
+            recorded is not None
+            and recorded["size"] == stat.st_size
+            and recorded["mtime_ns"] == stat.st_mtime_ns
+        ):
+            content_hash = recorded["hash"]
+        else:
+            content_hash = hash_file(report)
+            self.index["paths"][str(report)] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "hash": content_hash,
+            }
+
+        self._hashes[report] = content_hash
+        return content_hash
+
+    def report_type(self, report: Path) -> Optional[str]:
+        """
+        Get the cached type of a report, without loading its parsed stats
+
+        Args:
+            report (Path): Path to the report
+
+        Returns:
+            str: The report type, or None if it isn't cached.
+        """
+        entry = self.index["entries"].get(self.key(report))
+        return None if entry is None else entry["report_type"]
+
+    def get(self, report: Path) -> Optional[Dict]:
+        """
+        Get the cached entry of a report
+
+        Args:
+            report (Path): Path to the report
+
+        Returns:
+            dict: Dict with the 'report_type' and parsed 'stats' of the
+                report, or None if it isn't cached.
+        """
+        content_hash = self.key(report)
+        if content_hash not in self.index["entries"]:
+            return None
+
+        try:
+            with open(self.entries_dir / f"{content_hash}.pkl", "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            del self.index["entries"][content_hash]
+            return None
+
+        self.index["entries"][content_hash]["last_used"] = time()
+        return entry
+
+    def put(self, report: Path, report_type: str, stats) -> None:
+        """
+        Cache the detected type and parsed stats of a report
+
+        Args:
+            report (Path): Path to the report
+            report_type (str): The detected report type
+            stats (SampleStats): The parsed report
+        """
+        content_hash = self.key(report)
+        entry_path = self.entries_dir / f"{content_hash}.pkl"
+
+        with open(entry_path, "wb") as f:
+            pickle.dump(
+                {"report_type": report_type, "stats": stats},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+
+        self.index["entries"][content_hash] = {
+            "report_type": report_type,
+            "size": entry_path.stat().st_size,
+            "last_used": time(),
+        }
+
+    def evict(self) -> None:
+        """
+        Remove least recently used entries until the cache fits max_size
+        """
+        entries = self.index["entries"]
+        total_size = sum(entry["size"] for entry in entries.values())
+
+        for content_hash in sorted(entries, key=lambda h: entries[h]["last_used"]):
+            if total_size <= self.max_size:
+                break
+            total_size -= entries.pop(content_hash)["size"]
+            (self.entries_dir / f"{content_hash}.pkl").unlink(missing_ok=True)
+
+        self.index["paths"] = {
+            path: recorded
+            for path, recorded in self.index["paths"].items()
+            if recorded["hash"] in entries
+        }
+
+    def save(self) -> None:
+        """
+        Evict entries over the size limit and persist the index
+        """
+        self.evict()
+
+        tmp_path = self.index_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(self.index))
+        os.replace(tmp_path, self.index_path)
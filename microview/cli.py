@@ -1,14 +1,59 @@
 from pathlib import Path
+from typing import Optional, Tuple
 
 import rich_click as click
 from click_option_group import RequiredMutuallyExclusiveOptionGroup, optgroup
 from rich.console import Console
 
 from microview import __version__ as mv_version
-from microview.file_finder import find_reports, parse_source_table
-from microview.parse_taxonomy import get_tax_data
-from microview.plotting import generate_taxo_plots
-from microview.rendering import render_base
+from microview.cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE, ReportCache
+from microview.defaults import (
+    APPROXIMATE_PCOA_THRESHOLD,
+    ASSET_MODES,
+    DEFAULT_ASSETS_DIR,
+    DEFAULT_HOST,
+    DEFAULT_HTML_CACHE_SIZE,
+    DEFAULT_MAX_BAR_SAMPLES,
+    DEFAULT_PCOA_DIMENSIONS,
+    DEFAULT_PORT,
+    DEFAULT_TOP_TAXA,
+    PCOA_METHODS,
+    RANKS,
+    TABLE_FORMATS,
+    TOP_TAXA_MODES,
+)
+from microview.profiling import Profiler, profile_stage
+
+# Stages are imported as they run, rather than here, so that --help,
+# --version and bad arguments don't wait on scikit-bio, plotly and frictionless
+
+
+def check_table_format(ctx, param, table_format: str) -> str:
+    """
+    Check that binary table formats can be written, before any work is done
+    """
+    if table_format != "tsv":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise click.BadParameter(
+                f"writing {table_format} tables requires pyarrow, "
+                "install it with 'pip install pyarrow'"
+            )
+    return table_format
+
+
+def print_profile(console, profiler: Optional[Profiler], profile_trace: Path) -> None:
+    """
+    Print the profile summary and write its trace, if profiling
+    """
+    if profiler is None:
+        return
+
+    console.print(profiler.summary())
+    if profile_trace is not None:
+        profiler.save(profile_trace)
+        console.print(f"\n Profile trace written to {profile_trace}\n")
 
 
 @click.command(context_settings=dict(help_option_names=["-h", "--help"]))
@@ -30,6 +75,12 @@ from microview.rendering import render_base
     type=click.Path(path_type=Path),
     help="2-column CSV table (sample,group) with taxonomy classification results paths",
 )
+@optgroup.option(
+    "-m",
+    "--manifest",
+    type=click.Path(path_type=Path),
+    help="CSV table (report,sample,output[,group]) of many reports to render at once, ignores -o",
+)
 @click.option(
     "-o",
     "--output",
@@ -37,7 +88,180 @@ from microview.rendering import render_base
     help="Report file name",
     type=click.Path(path_type=Path, writable=True, resolve_path=True),
 )
-def main(taxonomy: Path, csv_file: Path, output: Path) -> None:
+@click.option(
+    "--table-format",
+    default="tsv",
+    show_default=True,
+    type=click.Choice(TABLE_FORMATS),
+    callback=check_table_format,
+    help="Format to write tables in, along with the count matrix as counts.npz",
+)
+@click.option(
+    "--max-bar-samples",
+    default=DEFAULT_MAX_BAR_SAMPLES,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of samples above which bar plots average bins of samples",
+)
+@click.option(
+    "--top-taxa",
+    default=DEFAULT_TOP_TAXA,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of most common taxa shown for each sample",
+)
+@click.option(
+    "--top-taxa-mode",
+    default="sample",
+    show_default=True,
+    type=click.Choice(TOP_TAXA_MODES),
+    help="Show each sample's own most common taxa, or, for every sample, the taxa most common across samples",
+)
+@click.option(
+    "--strict-validation",
+    is_flag=True,
+    default=False,
+    help="Fully validate every report against its schema instead of sniffing its first rows",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    type=click.IntRange(min=0),
+    help="Number of processes to validate and parse reports with, 0 to use all CPUs",
+)
+@click.option(
+    "--state",
+    "state_path",
+    default=None,
+    type=click.Path(path_type=Path, dir_okay=False),
+    help="File to keep aggregate results in, so reruns only compute metrics for new samples",
+)
+@click.option(
+    "--pcoa-method",
+    default="auto",
+    show_default=True,
+    type=click.Choice(PCOA_METHODS),
+    help=(
+        "Calculate every PCoA axis exactly, or only the first ones approximately; "
+        f"auto approximates above {APPROXIMATE_PCOA_THRESHOLD} samples"
+    ),
+)
+@click.option(
+    "--pcoa-dimensions",
+    default=DEFAULT_PCOA_DIMENSIONS,
+    show_default=True,
+    type=click.IntRange(min=2),
+    help="Number of PCoA axes calculated when approximating",
+)
+@click.option(
+    "--rank",
+    default=None,
+    type=click.Choice(RANKS, case_sensitive=False),
+    help="Count Kraken reads under the taxa of a single rank, e.g. S for species, instead of under the taxa they were assigned to",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Print the wall time, CPU time and peak memory of every stage",
+)
+@click.option(
+    "--profile-trace",
+    default=None,
+    type=click.Path(path_type=Path, dir_okay=False, writable=True),
+    help="Write a JSON trace of every stage and parsed report, implies --profile",
+)
+@optgroup.group(
+    "Report assets", help="How the report loads its stylesheets and scripts"
+)
+@optgroup.option(
+    "--assets",
+    default="embed",
+    show_default=True,
+    type=click.Choice(ASSET_MODES),
+    help="Embed assets in the report, or write them once to a shared directory and link to them",
+)
+@optgroup.option(
+    "--assets-dir",
+    default=None,
+    type=click.Path(path_type=Path, file_okay=False),
+    help=f"Directory to write shared assets to with --assets external [default: {DEFAULT_ASSETS_DIR} next to the report]",
+)
+@optgroup.option(
+    "--no-mathjax",
+    "include_mathjax",
+    is_flag=True,
+    default=True,
+    flag_value=False,
+    help="Leave MathJax out of the report, no plot needs it",
+)
+@optgroup.group("Report discovery", help="How reports are found in the -t directory")
+@optgroup.option(
+    "-r",
+    "--recursive",
+    is_flag=True,
+    default=False,
+    help="Also find reports in every subdirectory",
+)
+@optgroup.option(
+    "--include",
+    multiple=True,
+    help="Glob pattern report files match, relative to the directory, can be repeated [default: *txt and compressed *txt files]",
+)
+@optgroup.option(
+    "--exclude",
+    multiple=True,
+    help="Glob pattern of files or subdirectories to leave out, can be repeated",
+)
+@optgroup.group("Parse cache", help="Reuse reports parsed in previous runs")
+@optgroup.option(
+    "--cache",
+    is_flag=True,
+    default=False,
+    help="Cache parsed reports and compiled templates, so reruns only parse new or modified reports",
+)
+@optgroup.option(
+    "--cache-dir",
+    default=DEFAULT_CACHE_DIR,
+    show_default=True,
+    type=click.Path(path_type=Path, file_okay=False),
+    help="Directory to keep the cache in",
+)
+@optgroup.option(
+    "--cache-size",
+    default=DEFAULT_CACHE_SIZE // 1024**2,
+    show_default=True,
+    type=click.IntRange(min=0),
+    help="Maximum cache size, in MB",
+)
+def main(
+    taxonomy: Path,
+    csv_file: Path,
+    manifest: Path,
+    output: Path,
+    table_format: str,
+    max_bar_samples: int,
+    top_taxa: int,
+    top_taxa_mode: str,
+    strict_validation: bool,
+    jobs: int,
+    state_path: Path,
+    pcoa_method: str,
+    pcoa_dimensions: int,
+    rank: str,
+    profile: bool,
+    profile_trace: Path,
+    assets: str,
+    assets_dir: Path,
+    include_mathjax: bool,
+    recursive: bool,
+    include: Tuple[str, ...],
+    exclude: Tuple[str, ...],
+    cache: bool,
+    cache_dir: Path,
+    cache_size: int,
+) -> None:
     """
     MicroView, a reporting tool for taxonomic classification
 
@@ -47,7 +271,8 @@ def main(taxonomy: Path, csv_file: Path, output: Path) -> None:
     You can provide either a path to results
     in the -t argument or, with -df, a path to a 2-column CSV file,
     the first column sample paths and the second containing group names
-    or contrasts.
+    or contrasts. With -m, many reports are rendered from a manifest,
+    parsing the samples they share only once.
     """
 
     console = Console(stderr=True, highlight=False)
@@ -55,27 +280,319 @@ def main(taxonomy: Path, csv_file: Path, output: Path) -> None:
         f"\n [bold]Running [blue]Micro[/][red]View[/] :glasses: [dim]v{mv_version}[/] \n"
     )
     data_source = taxonomy if taxonomy else csv_file
+    report_cache = ReportCache(cache_dir, cache_size * 1024**2) if cache else None
+    if cache:
+        from microview.templates import use_bytecode_cache
+
+        use_bytecode_cache(cache_dir / "templates")
+    profiler = Profiler() if profile or profile_trace is not None else None
+
+    if manifest is not None:
+        from microview.batch import read_manifest, run_batch
+
+        batch_reports = read_manifest(manifest)
+        try:
+            with console.status("[bold]Rendering reports...[/]"):
+                outputs = run_batch(
+                    batch_reports,
+                    manifest,
+                    console,
+                    strict_validation,
+                    jobs,
+                    report_cache,
+                    state_path,
+                    profiler,
+                    pcoa_method,
+                    pcoa_dimensions,
+                    table_format,
+                    max_bar_samples,
+                    assets,
+                    assets_dir,
+                    include_mathjax,
+                    rank,
+                    top_taxa,
+                    top_taxa_mode,
+                )
+            console.print(f"\n Rendered [bold]{len(outputs)}[/] reports\n")
+            console.print(f"\n Done!\n", style="bold green")
+        except Exception:
+            console.print_exception(show_locals=True)
+        print_profile(console, profiler, profile_trace)
+        return
+
+    with console.status("[bold]Reading report...[/]"), profile_stage(
+        profiler, "detect_report_type"
+    ):
+        from microview.file_finder import find_reports, parse_source_table
 
-    with console.status("[bold]Reading report...[/]"):
         if csv_file is not None:
-            parsed_result = parse_source_table(data_source, console)
+            parsed_result = parse_source_table(
+                data_source, console, strict_validation, jobs, report_cache
+            )
             reports = parsed_result["samples"]
         else:
-            reports = find_reports(data_source, console)
+            reports = find_reports(
+                data_source,
+                console,
+                strict_validation,
+                jobs,
+                report_cache,
+                recursive,
+                list(include),
+                list(exclude),
+            )
             parsed_result = None
 
     try:
         console.print(f"\n Found [bold]{len(reports)}[/] reports... \n")
+        slowest = max(reports, key=lambda sample: sample.detection_time)
+        detection_time = sum(sample.detection_time for sample in reports)
+        console.print(
+            f" Report types detected in [bold]{detection_time:.2f}s[/] "
+            f"[dim](slowest: {slowest.report.name}, {slowest.detection_time:.3f}s)[/]\n"
+        )
         with console.status("[bold]Calculating metrics...[/]"):
-            tax_results = get_tax_data(reports)
-            # TODO: Improve this double check
-            if parsed_result is not None:
-                tax_plots = generate_taxo_plots(
-                    tax_results, parsed_result["dataframe"], output_path=output
+            from microview.parse_taxonomy import get_tax_data
+
+            tax_results = get_tax_data(
+                reports,
+                jobs,
+                report_cache,
+                state_path,
+                profiler,
+                pcoa_method,
+                pcoa_dimensions,
+                rank,
+                top_taxa,
+                top_taxa_mode,
+            )
+            with profile_stage(profiler, "generate_taxo_plots"):
+                from microview.plotting import generate_taxo_plots
+
+                # TODO: Improve this double check
+                if parsed_result is not None:
+                    tax_plots = generate_taxo_plots(
+                        tax_results,
+                        parsed_result["dataframe"],
+                        output_path=output,
+                        table_format=table_format,
+                        max_bar_samples=max_bar_samples,
+                    )
+                else:
+                    tax_plots = generate_taxo_plots(
+                        tax_results,
+                        output_path=output,
+                        table_format=table_format,
+                        max_bar_samples=max_bar_samples,
+                    )
+            with profile_stage(profiler, "render_base"):
+                from microview.rendering import render_base
+
+                render_base(
+                    tax_plots=tax_plots,
+                    dir_path=data_source,
+                    output_path=output,
+                    assets=assets,
+                    assets_dir=assets_dir,
+                    include_mathjax=include_mathjax,
                 )
-            else:
-                tax_plots = generate_taxo_plots(tax_results, output_path=output)
-            render_base(tax_plots=tax_plots, dir_path=data_source, output_path=output)
         console.print(f"\n Done!\n", style="bold green")
     except Exception:
         console.print_exception(show_locals=True)
+
+    print_profile(console, profiler, profile_trace)
+
+
+@click.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.version_option(prog_name="MicroView")
+@click.option(
+    "-t",
+    "--taxonomy",
+    required=True,
+    type=click.Path(path_type=Path, exists=True, file_okay=False),
+    help="Path to taxonomy classification results",
+)
+@click.option(
+    "--host", default=DEFAULT_HOST, show_default=True, help="Address to listen on"
+)
+@click.option(
+    "--port",
+    default=DEFAULT_PORT,
+    show_default=True,
+    type=click.IntRange(min=0, max=65535),
+    help="Port to listen on, 0 to pick any free port",
+)
+@click.option(
+    "--html-cache-size",
+    default=DEFAULT_HTML_CACHE_SIZE // 1024**2,
+    show_default=True,
+    type=click.IntRange(min=0),
+    help="Maximum size of rendered reports kept in memory, in MB",
+)
+@click.option(
+    "--max-bar-samples",
+    default=DEFAULT_MAX_BAR_SAMPLES,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of samples above which bar plots average bins of samples",
+)
+@click.option(
+    "--top-taxa",
+    default=DEFAULT_TOP_TAXA,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of most common taxa shown for each sample",
+)
+@click.option(
+    "--top-taxa-mode",
+    default="sample",
+    show_default=True,
+    type=click.Choice(TOP_TAXA_MODES),
+    help="Show each sample's own most common taxa, or, for every sample, the taxa most common across samples",
+)
+@click.option(
+    "--strict-validation",
+    is_flag=True,
+    default=False,
+    help="Fully validate every report against its schema instead of sniffing its first rows",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    type=click.IntRange(min=0),
+    help="Number of processes to validate and parse reports with, 0 to use all CPUs",
+)
+@click.option(
+    "--state",
+    "state_path",
+    default=None,
+    type=click.Path(path_type=Path, dir_okay=False),
+    help="File to keep aggregate results in, so restarts only compute metrics for new samples",
+)
+@click.option(
+    "--pcoa-method",
+    default="auto",
+    show_default=True,
+    type=click.Choice(PCOA_METHODS),
+    help=(
+        "Calculate every PCoA axis exactly, or only the first ones approximately; "
+        f"auto approximates above {APPROXIMATE_PCOA_THRESHOLD} samples"
+    ),
+)
+@click.option(
+    "--pcoa-dimensions",
+    default=DEFAULT_PCOA_DIMENSIONS,
+    show_default=True,
+    type=click.IntRange(min=2),
+    help="Number of PCoA axes calculated when approximating",
+)
+@click.option(
+    "--rank",
+    default=None,
+    type=click.Choice(RANKS, case_sensitive=False),
+    help="Count Kraken reads under the taxa of a single rank, e.g. S for species, instead of under the taxa they were assigned to",
+)
+@click.option(
+    "--no-mathjax",
+    "include_mathjax",
+    is_flag=True,
+    default=True,
+    flag_value=False,
+    help="Leave MathJax out of reports, no plot needs it",
+)
+@click.option(
+    "-r",
+    "--recursive",
+    is_flag=True,
+    default=False,
+    help="Also find reports in every subdirectory",
+)
+@click.option(
+    "--include",
+    multiple=True,
+    help="Glob pattern report files match, relative to the directory, can be repeated [default: *txt and compressed *txt files]",
+)
+@click.option(
+    "--exclude",
+    multiple=True,
+    help="Glob pattern of files or subdirectories to leave out, can be repeated",
+)
+def serve(
+    taxonomy: Path,
+    host: str,
+    port: int,
+    html_cache_size: int,
+    max_bar_samples: int,
+    top_taxa: int,
+    top_taxa_mode: str,
+    strict_validation: bool,
+    jobs: int,
+    state_path: Path,
+    pcoa_method: str,
+    pcoa_dimensions: int,
+    rank: str,
+    include_mathjax: bool,
+    recursive: bool,
+    include: Tuple[str, ...],
+    exclude: Tuple[str, ...],
+) -> None:
+    """
+    Serve MicroView reports of any selection of samples
+
+    Reports in the directory are parsed once, when the server starts, and
+    kept in memory. Reports are then rendered on request, for every sample
+    at /, or for some samples, optionally grouped, at
+    /report?samples=a.txt,b.txt&groups=one,two. /samples lists every sample.
+    """
+    from microview.file_finder import find_reports
+    from microview.serve import ReportServer
+    from microview.state import load_state, save_state, update_state
+
+    console = Console(stderr=True, highlight=False)
+    console.print(
+        f"\n [bold]Running [blue]Micro[/][red]View[/] :glasses: [dim]v{mv_version}[/] \n"
+    )
+
+    with console.status("[bold]Reading reports...[/]"):
+        samples = find_reports(
+            taxonomy,
+            console,
+            strict_validation,
+            jobs,
+            recursive=recursive,
+            include=list(include),
+            exclude=list(exclude),
+        )
+        previous = load_state(state_path, rank) if state_path is not None else None
+        state = update_state(previous, samples, jobs, rank=rank)
+        if state_path is not None:
+            save_state(state, state_path, rank)
+
+    server = ReportServer(
+        (host, port),
+        state,
+        taxonomy,
+        html_cache_size * 1024**2,
+        pcoa_method,
+        pcoa_dimensions,
+        max_bar_samples,
+        include_mathjax,
+        top_taxa,
+        top_taxa_mode,
+    )
+    with console.status("[bold]Rendering the report of every sample...[/]"):
+        # Also loads the libraries rendering needs, before the first request
+        server.render()
+
+    host, port = server.server_address[:2]
+    console.print(
+        f" Serving reports of [bold]{len(samples)}[/] samples "
+        f"at [bold]http://{host}:{port}/[/]\n"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
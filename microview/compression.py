@@ -0,0 +1,164 @@
+"""
+MicroView module for reading compressed reports
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+from pathlib import Path
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+from typing import BinaryIO, Optional
+
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".zst": "zstd"}
+
+# Size of the blocks decompressed ahead of the reader, in bytes
+BLOCK_SIZE = 1024**2
+
+# Maximum number of decompressed blocks waiting to be read
+MAX_BLOCKS = 8
+
+
+def get_compression(path: Path) -> Optional[str]:
+    """
+    Get the compression of a file from its extension
+
+    Args:
+        path (Path): Path to the file
+
+    Returns:
+        str: One of 'gzip', 'bz2', 'xz' or 'zstd', or None if uncompressed.
+    """
+    return COMPRESSION_SUFFIXES.get(Path(path).suffix.lower())
+
+
+def open_decompressed(path: Path, compression: str) -> BinaryIO:
+    """
+    Open a streaming decompressor over a compressed file
+    """
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    elif compression == "bz2":
+        return bz2.open(path, "rb")
+    elif compression == "xz":
+        return lzma.open(path, "rb")
+    elif compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise Exception(
+                f"Reading {Path(path).name} requires zstandard, "
+                "install it with 'pip install zstandard'"
+            )
+        return zstandard.open(path, "rb")
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+class ThreadedReader(io.RawIOBase):
+    """
+    Read a stream ahead of its consumer, in a background thread
+
+    Blocks of up to block_size bytes are read from the underlying stream
+    into a queue of at most max_blocks blocks, so memory stays bounded.
+    The gzip, bz2, lzma and zstandard decompressors release the GIL,
+    so reading through this lets decompression run alongside parsing.
+
+    Args:
+        raw (BinaryIO): Stream to read from, closed along with the reader
+        block_size (int): Number of bytes read from raw at a time
+        max_blocks (int): Maximum number of blocks read ahead
+    """
+
+    def __init__(
+        self,
+        raw: BinaryIO,
+        block_size: int = BLOCK_SIZE,
+        max_blocks: int = MAX_BLOCKS,
+    ):
+        super().__init__()
+        self._raw = raw
+        self._block_size = block_size
+        self._queue: Queue = Queue(maxsize=max_blocks)
+        self._stop = Event()
+        self._buffer = memoryview(b"")
+        self._eof = False
+
+        self._thread = Thread(target=self._read_ahead, daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> None:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except Full:
+                continue
+
+    def _read_ahead(self) -> None:
+        try:
+            while not self._stop.is_set():
+                block = self._raw.read(self._block_size)
+                self._put(block)
+                if not block:
+                    return
+        except BaseException as error:
+            self._put(error)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if len(self._buffer) == 0:
+            if self._eof:
+                return 0
+
+            block = self._queue.get()
+            if isinstance(block, BaseException):
+                raise block
+            if not block:
+                self._eof = True
+                return 0
+            self._buffer = memoryview(block)
+
+        n_bytes = min(len(b), len(self._buffer))
+        b[:n_bytes] = self._buffer[:n_bytes]
+        self._buffer = self._buffer[n_bytes:]
+        return n_bytes
+
+    def close(self) -> None:
+        if not self.closed:
+            self._stop.set()
+            # Unblock the background thread if it is waiting on a full queue
+            while self._thread.is_alive():
+                try:
+                    self._queue.get(timeout=0.1)
+                except Empty:
+                    pass
+            self._raw.close()
+        super().close()
+
+
+def open_report(path: Path, threaded: bool = False) -> BinaryIO:
+    """
+    Open a report for reading, decompressing it if needed
+
+    Compressed reports are decompressed as they're read, never
+    written to disk.
+
+    Args:
+        path (Path): Path to the report, compressed or not
+        threaded (bool): Decompress in a background thread, ahead of reading
+
+    Returns:
+        BinaryIO: Binary stream of the (decompressed) report
+    """
+    compression = get_compression(path)
+    if compression is None:
+        return open(path, "rb")
+
+    stream = open_decompressed(path, compression)
+    if not threaded:
+        return stream
+
+    return io.BufferedReader(ThreadedReader(stream), buffer_size=BLOCK_SIZE)
@@ -0,0 +1,41 @@
+"""
+MicroView module for defaults shared by the CLI and the stages it runs
+
+Only standard library imports belong here, so the CLI can offer these
+defaults without loading the libraries each stage needs.
+"""
+
+# Formats tables can be written in
+TABLE_FORMATS = ["tsv", "parquet", "feather"]
+
+# Number of samples above which bar plots show bins of samples
+DEFAULT_MAX_BAR_SAMPLES = 1000
+
+# Number of most common taxa shown for each sample
+DEFAULT_TOP_TAXA = 5
+
+# Whether the most common taxa are picked for each sample or across samples
+TOP_TAXA_MODES = ["sample", "global"]
+
+# Kraken rank codes counts can be rolled up to, from root to species
+RANKS = ["R", "D", "K", "P", "C", "O", "F", "G", "S"]
+
+PCOA_METHODS = ["auto", "exact", "approximate"]
+
+# Number of axes calculated by the approximate PCoA
+DEFAULT_PCOA_DIMENSIONS = 10
+
+# Number of samples above which the approximate PCoA is used by default
+APPROXIMATE_PCOA_THRESHOLD = 1000
+
+ASSET_MODES = ["embed", "external"]
+
+# Directory shared assets are written to by default, next to the report
+DEFAULT_ASSETS_DIR = "microview_assets"
+
+DEFAULT_HOST = "127.0.0.1"
+
+DEFAULT_PORT = 8000
+
+# Default maximum size of reports the server keeps rendered, in bytes
+DEFAULT_HTML_CACHE_SIZE = 256 * 1024**2
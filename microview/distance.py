@@ -0,0 +1,212 @@
+"""
+MicroView module for calculating distances between samples
+"""
+
+from typing import Dict, List, Tuple
+
+from numpy import (
+    arange,
+    asarray,
+    concatenate,
+    empty,
+    errstate,
+    float64,
+    intersect1d,
+    ndarray,
+    unique,
+    zeros,
+)
+from scipy.sparse import csr_matrix
+from scipy.spatial.distance import cdist, squareform
+
+from microview.parallel import parallel_map
+
+# Number of samples on each side of a tile of the distance matrix
+DEFAULT_TILE_SIZE = 256
+
+# Count matrix and settings of the current worker process
+_worker_state: Dict = {}
+
+
+def row_sums(matrix: csr_matrix) -> ndarray:
+    """
+    Sum each row of a sparse matrix into a flat array
+    """
+    return asarray(matrix.sum(axis=1)).ravel()
+
+
+def braycurtis_tile(
+    left: csr_matrix, right: csr_matrix, left_totals: ndarray, right_totals: ndarray
+) -> ndarray:
+    """
+    Calculate Bray-Curtis distances between every row of two sparse count matrices
+
+    Bray-Curtis is sum(|u - v|) / (sum(u) + sum(v)). In columns where only
+    one side has counts, |u - v| is that side's count, so only columns
+    with counts on both sides are densified, and the rest is recovered
+    from the row totals.
+
+    Args:
+        left (csr_matrix): First block of rows
+        right (csr_matrix): Second block of rows, with the same columns
+        left_totals (ndarray): Sum of each row of left
+        right_totals (ndarray): Sum of each row of right
+
+    Returns:
+        ndarray: Matrix of distances, with one row for each row in left
+            and one column for each row in right.
+    """
+    shared = intersect1d(unique(left.indices), unique(right.indices))
+
+    left_shared = left[:, shared].toarray().astype(float64)
+    right_shared = right[:, shared].toarray().astype(float64)
+
+    if len(shared) > 0:
+        abs_diff = cdist(left_shared, right_shared, "cityblock")
+    else:
+        abs_diff = zeros((left.shape[0], right.shape[0]))
+    abs_diff += (left_totals - left_shared.sum(axis=1))[:, None]
+    abs_diff += (right_totals - right_shared.sum(axis=1))[None, :]
+
+    with errstate(invalid="ignore", divide="ignore"):
+        return abs_diff / (left_totals[:, None] + right_totals[None, :])
+
+
+def braycurtis_rows(
+    matrix: csr_matrix, rows, tile_size: int = DEFAULT_TILE_SIZE
+) -> ndarray:
+    """
+    Calculate Bray-Curtis distances between some rows and every row of a count matrix
+
+    Args:
+        matrix (csr_matrix): Sample by taxon count matrix
+        rows (list): Indices of the rows to calculate distances from
+        tile_size (int): Number of rows on each side of a tile
+
+    Returns:
+        ndarray: Matrix of distances, with one row for each index in rows
+            and one column for each row in matrix.
+    """
+    rows = asarray(rows, dtype=int)
+    totals = row_sums(matrix).astype(float64)
+    n_samples = matrix.shape[0]
+
+    distances = empty((len(rows), n_samples))
+    for start in range(0, len(rows), tile_size):
+        block = rows[start : start + tile_size]
+        for col_start in range(0, n_samples, tile_size):
+            col_stop = min(col_start + tile_size, n_samples)
+            distances[start : start + len(block), col_start:col_stop] = braycurtis_tile(
+                matrix[block],
+                matrix[col_start:col_stop],
+                totals[block],
+                totals[col_start:col_stop],
+            )
+
+    distances[arange(len(rows)), rows] = 0
+
+    return distances
+
+
+def braycurtis_block(
+    matrix: csr_matrix, totals: ndarray, start: int, stop: int, tile_size: int
+) -> ndarray:
+    """
+    Calculate the condensed distances of rows start to stop to every later row
+
+    The distances of consecutive rows to every later row are contiguous
+    in a condensed distance vector, so blocks can be written independently.
+    """
+    n_samples = matrix.shape[0]
+    block = matrix[start:stop]
+
+    distances = empty((stop - start, n_samples - start))
+    for col_start in range(start, n_samples, tile_size):
+        col_stop = min(col_start + tile_size, n_samples)
+        distances[:, col_start - start : col_stop - start] = braycurtis_tile(
+            block,
+            matrix[col_start:col_stop],
+            totals[start:stop],
+            totals[col_start:col_stop],
+        )
+
+    # Keep, for each row, only the distances to later rows
+    later = arange(n_samples - start)[None, :] > arange(stop - start)[:, None]
+    return distances[later]
+
+
+def _init_worker(matrix: csr_matrix, tile_size: int):
+    _worker_state.update(
+        matrix=matrix,
+        totals=row_sums(matrix).astype(float64),
+        tile_size=tile_size,
+    )
+
+
+def _braycurtis_task(bounds: Tuple[int, int]) -> ndarray:
+    start, stop = bounds
+    return braycurtis_block(
+        _worker_state["matrix"],
+        _worker_state["totals"],
+        start,
+        stop,
+        _worker_state["tile_size"],
+    )
+
+
+def braycurtis_condensed(
+    matrix: csr_matrix,
+    jobs: int = 1,
+    tile_size: int = DEFAULT_TILE_SIZE,
+) -> ndarray:
+    """
+    Calculate pairwise Bray-Curtis distances between rows of a sparse count matrix
+
+    The upper triangle of the distance matrix is split in blocks of tile_size
+    rows, calculated tile by tile, so the memory used besides the result is
+    bounded by the tile size rather than by the number of samples.
+
+    Args:
+        matrix (csr_matrix): Sample by taxon count matrix
+        jobs (int): Number of worker processes to calculate blocks with,
+            0 meaning one per available CPU.
+        tile_size (int): Number of rows on each side of a tile
+
+    Returns:
+        ndarray: Condensed distance vector, as in scipy's squareform
+    """
+    n_samples = matrix.shape[0]
+    n_distances = n_samples * (n_samples - 1) // 2
+    blocks: List[Tuple[int, int]] = [
+        (start, min(start + tile_size, n_samples))
+        for start in range(0, n_samples, tile_size)
+    ]
+
+    try:
+        results = parallel_map(
+            _braycurtis_task,
+            blocks,
+            jobs,
+            initializer=_init_worker,
+            initargs=(matrix, tile_size),
+        )
+    finally:
+        _worker_state.clear()
+
+    if n_distances == 0:
+        return empty(0)
+    return concatenate(results)
+
+
+def braycurtis_distances(matrix: csr_matrix, jobs: int = 1) -> ndarray:
+    """
+    Calculate pairwise Bray-Curtis distances between rows of a sparse count matrix
+
+    Args:
+        matrix (csr_matrix): Sample by taxon count matrix
+        jobs (int): Number of worker processes, 0 meaning one per available CPU.
+
+    Returns:
+        ndarray: Square, symmetric matrix of distances between rows
+    """
+    return squareform(braycurtis_condensed(matrix, jobs), checks=False)
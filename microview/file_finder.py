@@ -1,18 +1,39 @@
-from dataclasses import dataclass
-from itertools import chain
+import csv
+import fnmatch
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from functools import partial
+from io import TextIOWrapper
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List, Tuple
+from time import perf_counter
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple, Union
+
+from microview.cache import ReportCache
+from microview.compression import (
+    COMPRESSION_SUFFIXES,
+    get_compression,
+    open_report,
+)
+from microview.parallel import DEFAULT_IO_THREADS, parallel_map, thread_map
+from microview.schemas import contrast_table_schema, kaiju_report_schema
 
-from frictionless import checks, validate
-from pandas import read_csv
+# Number of data rows inspected when sniffing a report's type
+SNIFF_ROWS = 50
 
-from microview.schemas import contrast_table_schema, kaiju_report_schema
+KAIJU_HEADER = ["file", "percent", "reads", "taxon_id", "taxon_name"]
+
+# Reports are plain text files, optionally compressed
+REPORT_PATTERNS = ["*txt"] + [f"*txt{suffix}" for suffix in COMPRESSION_SUFFIXES]
 
 
 @dataclass
 class Sample:
     report: Path
     report_type: str
+    detection_time: float = field(default=0.0, compare=False)
 
 
 def get_validation_dict(table: Path, **kwargs) -> Dict:
@@ -28,6 +49,9 @@ def get_validation_dict(table: Path, **kwargs) -> Dict:
             itself; 'errors', with the number of errors; and 'error_messages', a
             list containing error codes and their respective messages
     """
+    # frictionless is slow to import, and only needed to fully validate tables
+    from frictionless import validate
+
     report = validate(
         table,
         **kwargs,
@@ -80,113 +104,446 @@ def check_source_table_validation(report: Dict, console) -> None:
         raise Exception("Source table does not follow schema")
 
 
-def detect_report_type(report_paths: List[Path], console) -> List[Sample]:
+def _is_number(value: str, integer: bool = False) -> bool:
+    """
+    Check if a string field holds a (integer) number
+    """
+    try:
+        int(value) if integer else float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _is_kaiju_row(fields: List[str]) -> bool:
+    return (
+        len(fields) == 5
+        and _is_number(fields[1])
+        and _is_number(fields[2], integer=True)
+        and (fields[3] == "NA" or _is_number(fields[3], integer=True))
+        and fields[4] != ""
+    )
+
+
+def _is_kraken_row(fields: List[str]) -> bool:
+    return (
+        len(fields) == 6
+        and _is_number(fields[0])
+        and _is_number(fields[1], integer=True)
+        and _is_number(fields[2], integer=True)
+        and _is_number(fields[4], integer=True)
+    )
+
+
+def sniff_report_type(report: Path, n_rows: int = SNIFF_ROWS) -> Optional[str]:
+    """
+    Infer report type from its header and a bounded prefix of rows
+
+    Only the first line and up to n_rows data rows are read, so
+    the cost of sniffing doesn't depend on the size of the report.
+
+    Args:
+        report (Path): Path to the report to sniff
+        n_rows (int): Maximum number of data rows to inspect
+
+    Returns:
+        str: 'kaiju' or 'kraken', or None if the report matches neither format.
+    """
+    with TextIOWrapper(open_report(report), encoding="utf-8", errors="replace") as f:
+        lines = [
+            line.rstrip("\r\n").split("\t")
+            for line in islice(f, n_rows + 1)
+            if line.strip()
+        ]
+
+    if len(lines) == 0:
+        return None
+
+    header, rows = lines[0], lines[1:]
+
+    if header == KAIJU_HEADER and all(_is_kaiju_row(row) for row in rows):
+        return "kaiju"
+
+    # Kraken-style reports have no header, so the first line is a row too
+    if all(_is_kraken_row(row) for row in lines):
+        return "kraken"
+
+    return None
+
+
+def get_validation_source(report: Path) -> Tuple[Union[Path, List], str]:
+    """
+    Get a source to validate a report from, along with its format
+
+    Plain and gzipped reports are read by frictionless itself. Reports
+    with other compressions, which it can't read, are decompressed
+    into memory as inline rows.
+
+    Args:
+        report (Path): Path to the report, compressed or not
+
+    Returns:
+        tuple: The source to validate and its format.
+    """
+    if get_compression(report) in [None, "gzip"]:
+        return report, "tsv"
+
+    with TextIOWrapper(open_report(report), encoding="utf-8") as f:
+        return list(csv.reader(f, delimiter="\t")), "inline"
+
+
+def validate_report_type(report: Path) -> Optional[str]:
+    """
+    Infer report type by fully validating the report
+
+    Slower than microview.file_finder.sniff_report_type, since every
+    row is read and type-checked against the Kaiju schema and then,
+    if that fails, against Kraken-style checks.
+
+    Args:
+        report (Path): Path to the report to validate
+
+    Returns:
+        str: 'kaiju' or 'kraken', or None if the report matches neither format.
+    """
+    source, source_format = get_validation_source(report)
+
+    kaiju_validated = get_validation_dict(
+        source, format=source_format, schema=kaiju_report_schema
+    )
+    if kaiju_validated["errors"] == 0:
+        return "kaiju"
+
+    from frictionless import checks
+
+    # TODO: Improve Kraken validation
+    kraken_validated = get_validation_dict(
+        source, format=source_format, checks=[checks.table_dimensions(num_fields=6)]
+    )
+    if is_kraken_report(kraken_validated):
+        return "kraken"
+
+    return None
+
+
+def time_report_type(
+    report: Path, strict_validation: bool = False
+) -> Tuple[Optional[str], float]:
+    """
+    Detect the type of a single report, timing the detection
+
+    Args:
+        report (Path): Path to the report
+        strict_validation (bool): Fully validate the report instead of sniffing it.
+
+    Returns:
+        tuple: The report type (or None if invalid) and the time,
+            in seconds, spent detecting it.
+    """
+    detect = validate_report_type if strict_validation else sniff_report_type
+
+    start = perf_counter()
+    report_type = detect(report)
+
+    return report_type, perf_counter() - start
+
+
+def detect_report_type(
+    report_paths: List[Path],
+    console,
+    strict_validation: bool = False,
+    jobs: int = 1,
+    cache: Optional[ReportCache] = None,
+) -> List[Sample]:
     """
     Detect report type from file paths
 
-    Validates tables present in report_paths against schemas or
-    custom checks, inferring the type of report (kaiju or kraken).
+    Sniffs the header and first rows of each table present in report_paths,
+    inferring the type of report (kaiju or kraken). With strict_validation,
+    tables are instead fully validated against schemas or custom checks.
+    Reports found in the cache keep their previously detected type.
 
     Args:
         report_paths (list): A list containing all report paths to validate.
         console (rich.Console): Console to print messages to
+        strict_validation (bool): Fully validate reports instead of sniffing them.
+        jobs (int): Number of worker processes to detect reports with.
+        cache (ReportCache): Cache of previously parsed reports, if any.
 
     Returns:
-        List[Sample]: List of samples, an object comprising two attributes,
-          one the report path, the other a string specifying the report type.
+        List[Sample]: List of samples, an object comprising three attributes,
+          the report path, a string specifying the report type and the time,
+          in seconds, spent detecting it.
     """
-    kaiju_validated = [
-        get_validation_dict(report, format="tsv", schema=kaiju_report_schema)
-        for report in report_paths
-    ]
-    kaiju_reports = [
-        kaiju_report["report"]
-        for kaiju_report in kaiju_validated
-        if kaiju_report["errors"] == 0
-    ]
+    detected: Dict[Path, Tuple[Optional[str], float]] = {}
+    if cache is not None:
+        for report in report_paths:
+            start = perf_counter()
+            report_type = cache.report_type(report)
+            if report_type is not None:
+                detected[report] = (report_type, perf_counter() - start)
+
+    not_cached = [report for report in report_paths if report not in detected]
+    detected.update(
+        zip(
+            not_cached,
+            parallel_map(
+                partial(time_report_type, strict_validation=strict_validation),
+                not_cached,
+                jobs,
+            ),
+        )
+    )
 
-    # TODO: Improve Kraken validation
-    kraken_validated = [
-        get_validation_dict(
-            report, format="tsv", checks=[checks.table_dimensions(num_fields=6)]
+    all_reports: List[Sample] = [
+        Sample(
+            report=report,
+            report_type=detected[report][0],
+            detection_time=detected[report][1],
         )
         for report in report_paths
-    ]
-    kraken_reports = [
-        kraken_report["report"]
-        for kraken_report in kraken_validated
-        if is_kraken_report(kraken_report)
+        if detected[report][0] is not None
     ]
 
-    if len(kraken_reports) == 0 and len(kaiju_reports) == 0:
+    if len(all_reports) == 0:
         console.print("\n Could not find any valid reports", style="red")
         raise Exception("Could not find any valid files.")
-    else:
-        kraken_not_in_kaiju = list(
-            filter(lambda report: report not in kaiju_reports, kraken_reports)
-        )
 
-        # TODO: Improve how this looks
-        all_reports = list(
-            chain(
-                *[
-                    [
-                        Sample(report=report, report_type="kaiju")
-                        for report in kaiju_reports
-                    ],
-                    [
-                        Sample(report=report, report_type="kraken")
-                        for report in kraken_not_in_kaiju
-                    ],
-                ]
-            )
+    return all_reports
+
+
+def compile_patterns(patterns: Iterable[str]) -> List[List[Pattern]]:
+    """
+    Compile glob-style path patterns into one regular expression per component
+    """
+    return [
+        [re.compile(fnmatch.translate(part)) for part in pattern.split("/")]
+        for pattern in patterns
+    ]
+
+
+def matches_any(parts: Tuple[str, ...], patterns: List[List[Pattern]]) -> bool:
+    """
+    Check if a path, split in components, matches any compiled pattern
+
+    As in pathlib's match, patterns are matched from the right, so '*.txt'
+    matches files in any directory, and 'runs/*.txt' only those in a
+    directory named runs.
+    """
+    return any(
+        len(pattern) <= len(parts)
+        and all(
+            regex.match(part) for regex, part in zip(pattern, parts[-len(pattern) :])
         )
+        for pattern in patterns
+    )
+
+
+def scan_directory(directory: Path) -> Tuple[List[str], List[str]]:
+    """
+    List the names of the files and subdirectories of a directory
+
+    The directory is read once, and file types come from the listing
+    itself on most filesystems, rather than from a stat call per file.
+    Symbolic links to directories aren't followed, to avoid cycles.
+
+    Returns:
+        tuple: The names of the files and of the subdirectories.
+    """
+    files: List[str] = []
+    subdirs: List[str] = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+            elif entry.is_file():
+                files.append(entry.name)
+    return files, subdirs
+
+
+def discover_reports(
+    reports_path: Path,
+    recursive: bool = False,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    threads: int = DEFAULT_IO_THREADS,
+) -> List[Path]:
+    """
+    Find report files in a directory, and optionally in its subdirectories
+
+    Each directory is listed once, whatever the number of patterns, and
+    subdirectories are listed concurrently in a thread pool, so that
+    on network filesystems their latencies overlap.
 
-        return all_reports
+    Args:
+        reports_path (Path): Directory to find reports in
+        recursive (bool): Also find reports in every subdirectory
+        include (List[str]): Glob-style patterns, relative to reports_path,
+            that report files match, by default REPORT_PATTERNS.
+        exclude (List[str]): Patterns of files, or of directories not to
+            descend into, to leave out.
+        threads (int): Number of directories listed at once
+
+    Returns:
+        List[Path]: Paths to the reports found, sorted.
+    """
+    reports_path = Path(reports_path)
+    include_patterns = compile_patterns(include or REPORT_PATTERNS)
+    exclude_patterns = compile_patterns(exclude or [])
+
+    found: List[Tuple[str, ...]] = []
+    with ThreadPoolExecutor(max_workers=max(threads, 1)) as executor:
+        # Directories being listed, by their components relative to reports_path
+        pending = {executor.submit(scan_directory, reports_path): ()}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                parent = pending.pop(future)
+                files, subdirs = future.result()
+
+                for name in files:
+                    parts = parent + (name,)
+                    if matches_any(parts, include_patterns) and not matches_any(
+                        parts, exclude_patterns
+                    ):
+                        found.append(parts)
+
+                if not recursive:
+                    continue
+                for name in subdirs:
+                    parts = parent + (name,)
+                    if not matches_any(parts, exclude_patterns):
+                        future = executor.submit(
+                            scan_directory, reports_path.joinpath(*parts)
+                        )
+                        pending[future] = parts
+
+    return [reports_path.joinpath(*parts) for parts in sorted(found)]
+
+
+def check_report_names(reports: Iterable[Path]) -> None:
+    """
+    Check that different reports have different file names
+
+    Samples are named after their report files, so reports with the same
+    name, e.g. in different subdirectories, can't be told apart.
 
+    Args:
+        reports (Iterable[Path]): Paths to the reports
 
-def find_reports(reports_path: Path, console) -> List[Sample]:
+    Raises:
+        Exception: If different reports have the same file name.
+    """
+    paths_by_name: Dict[str, set] = {}
+    for report in reports:
+        paths_by_name.setdefault(Path(report).name, set()).add(str(report))
+
+    duplicated = [
+        ", ".join(sorted(paths)) for paths in paths_by_name.values() if len(paths) > 1
+    ]
+    if len(duplicated) > 0:
+        raise Exception(
+            "Samples are named after their reports, which must have different "
+            f"file names: {'; '.join(duplicated)}"
+        )
+
+
+def find_reports(
+    reports_path: Path,
+    console,
+    strict_validation: bool = False,
+    jobs: int = 1,
+    cache: Optional[ReportCache] = None,
+    recursive: bool = False,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+) -> List[Sample]:
     """
     Find reports in given path
 
+    Both plain text reports and compressed ones, with extensions
+    such as .txt.gz or .txt.zst, are searched for.
+
     Args:
         reports_path (Path): Path to find the reports from
         console (rich.Console): Console to print messages to
+        strict_validation (bool): Fully validate reports instead of sniffing them.
+        jobs (int): Number of worker processes to detect reports with.
+        cache (ReportCache): Cache of previously parsed reports, if any.
+        recursive (bool): Also find reports in every subdirectory
+        include (List[str]): Patterns report files match, see discover_reports
+        exclude (List[str]): Patterns of files or directories to leave out
 
     Returns:
-        List[Sample]: List of samples, an object comprising two attributes,
-          one the report path, the other a string specifying the report type.
+        List[Sample]: List of samples, an object comprising three attributes,
+          the report path, a string specifying the report type and the time,
+          in seconds, spent detecting it.
     """
-    file_paths: List[Path] = list(reports_path.glob("*txt"))
-    samples = detect_report_type(file_paths, console)
+    file_paths = discover_reports(reports_path, recursive, include, exclude)
+    check_report_names(file_paths)
+    samples = detect_report_type(file_paths, console, strict_validation, jobs, cache)
     return samples
 
 
-def validate_paths(sample_paths: List[Path], source_table: Path) -> List[Path]:
+def resolve_sample_path(sample_path: Path, table_dir: Path) -> Optional[Path]:
+    """
+    Resolve a path from a source table, as given or relative to the table
+
+    Returns:
+        Path: The first of the two that exists, or None if neither does.
+    """
+    if sample_path.exists():
+        return sample_path
+
+    relative_path = table_dir.joinpath(sample_path)
+    if relative_path.exists():
+        return relative_path
+
+    return None
+
+
+def validate_paths(
+    sample_paths: List[Path], source_table: Path, threads: int = DEFAULT_IO_THREADS
+) -> List[Path]:
     """
     Check if paths in source table are real paths and readable
 
+    Each path is looked for as given, then relative to the source table,
+    and paths are checked concurrently, in a thread pool.
+
     Args:
         sample_paths (list): List of paths to validate
         source_table (path): Path to source table
+        threads (int): Number of paths checked at once
 
     Returns:
         list: A list containing the paths, now validated.
     """
-    if all(sample_path.exists() for sample_path in sample_paths) != True:
-        full_sample_paths: List[Path] = [
-            source_table.parent.resolve().joinpath(sample) for sample in sample_paths
-        ]
-
-        if all(full_path.exists() for full_path in full_sample_paths) != True:
-            raise Exception("One or more sample paths provided don't exist")
+    table_dir = source_table.parent.resolve()
+    resolved = thread_map(
+        partial(resolve_sample_path, table_dir=table_dir), sample_paths, threads
+    )
 
-        return full_sample_paths
+    missing = [
+        str(sample_path)
+        for sample_path, resolved_path in zip(sample_paths, resolved)
+        if resolved_path is None
+    ]
+    if len(missing) > 0:
+        raise Exception(
+            f"One or more sample paths provided don't exist: {', '.join(missing)}"
+        )
 
-    return sample_paths
+    return resolved
 
 
-def parse_source_table(source_table: Path, console) -> Dict:
+def parse_source_table(
+    source_table: Path,
+    console,
+    strict_validation: bool = False,
+    jobs: int = 1,
+    cache: Optional[ReportCache] = None,
+) -> Dict:
     """
     Parses source tables
 
@@ -198,6 +555,9 @@ def parse_source_table(source_table: Path, console) -> Dict:
     Args:
         source_table (Path): Path to the csv source table
         console (rich.Console): Console to print messages to, utilized by subfunctions.
+        strict_validation (bool): Fully validate reports instead of sniffing them.
+        jobs (int): Number of worker processes to detect reports with.
+        cache (ReportCache): Cache of previously parsed reports, if any.
 
     Returns:
         dict: Dict with 'samples', containing the samples and report types;
@@ -207,13 +567,17 @@ def parse_source_table(source_table: Path, console) -> Dict:
 
     check_source_table_validation(report, console)
 
+    from pandas import read_csv
+
     df = read_csv(source_table)
 
     sample_paths: List[Path] = [Path(sample) for sample in df["sample"].to_list()]
 
     validated_paths = validate_paths(sample_paths, source_table)
 
-    samples = detect_report_type(validated_paths, console)
+    samples = detect_report_type(
+        validated_paths, console, strict_validation, jobs, cache
+    )
 
     return {
         "samples": samples,
@@ -0,0 +1,109 @@
+"""
+MicroView module for ordinating samples by their distances
+"""
+
+from numpy import argsort, clip, float64, trace
+from numpy.random import default_rng
+from pandas import DataFrame, Series
+from scipy.sparse.linalg import eigsh
+from skbio import DistanceMatrix
+from skbio.stats.ordination import OrdinationResults, pcoa
+
+from microview.defaults import (
+    APPROXIMATE_PCOA_THRESHOLD,
+    DEFAULT_PCOA_DIMENSIONS,
+    PCOA_METHODS,
+)
+
+
+def center_distances(distances: DistanceMatrix):
+    """
+    Double-centre the matrix of -d^2 / 2, as PCoA requires
+
+    Returns:
+        ndarray: The centred matrix, a new array
+    """
+    centered = distances.data.astype(float64)
+    centered **= 2
+    centered *= -0.5
+
+    row_means = centered.mean(axis=1)
+    centered -= row_means[:, None]
+    centered -= row_means[None, :]
+    centered += row_means.mean()
+
+    return centered
+
+
+def approximate_pcoa(
+    distances: DistanceMatrix, dimensions: int = DEFAULT_PCOA_DIMENSIONS
+) -> OrdinationResults:
+    """
+    Perform a Principal Coordinate Analysis of only the first few axes
+
+    Instead of decomposing the whole centred matrix in O(N^3), only its
+    largest eigenvalues are found, with the Lanczos iterative eigensolver.
+    Eigenvalues are sorted and negative ones zeroed as in scikit-bio's pcoa,
+    but proportions explained are relative to the trace of the centred
+    matrix, since the remaining eigenvalues aren't calculated.
+
+    Args:
+        distances (DistanceMatrix): Distances between samples
+        dimensions (int): Number of axes to calculate
+
+    Returns:
+        OrdinationResults: PCoA results, with the given number of axes
+    """
+    centered = center_distances(distances)
+    n_samples = centered.shape[0]
+
+    # A fixed starting vector keeps results reproducible
+    start = default_rng(0).uniform(size=n_samples)
+    eigvals, eigvecs = eigsh(centered, k=dimensions, which="LA", v0=start)
+
+    descending = argsort(eigvals)[::-1]
+    eigvals = clip(eigvals[descending], 0, None)
+    eigvecs = eigvecs[:, descending]
+
+    axis_labels = [f"PC{i}" for i in range(1, dimensions + 1)]
+    return OrdinationResults(
+        short_method_name="PCoA",
+        long_method_name="Approximate Principal Coordinate Analysis",
+        eigvals=Series(eigvals, index=axis_labels),
+        samples=DataFrame(
+            eigvecs * eigvals**0.5, index=distances.ids, columns=axis_labels
+        ),
+        proportion_explained=Series(eigvals / trace(centered), index=axis_labels),
+    )
+
+
+def run_pcoa(
+    distances: DistanceMatrix,
+    method: str = "auto",
+    dimensions: int = DEFAULT_PCOA_DIMENSIONS,
+) -> OrdinationResults:
+    """
+    Perform a Principal Coordinate Analysis, exact or approximate
+
+    Args:
+        distances (DistanceMatrix): Distances between samples
+        method (str): 'exact' for scikit-bio's full eigendecomposition,
+            'approximate' for only the first axes, or 'auto' to approximate
+            above APPROXIMATE_PCOA_THRESHOLD samples.
+        dimensions (int): Number of axes calculated when approximating.
+
+    Returns:
+        OrdinationResults: PCoA results
+    """
+    if method not in PCOA_METHODS:
+        raise ValueError(f"Unknown PCoA method: {method}")
+
+    n_samples = distances.shape[0]
+    if method == "auto":
+        method = "approximate" if n_samples > APPROXIMATE_PCOA_THRESHOLD else "exact"
+
+    # The iterative eigensolver needs fewer axes than samples
+    if method == "exact" or dimensions >= n_samples - 1:
+        return pcoa(distances)
+
+    return approximate_pcoa(distances, dimensions)
@@ -0,0 +1,94 @@
+"""
+MicroView module for spreading work across processes and threads
+"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from os import cpu_count
+from typing import Callable, Iterable, List, Optional, Tuple
+
+# Number of threads waiting on file metadata at once, which on network
+# filesystems is mostly latency rather than work
+DEFAULT_IO_THREADS = 16
+
+
+def resolve_jobs(jobs: int) -> int:
+    """
+    Resolve the number of worker processes to use
+
+    Args:
+        jobs (int): Requested number of jobs, 0 meaning one per available CPU.
+
+    Returns:
+        int: Number of worker processes, at least 1.
+    """
+    if jobs <= 0:
+        return cpu_count() or 1
+    return jobs
+
+
+def parallel_map(
+    func: Callable,
+    items: Iterable,
+    jobs: int = 1,
+    initializer: Optional[Callable] = None,
+    initargs: Tuple = (),
+) -> List:
+    """
+    Apply a function to every item, optionally in a process pool
+
+    Results are always returned in the same order as the items,
+    so the output doesn't depend on the number of jobs.
+
+    Args:
+        func (Callable): Picklable, module-level function to apply
+        items (Iterable): Items to apply the function to
+        jobs (int): Number of worker processes, 0 meaning one per
+            available CPU. With 1, items are processed serially.
+        initializer (Callable): Picklable function called with initargs once
+            in each worker process, or once before processing items serially.
+            Use it to send large, shared data to workers only once.
+        initargs (tuple): Arguments to call initializer with
+
+    Returns:
+        list: Results of func for each item, in order.
+    """
+    items = list(items)
+    jobs = min(resolve_jobs(jobs), len(items))
+
+    if jobs <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return [func(item) for item in items]
+
+    chunksize = max(1, len(items) // (jobs * 4))
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=initializer, initargs=initargs
+    ) as executor:
+        return list(executor.map(func, items, chunksize=chunksize))
+
+
+def thread_map(
+    func: Callable, items: Iterable, threads: int = DEFAULT_IO_THREADS
+) -> List:
+    """
+    Apply an I/O bound function to every item in a thread pool
+
+    Unlike parallel_map, nothing is pickled, so it suits cheap calls,
+    such as stat, whose time is spent waiting on the filesystem.
+
+    Args:
+        func (Callable): Function to apply
+        items (Iterable): Items to apply the function to
+        threads (int): Number of threads. With 1, items are processed serially.
+
+    Returns:
+        list: Results of func for each item, in order.
+    """
+    items = list(items)
+    threads = min(threads, len(items))
+
+    if threads <= 1:
+        return [func(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(func, items))
@@ -1,210 +1,822 @@
-from collections import Counter, defaultdict
-from typing import Counter, Dict, List, Tuple
+from csv import QUOTE_NONE
+from dataclasses import dataclass, field
+from functools import cached_property, partial
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from numpy import (
+    arange,
+    argpartition,
+    argsort,
+    array,
+    asarray,
+    bincount,
+    concatenate,
+    cumsum,
+    diff,
+    flatnonzero,
+    float64,
+    full,
+    int64,
+    isin,
+    load,
+    maximum,
+    ndarray,
+    repeat,
+    savez,
+    searchsorted,
+    take_along_axis,
+    tile,
+    unique,
+    zeros,
+)
+from pandas import DataFrame, concat, factorize, read_table
+from scipy.sparse import csr_matrix
+
+from microview.alpha_diversity import alpha_diversity
+from microview.cache import ReportCache
+from microview.compression import open_report
+from microview.defaults import DEFAULT_PCOA_DIMENSIONS, DEFAULT_TOP_TAXA
+from microview.distance import braycurtis_distances, row_sums
+from microview.file_finder import Sample, check_report_names
+from microview.parallel import parallel_map
+from microview.profiling import Profiler, measure, profile_stage
+from microview.rarefaction import rarefaction_curves
+from microview.taxonomy_tree import TaxonTree, build_tree, clade_counts, concat_trees
+
+if TYPE_CHECKING:
+    from skbio.stats.ordination import OrdinationResults
+
+KAIJU_COLUMNS = ["percent", "reads", "taxon_id", "taxon_name"]
+
+KRAKEN_COLUMNS = [
+    "percent",
+    "reads_root",
+    "reads",
+    "rank_code",
+    "taxid",
+    "taxon_name",
+]
+
+KRAKEN_DTYPES = {
+    "percent": float64,
+    "reads_root": int64,
+    "reads": int64,
+    "taxid": int64,
+}
+
+# Number of lines read at a time when streaming Kraken-style reports
+KRAKEN_CHUNK_SIZE = 100_000
+
+UNASSIGNED_CATEGORIES = ["unclassified", "cannot be assigned"]
+
+# Number of counts padded into a dense block at a time, when selecting top taxa
+TOP_TAXA_BLOCK_SIZE = 2**22
+
+# Category of reads classified, but not down to the rank counts are rolled up to
+ABOVE_RANK = "assigned above rank"
+
+# Taxonomy IDs categories are counted under. Kraken reports unclassified
+# reads under 0, and NCBI taxonomy IDs are all positive.
+CATEGORY_TAXIDS = {"unclassified": 0, "cannot be assigned": -1, ABOVE_RANK: -2}
+
+# Taxonomy ID of other categories, kaiju2table rows without a taxonomy ID,
+# such as reads of taxa below its -m or -c thresholds
+NO_TAXID = -3
+
+
+@dataclass
+class SampleStats:
+    """
+    Read stats of a single sample
+
+    Assigned taxa are kept as aligned arrays, so that the taxon with
+    taxonomy ID taxids[i] and name names[i] was assigned n_reads[i]
+    reads, percent[i] of the sample. Unassigned
+    categories ('unclassified' and 'cannot be assigned') found in
+    the report, and Kaiju rows without a taxonomy ID, by name, map to
+    their read counts. Kraken-style reports also
+    keep their whole taxonomy tree, so counts can be rolled up to a rank.
+    """
+
+    taxids: ndarray
+    names: ndarray
+    n_reads: ndarray
+    percent: ndarray
+    unassigned: Dict[str, int] = field(default_factory=dict)
+    tree: Optional[TaxonTree] = None
+
+
+@dataclass
+class TaxonCounts:
+    """
+    Sample by taxon read counts, stored as a sparse matrix
+
+    Row i of matrix holds the read counts of samples[i] and column j
+    those assigned to the taxon with taxonomy ID taxids[j]. names[j] is
+    that taxon's name, so taxids and names make up a single table of
+    names shared by every sample.
+    """
+
+    samples: List[str]
+    taxids: ndarray
+    names: ndarray
+    matrix: csr_matrix
+
+    @cached_property
+    def taxon_index(self) -> Dict[int, int]:
+        """
+        Column of each taxonomy ID in the count matrix
+        """
+        return {taxid: column for column, taxid in enumerate(self.taxids.tolist())}
+
+    @cached_property
+    def labels(self) -> ndarray:
+        """
+        Name of each taxon, followed by its taxonomy ID when others share it
+        """
+        labels = self.names.copy()
+        _, inverse, name_counts = unique(
+            self.names.astype(str), return_inverse=True, return_counts=True
+        )
+        shared = flatnonzero(name_counts[inverse] > 1)
+        labels[shared] = [
+            f"{self.names[i]} ({self.taxids[i]})" for i in shared.tolist()
+        ]
+        return labels
+
+    @cached_property
+    def sample_index(self) -> Dict[str, int]:
+        """
+        Row of each sample in the count matrix
+        """
+        return {sample: row for row, sample in enumerate(self.samples)}
+
+    def to_arrays(self) -> Dict[str, ndarray]:
+        """
+        Get the arrays that make up the counts, e.g. for numpy.savez
+        """
+        return {
+            "samples": array(self.samples, dtype=str),
+            "taxids": self.taxids,
+            "names": self.names.astype(str),
+            "data": self.matrix.data,
+            "indices": self.matrix.indices,
+            "indptr": self.matrix.indptr,
+            "shape": array(self.matrix.shape),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "TaxonCounts":
+        """
+        Rebuild counts from the arrays of TaxonCounts.to_arrays
+        """
+        return cls(
+            samples=arrays["samples"].tolist(),
+            taxids=arrays["taxids"],
+            names=arrays["names"].astype(object),
+            matrix=csr_matrix(
+                (arrays["data"], arrays["indices"], arrays["indptr"]),
+                shape=tuple(arrays["shape"]),
+            ),
+        )
+
+    def to_long(self) -> DataFrame:
+        """
+        Get the nonzero counts as a long table, with a row per sample and taxon
+        """
+        coo = self.matrix.tocoo()
+        return DataFrame(
+            {
+                "sample": array(self.samples, dtype=object)[coo.row],
+                "taxid": self.taxids[coo.col],
+                "taxon": self.names[coo.col],
+                "reads": coo.data,
+            }
+        )
+
+
+def save_counts(counts: TaxonCounts, counts_path: Path) -> None:
+    """
+    Save a count matrix to a .npz file, loadable with load_counts
 
-from numpy import NaN, count_nonzero, log
-from pandas import DataFrame, read_table
-from skbio.diversity import alpha_diversity, beta_diversity
-from skbio.stats.ordination import pcoa
+    Args:
+        counts (TaxonCounts): Counts to save
+        counts_path (Path): Path to the .npz file
+    """
+    with open(counts_path, "wb") as f:
+        savez(f, **counts.to_arrays())
 
-from microview.file_finder import Sample
 
+def load_counts(counts_path: Path) -> TaxonCounts:
+    """
+    Load a count matrix saved with save_counts
 
-def parse_reports(samples: List[Sample]) -> dict:
+    Args:
+        counts_path (Path): Path to the .npz file
+
+    Returns:
+        TaxonCounts: The saved counts
+    """
+    with load(counts_path) as saved:
+        return TaxonCounts.from_arrays(saved)
+
+
+def parse_report(sample: Sample) -> Tuple[str, SampleStats]:
+    """
+    Parse a single taxonomy result
+
+    Args:
+        sample (Sample): Sample to parse, comprising the report path
+          and a string specifying the report type.
+
+    Returns:
+        tuple: The sample name and its SampleStats, with assigned taxa
+            and unassigned read counts.
+    """
+    if sample.report_type == "kaiju":
+        with open_report(sample.report, threaded=True) as f:
+            df = read_table(f, header=0, usecols=KAIJU_COLUMNS)
+        sample_stats = parse_kaiju2table(df)
+    elif sample.report_type == "kraken":
+        sample_stats = parse_kraken_report(iter_kraken_records(sample.report))
+
+    return sample.report.name, sample_stats
+
+
+def parse_reports(
+    samples: List[Sample],
+    jobs: int = 1,
+    cache: Optional[ReportCache] = None,
+    profiler: Optional[Profiler] = None,
+) -> Dict[str, SampleStats]:
     """
     Parse taxonomy results
 
     Args:
         samples (List[Sample]): List of samples, an object comprising two attributes,
           one the report path, the other a string specifying the report type.
+        jobs (int): Number of worker processes to parse reports with. Results
+            are the same, and in the same order, regardless of this number.
+        cache (ReportCache): Cache of previously parsed reports, if any. Only
+            reports missing from it are parsed, and then added to it.
+        profiler (Profiler): Profiler to record the time spent parsing each
+            report with, if any.
 
     Returns:
-        dict: Dict of each sample as key and every value differentiating
-            assigned (and respective taxons) and unassigned read counts and
-            percentages.
+        dict: Dict of each sample as key and its SampleStats as value,
+            differentiating assigned (and respective taxons) and unassigned
+            read counts.
+
+    """
+    check_report_names(sample.report for sample in samples)
+
+    parsed_stats: Dict[Path, SampleStats] = {}
+    if cache is not None:
+        for sample in samples:
+            entry = cache.get(sample.report)
+            if entry is not None:
+                parsed_stats[sample.report] = entry["stats"]
+
+    not_cached = [sample for sample in samples if sample.report not in parsed_stats]
+    if profiler is None:
+        results = parallel_map(parse_report, not_cached, jobs)
+    else:
+        results = []
+        for sample, (result, timing) in zip(
+            not_cached, parallel_map(partial(measure, parse_report), not_cached, jobs)
+        ):
+            profiler.record_sample(sample.report.name, timing)
+            results.append(result)
+
+    for sample, (_, sample_stats) in zip(not_cached, results):
+        if cache is not None:
+            cache.put(sample.report, sample.report_type, sample_stats)
+        parsed_stats[sample.report] = sample_stats
+
+    if cache is not None:
+        cache.save()
+
+    return {sample.report.name: parsed_stats[sample.report] for sample in samples}
+
+
+def build_sample_stats(
+    taxids,
+    names,
+    n_reads,
+    percent,
+    unassigned: Dict[str, int],
+    tree: Optional[TaxonTree] = None,
+) -> SampleStats:
+    """
+    Build SampleStats from assigned taxa columns
 
+    When a taxonomy ID shows up more than once, it keeps the position of its
+    first occurrence and the name and counts of its last one.
     """
-    parsed_stats: Dict[str, dict] = {}
+    assigned = DataFrame(
+        {"names": names, "n_reads": n_reads, "percent": percent},
+        index=asarray(taxids, dtype=int64),
+    )
 
-    for sample in samples:
-        header = None if sample.report_type == "kraken" else 0
-        df = read_table(sample.report, header=header).replace({"None": NaN}, regex=True)
+    if assigned.index.has_duplicates:
+        assigned = assigned.groupby(level=0, sort=False).last()
 
-        sample_name = sample.report.name
-        parsed_stats[sample_name] = defaultdict(lambda: {"n_reads": 0, "percent": 0})
-        parsed_stats[sample_name].update({"assigned": {}})
+    return SampleStats(
+        taxids=assigned.index.to_numpy(),
+        names=assigned["names"].to_numpy(dtype=object),
+        n_reads=assigned["n_reads"].to_numpy(),
+        percent=assigned["percent"].to_numpy(),
+        unassigned=unassigned,
+        tree=tree,
+    )
 
-        if sample.report_type == "kaiju":
-            parse_kaiju2table(sample_name, df, parsed_stats)
-        elif sample.report_type == "kraken":
-            parse_kraken_report(sample_name, df, parsed_stats)
 
-    return parsed_stats
+def get_unassigned(df, masks: Dict) -> Dict[str, int]:
+    """
+    Get read counts of unassigned categories present in a report
+    """
+    return {
+        category: df["reads"][mask].iloc[-1]
+        for category, mask in masks.items()
+        if mask.any()
+    }
 
 
-def parse_kaiju2table(sample_name: str, df, parsed_stats: Dict) -> None:
+def parse_kaiju2table(df) -> SampleStats:
     """
     Parses kaiju report
+
+    Rows without a taxonomy ID, like the reads of taxa below the -m or -c
+    thresholds of kaiju2table, are kept as categories named after them.
+    """
+    taxon_names = df["taxon_name"]
+
+    unclassified = taxon_names == "unclassified"
+    cannot_assign = taxon_names.str.startswith("cannot", na=False)
+    no_taxid = ~(unclassified | cannot_assign) & df["taxon_id"].isna()
+    assigned = ~(unclassified | cannot_assign | no_taxid)
+
+    unassigned = get_unassigned(
+        df, {"unclassified": unclassified, "cannot be assigned": cannot_assign}
+    )
+    unassigned.update(
+        df["reads"][no_taxid].groupby(taxon_names[no_taxid], sort=False).last()
+    )
+
+    # The taxon is the last non-empty field of the semicolon-separated lineage
+    leaf_names = taxon_names[assigned].str.rstrip(";").str.rpartition(";")[2]
+
+    return build_sample_stats(
+        df["taxon_id"][assigned].astype(int64),
+        leaf_names.to_numpy(),
+        df["reads"][assigned].to_numpy(),
+        df["percent"][assigned].to_numpy(),
+        unassigned,
+    )
+
+
+def iter_kraken_records(
+    report: Path, chunk_size: int = KRAKEN_CHUNK_SIZE
+) -> Iterator[DataFrame]:
     """
-    for row in df.itertuples():
-        row_dict = {"n_reads": row.reads, "percent": row.percent}
-        if row.taxon_name == "unclassified":
-            parsed_stats[sample_name].update({"unclassified": row_dict})
-        elif row.taxon_name.startswith("cannot"):
-            parsed_stats[sample_name].update({"cannot be assigned": row_dict})
-        else:
-            taxon_name: str = list(filter(None, row.taxon_name.split(";")))[-1]
-            parsed_stats[sample_name]["assigned"][taxon_name] = row_dict
+    Stream records of a Kraken-style report in chunks
 
+    At most chunk_size lines are held in memory at a time. Lines without
+    reads assigned to them or to their descendants, other than unclassified
+    ones, are dropped as soon as they are read, so reports made with
+    --report-zero-counts don't cost more memory than regular ones.
 
-def parse_kraken_report(sample_name: str, df, parsed_stats: Dict) -> None:
+    Compressed reports are decompressed in a background thread,
+    alongside parsing.
+
+    Args:
+        report (Path): Path to the Kraken-style report, compressed or not
+        chunk_size (int): Number of lines to read at a time
+
+    Yields:
+        DataFrame: Records with percent, reads_root, reads, rank_code, taxid
+            and taxon_name columns, the taxon name still indented.
+    """
+    with open_report(report, threaded=True) as f, read_table(
+        f,
+        header=None,
+        names=KRAKEN_COLUMNS,
+        usecols=KRAKEN_COLUMNS,
+        dtype=KRAKEN_DTYPES,
+        quoting=QUOTE_NONE,
+        na_filter=False,
+        chunksize=chunk_size,
+    ) as reader:
+        for chunk in reader:
+            yield chunk[(chunk["reads_root"] > 0) | (chunk["rank_code"] == "U")]
+
+
+def parse_kraken_report(records: Iterable[DataFrame]) -> SampleStats:
     """
     Parse Kraken-style report
+
+    Args:
+        records (Iterable[DataFrame]): Chunks of report records, as yielded by
+            microview.parse_taxonomy.iter_kraken_records
+
+    Returns:
+        SampleStats: Assigned taxa and unassigned read counts of the report
+    """
+    df = concat(list(records), ignore_index=True)
+
+    unclassified = df["rank_code"] == "U"
+    assigned = ~unclassified & (df["reads"] > 0)
+
+    # Taxa are indented by two spaces per level of the tree
+    indented_names = df["taxon_name"][~unclassified]
+    taxon_names = indented_names.str.lstrip()
+    tree = build_tree(
+        df["taxid"][~unclassified],
+        taxon_names.str.rstrip(),
+        df["rank_code"][~unclassified],
+        (indented_names.str.len() - taxon_names.str.len()) // 2,
+        df["reads"][~unclassified],
+    )
+
+    return build_sample_stats(
+        df["taxid"][assigned],
+        df["taxon_name"][assigned].str.strip().to_numpy(),
+        df["reads"][assigned].to_numpy(),
+        df["percent"][assigned].to_numpy(),
+        get_unassigned(df, {"unclassified": unclassified}),
+        tree,
+    )
+
+
+def rollup_to_rank(
+    samples_stats: Dict[str, SampleStats], rank: str
+) -> Dict[str, SampleStats]:
     """
-    df.columns = [
-        "percent",
-        "reads_root",
-        "reads",
-        "rank_code",
-        "taxid",
-        "taxon_name",
+    Count the reads of each sample under the taxa of a single rank
+
+    Each taxon of the rank gets the reads assigned to it or to any of its
+    descendants, and reads classified only above the rank, or in branches
+    without it, are counted as ABOVE_RANK. The trees of every sample are
+    joined into one forest, so a single pass counts them all. Samples
+    without a tree, from Kaiju, are already at the rank kaiju2table was
+    run with, and are kept as they are.
+
+    Args:
+        samples_stats (dict): Dict resulting from
+            microview.parse_taxonomy.parse_reports
+        rank (str): Rank code to roll up to, one of microview.defaults.RANKS
+
+    Returns:
+        dict: Dict of each sample as key and its SampleStats at the rank as value.
+    """
+    with_tree = [
+        sample_name
+        for sample_name, sample_stats in samples_stats.items()
+        if sample_stats.tree is not None
     ]
+    if len(with_tree) == 0:
+        return samples_stats
+
+    trees = [samples_stats[sample_name].tree for sample_name in with_tree]
+    forest = concat_trees(trees)
+    clades = clade_counts(forest)
+
+    nodes = flatnonzero((forest.ranks == rank) & (clades > 0))
+    node_samples = repeat(arange(len(trees)), [len(tree) for tree in trees])[nodes]
+    starts = searchsorted(node_samples, arange(len(trees) + 1))
+
+    rolled_up = dict(samples_stats)
+    for i, sample_name in enumerate(with_tree):
+        sample_nodes = nodes[starts[i] : starts[i + 1]]
+        n_reads = clades[sample_nodes]
+        unassigned = dict(samples_stats[sample_name].unassigned)
+        total = trees[i].n_reads.sum() + sum(unassigned.values())
+
+        above_rank = trees[i].n_reads.sum() - n_reads.sum()
+        if above_rank > 0:
+            unassigned[ABOVE_RANK] = above_rank
+
+        rolled_up[sample_name] = SampleStats(
+            taxids=forest.taxids[sample_nodes],
+            names=forest.names[sample_nodes],
+            n_reads=n_reads,
+            percent=n_reads / total * 100,
+            unassigned=unassigned,
+            tree=trees[i],
+        )
 
-    for row in df.itertuples():
-        row_dict = {"n_reads": row.reads, "percent": row.percent}
-        if row.rank_code == "U":
-            parsed_stats[sample_name].update({"unclassified": row_dict})
-        else:
-            if row.reads > 0:
-                taxon_name = row.taxon_name.strip()
-                parsed_stats[sample_name]["assigned"][taxon_name] = row_dict
+    return rolled_up
 
 
-def get_taxon_counts(samples_stats: Dict) -> Dict:
+def first_occurrences(codes: ndarray) -> ndarray:
     """
-    Agreggates taxon counts across all samples into single Counter
+    Find where each code of pandas.factorize first shows up
+
+    Codes first show up in increasing order, so each first occurrence is
+    where the running maximum grows, found without sorting.
+    """
+    running_max = maximum.accumulate(codes)
+    return flatnonzero(diff(running_max, prepend=-1) > 0)
+
+
+def get_taxon_counts(
+    samples_stats: Dict[str, SampleStats], rank: Optional[str] = None
+) -> TaxonCounts:
+    """
+    Agreggates taxon counts across all samples into a sparse count matrix
+
+    Unassigned categories are counted as taxa too, under CATEGORY_TAXIDS,
+    or NO_TAXID for Kaiju rows without a taxonomy ID.
+    Taxa are told apart by taxonomy ID alone, and get a column in order of
+    first appearance across samples. Each is named once, after its first
+    appearance, in a table shared by every sample.
 
     Args:
         samples_stats (dict): Dict resulting from
             microview.parse_taxonomy.parse_reports
+        rank (str): Rank code to roll Kraken-style counts up to, see
+            rollup_to_rank. Without one, taxa of every rank are counted
+            with the reads assigned directly to them.
 
     Returns:
-        Counter: Counter containing agreggated read counts across all samples
+        TaxonCounts: Sample by taxon read counts across all samples
 
     """
-    all_sample_counts: Dict = {}
+    if rank is not None:
+        samples_stats = rollup_to_rank(samples_stats, rank)
+
+    sample_names = list(samples_stats.keys())
+
+    taxids = [
+        concatenate(
+            [
+                data.taxids,
+                [
+                    CATEGORY_TAXIDS.get(category, NO_TAXID)
+                    for category in data.unassigned
+                ],
+            ]
+        ).astype(int64)
+        for data in samples_stats.values()
+    ]
+    names = [
+        concatenate([data.names, list(data.unassigned.keys())])
+        for data in samples_stats.values()
+    ]
+    n_reads = [
+        concatenate([data.n_reads, list(data.unassigned.values())])
+        for data in samples_stats.values()
+    ]
+    rows = repeat(arange(len(sample_names)), [len(ids) for ids in taxids])
 
-    for sample, data in samples_stats.items():
-        all_sample_counts[sample] = Counter()
-        for category, cat_data in data.items():
-            if category == "assigned":
-                for tax_name, info in cat_data.items():
-                    all_sample_counts[sample][tax_name] += info["n_reads"]
-            else:
-                all_sample_counts[sample][category] += cat_data["n_reads"]
+    columns, unique_taxids = factorize(concatenate(taxids))
 
-    return all_sample_counts
+    matrix = csr_matrix(
+        (concatenate(n_reads).astype(int64), (rows, columns)),
+        shape=(len(sample_names), len(unique_taxids)),
+    )
+    matrix.eliminate_zeros()
 
+    return TaxonCounts(
+        samples=sample_names,
+        taxids=asarray(unique_taxids, dtype=int64),
+        names=concatenate(names).astype(object)[first_occurrences(columns)],
+        matrix=matrix,
+    )
 
-def get_read_assignment(parsed_stats: Dict) -> Dict:
+
+def get_read_assignment(counts: TaxonCounts) -> Dict:
     """
     Get number of assigned/unassigned reads for each sample
 
     Args:
-        parsed_stats (dict): Dict result from
-            microview.parse_taxonomy.parse_reports
+        counts (TaxonCounts): Count matrix resulting from
+            microview.parse_taxonomy.get_taxon_counts
 
     Returns:
         dict: Dict differentiating assigned / unassigned number of reads
-            for each sample.
+            for each sample, and, for counts rolled up to a rank, those
+            assigned above it.
     """
-    results: Dict[str, dict] = {}
-    for sample_name, _ in parsed_stats.items():
-        results[sample_name] = {"assigned": 0, "unassigned": 0}
-        assigned = sum(
-            d["n_reads"] for d in parsed_stats[sample_name]["assigned"].values()
-        )
 
-        unassigned = (
-            parsed_stats[sample_name]["cannot be assigned"]["n_reads"]
-            + parsed_stats[sample_name]["unclassified"]["n_reads"]
-        )
+    def column_sums(categories) -> ndarray:
+        taxids = [CATEGORY_TAXIDS[category] for category in categories]
+        columns = isin(counts.taxids, taxids)
+        return asarray(counts.matrix[:, columns].sum(axis=1)).ravel()
+
+    total = row_sums(counts.matrix)
+    categories = {"unassigned": column_sums(UNASSIGNED_CATEGORIES)}
+    if CATEGORY_TAXIDS[ABOVE_RANK] in counts.taxon_index:
+        categories["above rank"] = column_sums([ABOVE_RANK])
+    assigned = total - sum(categories.values())
+
+    return {
+        sample_name: {
+            "assigned": (assigned[i] / total[i]) * 100,
+            **{
+                category: (category_reads[i] / total[i]) * 100
+                for category, category_reads in categories.items()
+            },
+        }
+        for i, sample_name in enumerate(counts.samples)
+    }
+
+
+def ragged_positions(starts: ndarray, lengths: ndarray) -> Tuple[ndarray, ndarray]:
+    """
+    Get the positions of many consecutive ranges, and the offset of each in its range
+    """
+    range_starts = repeat(cumsum(lengths) - lengths, lengths)
+    offsets = arange(lengths.sum()) - range_starts
+    return repeat(starts, lengths) + offsets, offsets
 
-        total = assigned + unassigned
-        results[sample_name]["assigned"] = (assigned / total) * 100
-        results[sample_name]["unassigned"] = (unassigned / total) * 100
 
-    return results
+def row_top_k(matrix: csr_matrix, k: int) -> ndarray:
+    """
+    Select the k largest counts of every row of a sparse count matrix
+
+    Rows are padded into dense blocks of about TOP_TAXA_BLOCK_SIZE counts,
+    and each block partially sorted at once. Ties are broken in column
+    order, so each row keeps the counts a stable sort of it would put first.
 
+    Args:
+        matrix (csr_matrix): Sample by taxon matrix of integer counts
+        k (int): Number of counts to keep of each row
 
-def get_common_taxas(sample_counts: Dict) -> Dict:
+    Returns:
+        ndarray: Positions of the selected counts in matrix.data, by row and
+            then from largest to smallest count.
+    """
+    n_counts = diff(matrix.indptr)
+    rows_per_block = max(1, TOP_TAXA_BLOCK_SIZE // max(n_counts.max(initial=0), 1))
+
+    selected = [zeros(0, dtype=int64)]
+    for start in range(0, matrix.shape[0], rows_per_block):
+        block = arange(start, min(start + rows_per_block, matrix.shape[0]))
+        width = n_counts[block].max()
+        if width == 0:
+            continue
+
+        # Among equal counts, those further left get larger keys
+        positions, offsets = ragged_positions(matrix.indptr[block], n_counts[block])
+        keys = full((len(block), width), -1, dtype=int64)
+        keys[repeat(arange(len(block)), n_counts[block]), offsets] = matrix.data[
+            positions
+        ] * width + (width - 1 - offsets)
+
+        block_k = min(k, width)
+        top = argpartition(keys, width - block_k, axis=1)[:, width - block_k :]
+        top_keys = take_along_axis(keys, top, axis=1)
+        order = argsort(-top_keys, axis=1)
+        top = take_along_axis(top, order, axis=1)
+
+        # Padding is selected only in rows with fewer than k counts
+        kept = take_along_axis(top_keys, order, axis=1) >= 0
+        selected.append((matrix.indptr[block][:, None] + top)[kept])
+
+    return concatenate(selected)
+
+
+def get_common_taxas(
+    counts: TaxonCounts,
+    top_taxa: int = DEFAULT_TOP_TAXA,
+    top_taxa_mode: str = "sample",
+) -> DataFrame:
     """
-    Get 5 most common taxas for each sample
+    Get the most common taxa of each sample
 
     Args:
-        sample_counts (dict): Dict resulting from
+        counts (TaxonCounts): Count matrix resulting from
             microview.parse_taxonomy.get_taxon_counts
+        top_taxa (int): Number of taxa to show for each sample
+        top_taxa_mode (str): 'sample' to show the most abundant taxa of each
+            sample, or 'global' to show the same taxa for every sample, those
+            with the highest mean relative abundance across samples.
 
     Returns:
-        dict: Dict with 5 most common taxons for each sample
-            plus an 'other' key agreggating other taxon counts.
-    """
-    most_common: Dict = {}
-    for sample in sample_counts.keys():
-        sample_total = sum(sample_counts[sample].values())
-        most_common_vals = sample_counts[sample].most_common(5)
-        other = sample_total - sum(v for _, v in most_common_vals)
-        most_common[sample] = {
-            k: round((v / sample_total) * 100, 2) for k, v in most_common_vals
+        DataFrame: Long dataframe with the percent of reads ('value') of each
+            sample ('index') assigned to each of its most common taxa
+            ('variable'), plus an 'other' variable aggregating other taxa.
+    """
+    matrix = counts.matrix
+    sample_totals = row_sums(matrix)
+    samples = array(counts.samples, dtype=object)
+
+    if top_taxa_mode == "sample":
+        positions = row_top_k(matrix, top_taxa)
+        rows = searchsorted(matrix.indptr, positions, side="right") - 1
+        columns = matrix.indices[positions]
+        top_reads = matrix.data[positions]
+    elif top_taxa_mode == "global":
+        n_counts = diff(matrix.indptr)
+        rel_abundance = matrix.data / repeat(sample_totals, n_counts)
+        abundance = bincount(matrix.indices, rel_abundance, minlength=matrix.shape[1])
+        top_columns = argsort(-abundance, kind="stable")[:top_taxa]
+
+        # Every sample shows the same taxa, even those it has no reads of
+        rows = repeat(arange(matrix.shape[0]), len(top_columns))
+        columns = tile(top_columns, matrix.shape[0])
+        top_reads = matrix[:, top_columns].toarray().ravel()
+    else:
+        raise ValueError(f"Unknown top taxa mode: {top_taxa_mode}")
+
+    other = sample_totals - bincount(rows, top_reads, minlength=matrix.shape[0])
+
+    most_common_df = DataFrame(
+        {
+            "index": concatenate([samples[rows], samples]),
+            "variable": concatenate(
+                [counts.labels[columns], repeat("other", matrix.shape[0])]
+            ),
+            "value": concatenate(
+                [
+                    (top_reads / sample_totals[rows] * 100).round(2),
+                    other / sample_totals * 100,
+                ]
+            ),
         }
-        most_common[sample]["other"] = (other / sample_total) * 100
-    return most_common
+    )
 
+    return most_common_df.sort_values(
+        ["index", "variable"], ascending=False, ignore_index=True
+    )
 
-def calculate_abund_diver(sample_counts: Dict) -> Tuple[DataFrame]:
+
+def calculate_alpha_diversity(counts: TaxonCounts) -> DataFrame:
     """
-    Calculate alpha diversity, beta diversity and pielou evenness in samples
+    Calculate alpha diversity, number of taxas and evenness in samples
 
     Args:
-        sample_counts (dict): Dict resulting from
+        counts (TaxonCounts): Count matrix resulting from
             microview.parse_taxonomy.get_taxon_counts
 
     Returns:
-        tuple: Two dataframes, first one containing sample name,
-            number of taxas, alpha diversity and Pielou's evenness;
-            Second one containing a PCoA of the beta diversity result.
+        DataFrame: Dataframe containing sample name and a column for
+            each metric of microview.alpha_diversity.ALPHA_METRICS,
+            starting with Shannon's diversity, number of taxas and
+            Pielou's evenness.
     """
-    taxa_counts_df = DataFrame(sample_counts).T.fillna(0)
-    ids = taxa_counts_df.index
+    return DataFrame(
+        {"index": counts.samples, **alpha_diversity(counts.matrix)},
+    )
 
-    shannon_div = alpha_diversity("shannon", taxa_counts_df.to_numpy(), ids)
 
-    div_abund_df = DataFrame(shannon_div, columns=["Shannon Diversity"]).reset_index()
+def calculate_abund_diver(
+    counts: TaxonCounts,
+    jobs: int = 1,
+    pcoa_method: str = "auto",
+    pcoa_dimensions: int = DEFAULT_PCOA_DIMENSIONS,
+) -> Tuple[DataFrame]:
+    """
+    Calculate alpha diversity, beta diversity and pielou evenness in samples
 
-    div_abund_df["N Taxas"] = count_nonzero(taxa_counts_df.to_numpy(), axis=1)
+    Args:
+        counts (TaxonCounts): Count matrix resulting from
+            microview.parse_taxonomy.get_taxon_counts
+        jobs (int): Number of worker processes to calculate distances with.
+        pcoa_method (str): 'exact', 'approximate' or 'auto', see
+            microview.ordination.run_pcoa
+        pcoa_dimensions (int): Number of PCoA axes calculated when approximating.
 
-    # Pielou's evenness = diversity divided by the log specnumber
-    div_abund_df["Pielou Evenness"] = div_abund_df["Shannon Diversity"] / log(
-        div_abund_df["N Taxas"]
-    )
+    Returns:
+        tuple: Two dataframes, first one containing sample name and
+            alpha diversity metrics, see calculate_alpha_diversity;
+            Second one containing a PCoA of the beta diversity result.
+    """
+    div_abund_df = calculate_alpha_diversity(counts)
 
     # Beta diversity analysis
-    if len(ids) > 1:
+    if len(counts.samples) > 1:
+        # Imported here, so parsing alone doesn't load scikit-bio
+        from skbio import DistanceMatrix
+
+        from microview.ordination import run_pcoa
+
         # Don't calculate beta div when there is only one sample
-        beta_div = beta_diversity(
-            metric="braycurtis",
-            counts=taxa_counts_df.to_numpy(),
-            ids=ids,
-            validate=True,
+        beta_div = DistanceMatrix(
+            braycurtis_distances(counts.matrix, jobs), counts.samples
         )
 
-        betadiv_pcoa = pcoa(beta_div)
+        betadiv_pcoa = run_pcoa(beta_div, pcoa_method, pcoa_dimensions)
 
         return div_abund_df, betadiv_pcoa
     else:
         return div_abund_df, None
 
 
-def get_tax_data(samples: List[Sample]) -> Dict:
+def get_tax_data(
+    samples: List[Sample],
+    jobs: int = 1,
+    cache: Optional[ReportCache] = None,
+    state_path: Optional[Path] = None,
+    profiler: Optional[Profiler] = None,
+    pcoa_method: str = "auto",
+    pcoa_dimensions: int = DEFAULT_PCOA_DIMENSIONS,
+    rank: Optional[str] = None,
+    top_taxa: int = DEFAULT_TOP_TAXA,
+    top_taxa_mode: str = "sample",
+) -> Dict:
     """
     Master function for generating stats from taxonomic classification results
 
@@ -215,36 +827,104 @@ def get_tax_data(samples: List[Sample]) -> Dict:
     Args:
         samples (List[Sample]): List of samples, an object comprising two attributes,
           one the report path, the other a string specifying the report type.
+        jobs (int): Number of worker processes to parse reports and calculate
+            distances with.
+        cache (ReportCache): Cache of previously parsed reports, if any.
+        state_path (Path): Path to a file with the aggregate state of a previous
+            run. When given, only samples missing from it are parsed and have
+            their metrics calculated, and the state is updated.
+        profiler (Profiler): Profiler to record each stage with, if any.
+        pcoa_method (str): 'exact', 'approximate' or 'auto', see
+            microview.ordination.run_pcoa
+        pcoa_dimensions (int): Number of PCoA axes calculated when approximating.
+        rank (str): Rank code to roll Kraken-style counts up to, if any.
+        top_taxa (int): Number of most common taxa to show for each sample
+        top_taxa_mode (str): 'sample' or 'global', see get_common_taxas
 
     Returns:
-        dict: Dict with 4 keys: 'sample n reads' containing read assignment stats;
-            'common taxas' containing the 5 most common taxas and their respective
-            counts in each sample; 'abund and div' containing abundance and diversity
-            metrics; and 'beta div' containing a PCoA of beta diversity results.
+        dict: Dict with 6 keys: 'sample n reads' containing read assignment stats;
+            'common taxas' containing the top_taxa most common taxas and their
+            respective counts in each sample; 'abund and div' containing abundance
+            and diversity metrics; 'beta div' containing a PCoA of beta diversity
+            results; 'rarefaction' containing the rarefaction curve of each
+            sample; and 'counts' containing the TaxonCounts of every sample.
     """
 
-    parsed_stats = parse_reports(samples)
+    if state_path is None:
+        with profile_stage(profiler, "parse_reports"):
+            parsed_stats = parse_reports(samples, jobs, cache, profiler)
 
-    all_sample_counts = get_taxon_counts(parsed_stats)
+        with profile_stage(profiler, "get_taxon_counts"):
+            counts = get_taxon_counts(parsed_stats, rank)
 
-    n_reads = get_read_assignment(parsed_stats)
+        with profile_stage(profiler, "calculate_abund_diver"):
+            abund_div_df, betadiv_pcoa = calculate_abund_diver(
+                counts, jobs, pcoa_method, pcoa_dimensions
+            )
+    else:
+        # Imported here, since microview.state builds on this module
+        from microview.state import load_state, save_state, update_state
+
+        with profile_stage(profiler, "update_state"):
+            state = update_state(
+                load_state(state_path, rank), samples, jobs, cache, profiler, rank
+            )
+            save_state(state, state_path, rank)
+
+        counts = state.counts
+        abund_div_df = state.alpha
+        with profile_stage(profiler, "pcoa"):
+            from skbio import DistanceMatrix
+
+            from microview.ordination import run_pcoa
+
+            betadiv_pcoa = (
+                run_pcoa(
+                    DistanceMatrix(state.distances, counts.samples),
+                    pcoa_method,
+                    pcoa_dimensions,
+                )
+                if len(counts.samples) > 1
+                else None
+            )
+
+    with profile_stage(profiler, "summarize_tax_data"):
+        return summarize_tax_data(
+            counts, abund_div_df, betadiv_pcoa, top_taxa, top_taxa_mode
+        )
 
-    most_common = get_common_taxas(all_sample_counts)
 
-    abund_div_df, betadiv_pcoa = calculate_abund_diver(all_sample_counts)
+def summarize_tax_data(
+    counts: TaxonCounts,
+    abund_div_df: DataFrame,
+    betadiv_pcoa: Optional["OrdinationResults"],
+    top_taxa: int = DEFAULT_TOP_TAXA,
+    top_taxa_mode: str = "sample",
+) -> Dict:
+    """
+    Gather read assignment stats, the most common taxa and diversity results
 
-    stats_df = DataFrame(n_reads).T.reset_index().melt(id_vars=["index"])
+    Args:
+        counts (TaxonCounts): Taxon counts of every sample
+        abund_div_df (DataFrame): Alpha diversity of every sample
+        betadiv_pcoa (OrdinationResults): PCoA of beta diversity, if any
+        top_taxa (int): Number of most common taxa to show for each sample
+        top_taxa_mode (str): 'sample' or 'global', see get_common_taxas
 
-    most_common_df = (
-        DataFrame.from_dict(most_common, orient="index")
-        .reset_index()
-        .melt(id_vars=["index"])
-        .sort_values(["index", "variable"], ascending=False)
-    )
+    Returns:
+        dict: Dict with the same keys as get_tax_data.
+    """
+    n_reads = get_read_assignment(counts)
+
+    most_common_df = get_common_taxas(counts, top_taxa, top_taxa_mode)
+
+    stats_df = DataFrame(n_reads).T.reset_index().melt(id_vars=["index"])
 
     return {
         "sample n reads": stats_df,
         "common taxas": most_common_df,
         "abund and div": abund_div_df,
         "beta div": betadiv_pcoa,
+        "rarefaction": rarefaction_curves(counts.matrix, counts.samples),
+        "counts": counts,
     }
@@ -1,10 +1,19 @@
 from pathlib import Path
 from typing import Dict, Optional
 
+from numpy import nan
+from pandas import DataFrame, Series, concat
 from plotly import io
-from plotly.express import bar, colors, line, scatter
+from plotly.express import bar, box, colors, line, scatter
 from plotly.graph_objects import Figure
 
+from microview.alpha_diversity import ALPHA_METRICS
+from microview.defaults import DEFAULT_MAX_BAR_SAMPLES, TABLE_FORMATS
+from microview.parse_taxonomy import TaxonCounts, save_counts
+
+# Number of points above which scatter plots are drawn with WebGL
+WEBGL_THRESHOLD = 1000
+
 
 def export_to_html(fig: Figure, div_id: str) -> str:
     """
@@ -29,15 +38,162 @@ def export_to_html(fig: Figure, div_id: str) -> str:
     )
 
 
-def write_table(df, output_path, path):
+def get_tables_dir(output_path) -> Path:
     """
-    Write a dataframe to a file
+    Get the directory tables are written to, next to the report
     """
     dirpath = Path(output_path).parent.resolve() / Path("microview_tables")
     Path(dirpath).mkdir(exist_ok=True)
-    path = dirpath / path
 
-    df.to_csv(path, sep="\t", index=False)
+    return dirpath
+
+
+def write_table(df, output_path, name, table_format: str = "tsv"):
+    """
+    Write a dataframe to a file
+
+    Args:
+        df (pd.DataFrame): Dataframe to write
+        output_path (Path): Path to the report, tables are written next to it.
+            Nothing is written without one.
+        name (str): File name, without extension
+        table_format (str): One of TABLE_FORMATS
+    """
+    if output_path is None:
+        return
+
+    path = get_tables_dir(output_path) / f"{name}.{table_format}"
+
+    if table_format == "tsv":
+        df.to_csv(path, sep="\t", index=False)
+    elif table_format == "parquet":
+        df.to_parquet(path, index=False)
+    elif table_format == "feather":
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        raise ValueError(f"Unknown table format: {table_format}")
+
+
+def write_counts(counts: TaxonCounts, output_path, table_format: str = "tsv"):
+    """
+    Write the full sample by taxon count matrix
+
+    The sparse matrix is always saved as counts.npz, which
+    microview.parse_taxonomy.load_counts loads back. With a binary table
+    format, the nonzero counts are also written as a long table, with
+    sample, taxon and reads columns.
+
+    Args:
+        counts (TaxonCounts): Count matrix to write
+        output_path (Path): Path to the report, tables are written next to it.
+            Nothing is written without one.
+        table_format (str): One of TABLE_FORMATS
+    """
+    if output_path is None:
+        return
+
+    save_counts(counts, get_tables_dir(output_path) / "counts.npz")
+
+    if table_format != "tsv":
+        write_table(counts.to_long(), output_path, "counts", table_format)
+
+
+def get_render_mode(df) -> str:
+    """
+    Draw scatter plots with WebGL when they have too many points for SVG
+    """
+    return "webgl" if len(df) > WEBGL_THRESHOLD else "svg"
+
+
+def bin_samples(df, max_samples: int, top: Optional[int] = None):
+    """
+    Average the bars of consecutive samples, so bar plots stay responsive
+
+    Samples are sorted by name (and group, if any) and split into bins
+    of equal size, so that at most about max_samples bins are drawn.
+    Each bin is drawn as one bar, labeled with its first and last sample,
+    holding the mean value of each variable over the samples in it.
+    Tables are still written with every sample.
+
+    Args:
+        df (pd.DataFrame): Long dataframe with 'index' (sample), 'variable'
+            and 'value' columns, and optionally 'group'.
+        max_samples (int): Number of samples above which samples are binned
+        top (int): Keep only the top variables of each bin, adding the rest
+            to 'other', as done for each sample by get_common_taxas.
+
+    Returns:
+        pd.DataFrame: df itself if it has max_samples samples or fewer,
+            otherwise a dataframe with the same columns and a bin per 'index'.
+    """
+    group_cols = ["group"] if "group" in df.columns else []
+
+    samples = (
+        df[group_cols + ["index"]]
+        .drop_duplicates()
+        .sort_values(group_cols + ["index"])
+        .reset_index(drop=True)
+    )
+    if len(samples) <= max_samples:
+        return df
+
+    bin_size = -(-len(samples) // max_samples)
+    if group_cols:
+        position = samples.groupby(group_cols, dropna=False).cumcount()
+    else:
+        position = Series(range(len(samples)))
+    samples["bin"] = position // bin_size
+
+    keys = group_cols + ["bin"]
+    bins = (
+        samples.groupby(keys, dropna=False)["index"]
+        .agg(["first", "last", "size"])
+        .reset_index()
+    )
+    bins["label"] = (
+        bins["first"].astype(str)
+        + " … "
+        + bins["last"].astype(str)
+        + " (n="
+        + bins["size"].astype(str)
+        + ")"
+    )
+    samples = samples.merge(bins[keys + ["label", "size"]], on=keys)
+
+    binned = df.merge(
+        samples[group_cols + ["index", "label", "size"]], on=group_cols + ["index"]
+    )
+    bin_keys = group_cols + ["label"]
+    binned = (
+        binned.groupby(bin_keys + ["variable"], dropna=False)
+        .agg(value=("value", "sum"), size=("size", "first"))
+        .reset_index()
+    )
+    # Variables missing from a sample count as 0 towards the mean
+    binned["value"] = binned["value"] / binned["size"]
+
+    if top is not None:
+        rank = (
+            binned["value"]
+            .where(binned["variable"] != "other")
+            .groupby([binned[key] for key in bin_keys], dropna=False)
+            .rank(method="first", ascending=False)
+        )
+        binned.loc[~(rank <= top), "variable"] = "other"
+        binned = (
+            binned.groupby(bin_keys + ["variable"], dropna=False)["value"]
+            .sum()
+            .reset_index()
+        )
+
+    return DataFrame(
+        {
+            **{col: binned[col] for col in group_cols},
+            "index": binned["label"],
+            "variable": binned["variable"],
+            "value": binned["value"],
+        }
+    )
 
 
 def merge_with_contrasts(df, contrast_df, left_colname: Optional[str] = "index"):
@@ -51,11 +207,23 @@ def merge_with_contrasts(df, contrast_df, left_colname: Optional[str] = "index")
     return merged_df
 
 
-def plot_common_taxas(common_taxas_df, output_path, **kwargs):
+def plot_common_taxas(
+    common_taxas_df,
+    output_path,
+    table_format="tsv",
+    max_samples=DEFAULT_MAX_BAR_SAMPLES,
+    **kwargs,
+):
     """
     Generate bar plot with most common taxas
     """
-    write_table(common_taxas_df, output_path, "common_taxas.tsv")
+    write_table(common_taxas_df, output_path, "common_taxas", table_format)
+
+    # Bins show as many taxa as samples do
+    top_taxa = (
+        (common_taxas_df["variable"] != "other").groupby(common_taxas_df["index"]).sum()
+    )
+    common_taxas_df = bin_samples(common_taxas_df, max_samples, top=top_taxa.max())
 
     return bar(
         common_taxas_df.sort_values(by=["value", "variable"], ascending=[False, True]),
@@ -73,11 +241,11 @@ def plot_common_taxas(common_taxas_df, output_path, **kwargs):
     )
 
 
-def plot_abund_div(abund_div_df, output_path, **kwargs):
+def plot_abund_div(abund_div_df, output_path, table_format="tsv", **kwargs):
     """
     Generate scatter plot of Pielou's Evenness and Shannon's Diversity (alpha)
     """
-    write_table(abund_div_df, output_path, "abund_diversity.tsv")
+    write_table(abund_div_df, output_path, "abund_diversity", table_format)
 
     return scatter(
         abund_div_df,
@@ -87,16 +255,95 @@ def plot_abund_div(abund_div_df, output_path, **kwargs):
         hover_data=["index"],
         labels={"N Taxas": "# taxas"},
         template="plotly_white",
+        render_mode=get_render_mode(abund_div_df),
+        color_discrete_sequence=colors.qualitative.Safe[3:],
+        **kwargs,
+    )
+
+
+def plot_alpha_metrics(
+    abund_div_df, max_samples=DEFAULT_MAX_BAR_SAMPLES, **kwargs
+) -> Figure:
+    """
+    Generate box plots of every alpha diversity metric, one panel per metric
+
+    Each sample is drawn as a point next to the boxes, unless there are
+    more than max_samples samples, when only outliers are.
+    """
+    id_vars = ["index"] + (["group"] if "group" in abund_div_df.columns else [])
+    metrics = [metric for metric in ALPHA_METRICS if metric in abund_div_df.columns]
+    metrics_df = abund_div_df.melt(id_vars=id_vars, value_vars=metrics)
+
+    fig = box(
+        metrics_df,
+        y="value",
+        facet_col="variable",
+        facet_col_wrap=4,
+        facet_row_spacing=0.15,
+        points="all" if len(abund_div_df) <= max_samples else "outliers",
+        hover_data=["index"],
+        labels={"index": "Sample name", "value": ""},
+        template="plotly_white",
         color_discrete_sequence=colors.qualitative.Safe[3:],
         **kwargs,
     )
+    # Metrics have their own scales, and their names are enough as titles
+    fig.update_yaxes(matches=None, showticklabels=True)
+    fig.for_each_annotation(lambda a: a.update(text=a.text.split("=")[-1]))
+    return fig
 
 
-def plot_beta_pcoa(beta_pcoa, output_path, **kwargs):
+def plot_rarefaction(
+    rarefaction_df,
+    output_path,
+    table_format="tsv",
+    max_samples=DEFAULT_MAX_BAR_SAMPLES,
+    **kwargs,
+) -> Figure:
+    """
+    Generate line plot of the rarefaction curve of each sample
+
+    Above max_samples samples, curves of the same color are drawn as
+    a single line, broken between samples, so the plot stays responsive.
+    """
+    write_table(rarefaction_df, output_path, "rarefaction", table_format)
+
+    grouped = "group" in rarefaction_df.columns
+    if rarefaction_df["index"].nunique() <= max_samples:
+        color = "group" if grouped else "index"
+        line_group = "index"
+        render_mode = "svg"
+    else:
+        breaks = rarefaction_df.drop_duplicates("index", keep="last").assign(
+            **{"Depth": nan, "Expected Taxas": nan}
+        )
+        rarefaction_df = concat([rarefaction_df, breaks]).sort_index(kind="stable")
+        color = "group" if grouped else None
+        line_group = None
+        render_mode = "webgl"
+
+    fig = line(
+        rarefaction_df,
+        x="Depth",
+        y="Expected Taxas",
+        color=color,
+        line_group=line_group,
+        hover_data=["index"],
+        log_x=True,
+        labels={"index": "Sample name", "Depth": "Reads", "Expected Taxas": "# taxas"},
+        template="plotly_white",
+        render_mode=render_mode,
+        **kwargs,
+    )
+    fig.update_layout(showlegend=grouped)
+    return fig
+
+
+def plot_beta_pcoa(beta_pcoa, output_path, table_format="tsv", **kwargs):
     """
     Generate scatter plot of two first coordinates of Beta Diversity PCoA
     """
-    write_table(beta_pcoa, output_path, "beta_pcoa.tsv")
+    write_table(beta_pcoa, output_path, "beta_pcoa", table_format)
 
     fig = scatter(
         beta_pcoa,
@@ -105,13 +352,20 @@ def plot_beta_pcoa(beta_pcoa, output_path, **kwargs):
         hover_data=["sample"],
         labels={"sample": "Sample name"},
         template="plotly_white",
+        render_mode=get_render_mode(beta_pcoa),
         **kwargs,
     )
     fig.update_traces(marker_size=10)
     return fig
 
 
-def generate_taxo_plots(tax_data: Dict, contrast_df=None, output_path=None) -> Dict:
+def generate_taxo_plots(
+    tax_data: Dict,
+    contrast_df=None,
+    output_path=None,
+    table_format: str = "tsv",
+    max_bar_samples: int = DEFAULT_MAX_BAR_SAMPLES,
+) -> Dict:
     """
     Get all taxonomy plots
 
@@ -122,12 +376,17 @@ def generate_taxo_plots(tax_data: Dict, contrast_df=None, output_path=None) -> D
             microview.parse_taxonomy.get_tax_data
         contrast_df (pd.DataFrame): Dataframe with sample names and
             contrasts, if available.
+        output_path (Path): Path to the report, tables are written next to it.
+            Without one, no tables are written.
+        table_format (str): Format to write tables in, one of TABLE_FORMATS
+        max_bar_samples (int): Number of samples above which bar plots show
+            bins of samples instead, see bin_samples.
 
     Returns:
         dict: Dict containing all plots, one for each key.
     """
     assigned = bar(
-        tax_data["sample n reads"],
+        bin_samples(tax_data["sample n reads"], max_bar_samples),
         x="index",
         y="value",
         color="variable",
@@ -138,7 +397,10 @@ def generate_taxo_plots(tax_data: Dict, contrast_df=None, output_path=None) -> D
         },
         template="plotly_white",
     )
-    write_table(tax_data["sample n reads"], output_path, "classified_reads.tsv")
+    write_table(
+        tax_data["sample n reads"], output_path, "classified_reads", table_format
+    )
+    write_counts(tax_data["counts"], output_path, table_format)
 
     assigned.update_layout(
         xaxis={"categoryorder": "category ascending"},
@@ -164,7 +426,7 @@ def generate_taxo_plots(tax_data: Dict, contrast_df=None, output_path=None) -> D
             .rename(columns={"index": "PC"})
         )
 
-        write_table(var_explained, output_path, "pcoa_variance_explained.tsv")
+        write_table(var_explained, output_path, "pcoa_variance_explained", table_format)
 
         pcoa_var = line(
             var_explained,
@@ -183,28 +445,52 @@ def generate_taxo_plots(tax_data: Dict, contrast_df=None, output_path=None) -> D
         merged_taxas_df = merge_with_contrasts(tax_data["common taxas"], contrast_df)
 
         common_taxas = plot_common_taxas(
-            merged_taxas_df, output_path, facet_col="group"
+            merged_taxas_df,
+            output_path,
+            table_format,
+            max_bar_samples,
+            facet_col="group",
         )
         common_taxas.update_xaxes(matches=None)
 
         abund_div = plot_abund_div(
             merge_with_contrasts(tax_data["abund and div"], contrast_df),
             output_path,
+            table_format,
+            color="group",
+        )
+        alpha_metrics = plot_alpha_metrics(
+            merge_with_contrasts(tax_data["abund and div"], contrast_df),
+            max_bar_samples,
+            x="group",
             color="group",
         )
+        rarefaction = plot_rarefaction(
+            merge_with_contrasts(tax_data["rarefaction"], contrast_df),
+            output_path,
+            table_format,
+            max_bar_samples,
+        )
         if plot_beta_div:
             betadiv_pcoa = plot_beta_pcoa(
                 merge_with_contrasts(pcoa_embed, contrast_df, left_colname="sample"),
                 output_path,
+                table_format,
                 color="group",
             )
 
     else:
-        common_taxas = plot_common_taxas(tax_data["common taxas"], output_path)
+        common_taxas = plot_common_taxas(
+            tax_data["common taxas"], output_path, table_format, max_bar_samples
+        )
 
-        abund_div = plot_abund_div(tax_data["abund and div"], output_path)
+        abund_div = plot_abund_div(tax_data["abund and div"], output_path, table_format)
+        alpha_metrics = plot_alpha_metrics(tax_data["abund and div"], max_bar_samples)
+        rarefaction = plot_rarefaction(
+            tax_data["rarefaction"], output_path, table_format, max_bar_samples
+        )
         if plot_beta_div:
-            betadiv_pcoa = plot_beta_pcoa(pcoa_embed, output_path)
+            betadiv_pcoa = plot_beta_pcoa(pcoa_embed, output_path, table_format)
 
     common_taxas.update_traces(showlegend=False)
     common_taxas.update_layout(
@@ -215,6 +501,8 @@ def generate_taxo_plots(tax_data: Dict, contrast_df=None, output_path=None) -> D
         "assigned_plot": assigned_html,
         "common_taxas_plot": export_to_html(common_taxas, "taxas-plot"),
         "abund_div_plot": export_to_html(abund_div, "abund-div-plot"),
+        "alpha_metrics_plot": export_to_html(alpha_metrics, "alpha-metrics-plot"),
+        "rarefaction_plot": export_to_html(rarefaction, "rarefaction-plot"),
     }
 
     if plot_beta_div:
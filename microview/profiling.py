@@ -0,0 +1,178 @@
+"""
+MicroView module for profiling the time and memory spent in each stage
+"""
+
+import json
+import sys
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from time import perf_counter, process_time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from rich.table import Table
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def get_cpu_time() -> float:
+    """
+    Get the CPU time used by this process and its finished children, in seconds
+    """
+    if resource is None:
+        return process_time()
+
+    usage = [
+        resource.getrusage(who)
+        for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)
+    ]
+    return sum(u.ru_utime + u.ru_stime for u in usage)
+
+
+def get_max_rss() -> Optional[int]:
+    """
+    Get the maximum resident set size so far of this process or its largest
+    child, in bytes
+
+    Returns:
+        int: Maximum RSS since the process started, or None where it can't
+            be measured.
+    """
+    if resource is None:
+        return None
+
+    max_rss = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def measure(func: Callable, item) -> Tuple:
+    """
+    Apply a function to an item, measuring the time it takes
+
+    Being module-level, partial(measure, func) can be sent to
+    worker processes, where the maximum RSS is the worker's.
+
+    Args:
+        func (Callable): Function to apply
+        item: Item to apply it to
+
+    Returns:
+        tuple: The result of func and a dict with its 'wall_time',
+            'cpu_time' and the 'max_rss' of the process so far, after
+            running it.
+    """
+    wall_start, cpu_start = perf_counter(), process_time()
+    result = func(item)
+    timing = {
+        "wall_time": perf_counter() - wall_start,
+        "cpu_time": process_time() - cpu_start,
+        "max_rss": get_max_rss(),
+    }
+    return result, timing
+
+
+class Profiler:
+    """
+    Record the wall time, CPU time and max RSS of stages and parsed samples
+
+    CPU time includes worker processes once they've finished. Max RSS is
+    the high-water mark so far of the main process or its largest worker,
+    at the end of each stage, so it includes memory used by earlier stages.
+    """
+
+    def __init__(self):
+        self.stages: List[Dict] = []
+        self.samples: List[Dict] = []
+        self._start = perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Record the resources used inside a with block, as a stage
+        """
+        wall_start, cpu_start = perf_counter(), get_cpu_time()
+        try:
+            yield
+        finally:
+            self.stages.append(
+                {
+                    "name": name,
+                    "wall_time": perf_counter() - wall_start,
+                    "cpu_time": get_cpu_time() - cpu_start,
+                    "max_rss": get_max_rss(),
+                }
+            )
+
+    def record_sample(self, sample_name: str, timing: Dict) -> None:
+        """
+        Record the resources used to parse a sample, as measured by measure
+        """
+        self.samples.append({"name": sample_name, **timing})
+
+    def trace(self) -> Dict:
+        """
+        Get every record, as a JSON-serializable dict
+        """
+        return {
+            "wall_time": perf_counter() - self._start,
+            "max_rss": get_max_rss(),
+            "stages": self.stages,
+            "samples": self.samples,
+        }
+
+    def save(self, trace_path: Path) -> None:
+        """
+        Write the trace to a JSON file
+        """
+        Path(trace_path).write_text(json.dumps(self.trace(), indent=2))
+
+    def summary(self, n_slowest: int = 5) -> Table:
+        """
+        Summarize stages and the slowest parsed samples in a table
+        """
+        table = Table(title="Profile", title_justify="left")
+        table.add_column("Stage")
+        table.add_column("Wall time", justify="right")
+        table.add_column("CPU time", justify="right")
+        table.add_column("Max RSS so far", justify="right")
+
+        def add_row(name, record, style=None):
+            max_rss = record["max_rss"]
+            table.add_row(
+                name,
+                f"{record['wall_time']:.2f}s",
+                f"{record['cpu_time']:.2f}s",
+                "-" if max_rss is None else f"{max_rss / 1024**2:.0f} MB",
+                style=style,
+            )
+
+        for record in self.stages:
+            add_row(record["name"], record)
+
+        slowest = sorted(self.samples, key=lambda record: -record["wall_time"])
+        if len(slowest) > 0:
+            table.add_section()
+        for record in slowest[:n_slowest]:
+            add_row(f"  parse {record['name']}", record, style="dim")
+
+        return table
+
+
+def profile_stage(profiler: Optional[Profiler], name: str):
+    """
+    Record a stage if profiling, otherwise do nothing
+
+    Args:
+        profiler (Profiler): Profiler to record the stage with, if any
+        name (str): Name of the stage
+
+    Returns:
+        A context manager
+    """
+    return nullcontext() if profiler is None else profiler.stage(name)
@@ -0,0 +1,183 @@
+"""
+MicroView module for calculating rarefaction curves of samples
+"""
+
+from typing import List
+
+from numpy import (
+    arange,
+    array,
+    bincount,
+    concatenate,
+    diff,
+    errstate,
+    exp,
+    flatnonzero,
+    float64,
+    geomspace,
+    int64,
+    lexsort,
+    log1p,
+    maximum,
+    nan,
+    ndarray,
+    repeat,
+    unique,
+    zeros,
+)
+from pandas import DataFrame
+from scipy.sparse import csr_matrix
+from scipy.special import gammaln
+
+from microview.distance import row_sums
+
+# Number of depths rarefaction curves are calculated at, besides each sample's own
+DEFAULT_RAREFACTION_DEPTHS = 25
+
+# Number of counts by depths calculated at a time
+RAREFACTION_BLOCK_SIZE = 2**22
+
+# Log of the probability of missing a taxon below which it's taken as found
+LOG_NEGLIGIBLE = -40
+
+
+def rarefaction_depths(
+    totals: ndarray, n_depths: int = DEFAULT_RAREFACTION_DEPTHS
+) -> ndarray:
+    """
+    Get depths spread evenly on a log scale, from 1 read to the deepest sample
+
+    Args:
+        totals (ndarray): Number of reads of each sample
+        n_depths (int): Number of depths, fewer for shallow samples, since
+            depths are whole numbers of reads.
+
+    Returns:
+        ndarray: Increasing depths
+    """
+    if len(totals) == 0 or totals.max() < 1:
+        return zeros(0, dtype=int64)
+    return unique(geomspace(1, totals.max(), n_depths).round().astype(int64))
+
+
+def expected_richness(matrix: csr_matrix, depths: ndarray) -> ndarray:
+    """
+    Get the expected number of taxa of each sample when subsampled to some depths
+
+    A taxon with N_i of a sample's N reads is missed by a subsample of n
+    reads with hypergeometric probability C(N - N_i, n) / C(N, n), so the
+    expected number of taxa is the number observed minus the sum of those.
+    Binomial coefficients are taken as differences of log-gamma functions,
+    so they stay finite for deep samples.
+
+    Every count is evaluated at every depth at once, a block of samples at a
+    time. Taxa of a sample with the same count are evaluated once, and only
+    where (1 - n / N)^N_i, which bounds the probability, isn't negligible.
+
+    Args:
+        matrix (csr_matrix): Sample by taxon count matrix
+        depths (ndarray): Number of reads to subsample
+
+    Returns:
+        ndarray: Expected number of taxa of each sample (rows) at each depth
+            (columns), NaN at depths beyond the sample's own.
+    """
+    n_counts = diff(matrix.indptr)
+    totals = row_sums(matrix).astype(float64)
+    observed = matrix.getnnz(axis=1)
+    depths = depths.astype(float64)
+    richness = zeros((matrix.shape[0], len(depths)))
+
+    # Blocks of whole samples, with about RAREFACTION_BLOCK_SIZE counts by depths
+    block_counts = RAREFACTION_BLOCK_SIZE // max(len(depths), 1)
+    boundaries = matrix.indptr.searchsorted(
+        arange(0, matrix.nnz, max(block_counts, 1)), side="right"
+    )
+    boundaries = unique(concatenate([[0], boundaries - 1, [matrix.shape[0]]]))
+
+    for start, end in zip(boundaries, boundaries[1:]):
+        data = matrix.data[matrix.indptr[start] : matrix.indptr[end]]
+        block_totals = totals[start:end]
+
+        # Taxa of a sample with the same count are missed with the same probability
+        stride = int(data.max(initial=0)) + 1
+        keys, multiplicity = unique(
+            repeat(arange(end - start), n_counts[start:end]) * stride + data,
+            return_counts=True,
+        )
+        rows, counts = divmod(keys, stride)
+        rest = block_totals[rows] - counts
+
+        with errstate(divide="ignore", invalid="ignore"):
+            log_bound = log1p(-depths / block_totals[:, None])
+        pairs = flatnonzero(
+            (counts[:, None] * log_bound[rows] > LOG_NEGLIGIBLE)
+            & (depths <= rest[:, None])
+        )
+        pair, depth = divmod(pairs, len(depths))
+
+        # log C(N - N_i, n) - log C(N, n), with C(N, n) once per sample and depth
+        log_totals = (
+            gammaln(maximum(block_totals[:, None] - depths, 0) + 1)
+            - gammaln(block_totals + 1)[:, None]
+        )
+        log_missed = (
+            gammaln(rest + 1)[pair]
+            - gammaln(rest[pair] - depths[depth] + 1)
+            + log_totals[rows[pair], depth]
+        )
+        missed = bincount(
+            rows[pair] * len(depths) + depth,
+            multiplicity[pair] * exp(log_missed),
+            minlength=(end - start) * len(depths),
+        )
+        richness[start:end] = observed[start:end, None] - missed.reshape(
+            end - start, len(depths)
+        )
+
+    richness[depths > totals[:, None]] = nan
+    return richness
+
+
+def rarefaction_curves(
+    matrix: csr_matrix,
+    samples: List[str],
+    n_depths: int = DEFAULT_RAREFACTION_DEPTHS,
+) -> DataFrame:
+    """
+    Calculate the rarefaction curve of each sample
+
+    Curves share depths spread from 1 read to the deepest sample, see
+    rarefaction_depths, and each ends at its sample's own depth, where
+    every observed taxon is found.
+
+    Args:
+        matrix (csr_matrix): Sample by taxon count matrix
+        samples (List[str]): Name of the sample of each row
+        n_depths (int): Number of depths shared by every curve
+
+    Returns:
+        DataFrame: Long dataframe with the expected number of taxa
+            ('Expected Taxas') of each sample ('index') at each depth
+            ('Depth'), in order of sample and depth.
+    """
+    totals = row_sums(matrix)
+    depths = rarefaction_depths(totals, n_depths)
+    richness = expected_richness(matrix, depths)
+
+    # Shared depths below each sample's own, then the sample's own depth
+    rows, columns = (depths < totals[:, None]).nonzero()
+    rows = concatenate([rows, arange(len(samples))])
+    curve_depths = concatenate([depths[columns], totals])
+    expected = concatenate(
+        [richness[rows[: len(columns)], columns], matrix.getnnz(axis=1)]
+    )
+
+    order = lexsort((curve_depths, rows))
+    return DataFrame(
+        {
+            "index": array(samples, dtype=object)[rows[order]],
+            "Depth": curve_depths[order].astype(int64),
+            "Expected Taxas": expected[order].astype(float64),
+        }
+    )
@@ -1,14 +1,23 @@
+import os
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict
+from tempfile import NamedTemporaryFile
+from typing import Dict, Optional
+
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
 
 from microview import __version__
-from microview.templates import JINJA_ENV
+from microview.defaults import ASSET_MODES, DEFAULT_ASSETS_DIR
+from microview.templates import HERE, JINJA_ENV
 
 
+@lru_cache(maxsize=None)
 def embed_local_file(filename, filedir="templates"):
     """
     Embed local file into template
+
+    Files are read once per process, then served from memory.
     """
     herepath = Path(__file__).parent.resolve()
     fullpath = herepath.joinpath(filedir, filename)
@@ -17,33 +26,162 @@ def embed_local_file(filename, filedir="templates"):
         return f.read()
 
 
-def render_base(tax_plots: Dict, dir_path: Path, output_path: Path) -> None:
+@lru_cache(maxsize=None)
+def plotly_js() -> str:
     """
-    Render base template
+    Get the plotly.js bundle of the installed plotly, read once per process
+    """
+    return get_plotlyjs()
+
+
+def preload_assets() -> None:
+    """
+    Read every asset reports may embed, and compile the report templates
+
+    Rendering does this on first use; call it beforehand to keep that
+    cost out of the first report rendered in a long-running process.
+    """
+    for asset in (HERE / "assets").rglob("*"):
+        if asset.is_file():
+            embed_local_file(asset.relative_to(HERE).as_posix())
+    plotly_js()
+    JINJA_ENV.get_template("base.html")
+
+
+JINJA_ENV.globals["embed_local_file"] = embed_local_file
+JINJA_ENV.globals["plotly_js"] = plotly_js
+
+
+def write_if_changed(target: Path, content: bytes) -> None:
+    """
+    Write a file, unless it already has this content
+
+    The content is written to a temporary file next to the target, then
+    moved in place, so an interrupted write never leaves a truncated file.
+    """
+    if (
+        target.exists()
+        and target.stat().st_size == len(content)
+        and target.read_bytes() == content
+    ):
+        return
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with NamedTemporaryFile(
+        dir=target.parent, prefix=f".{target.name}.", delete=False
+    ) as f:
+        try:
+            f.write(content)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    # Temporary files are only readable by their owner, unlike the assets
+    os.chmod(f.name, 0o644)
+    os.replace(f.name, target)
+
+
+def write_assets(assets_dir: Path) -> None:
+    """
+    Write the stylesheets and scripts reports load to a shared directory
+
+    Files already written, with the same contents, are left as they are,
+    so many reports can share one copy of each. plotly.js is the bundle
+    shipped with the installed plotly, so it can always read the figures
+    plotly exports.
 
     Args:
-        tax_plots (dict): Dict containing results from
-            microview.plotting.generate_taxo_plots
-        dir_path (Path): Path to directory containing report files]
-        output_path (Path): Path to output file
+        assets_dir (Path): Directory to write assets to
+    """
+    source_dir = HERE / "assets"
+
+    for source in source_dir.rglob("*"):
+        if source.is_file():
+            write_if_changed(
+                Path(assets_dir) / source.relative_to(source_dir), source.read_bytes()
+            )
+
+    write_if_changed(
+        Path(assets_dir) / "js" / f"plotly-{get_plotlyjs_version()}.min.js",
+        plotly_js().encode("utf-8"),
+    )
+
+
+def render_report(
+    tax_plots: Dict,
+    dir_path: Path,
+    assets_url: Optional[str] = None,
+    include_mathjax: bool = True,
+):
     """
-    JINJA_ENV.globals["embed_local_file"] = embed_local_file
+    Render the report template, piece by piece
 
-    base_template = JINJA_ENV.get_template("base.html")
+    Args:
+        tax_plots (dict): Dict containing results from
+            microview.plotting.generate_taxo_plots
+        dir_path (Path): Path to directory containing report files
+        assets_url (str): URL to link stylesheets and scripts from,
+            or None to embed them.
+        include_mathjax (bool): Load MathJax, which no plot currently needs
 
+    Returns:
+        jinja2.environment.TemplateStream: Stream of the rendered report
+    """
     curr_time = datetime.now().strftime("%Y-%m-%d, %H:%M")
-    rendered_template = base_template.render(
+    return JINJA_ENV.get_template("base.html").stream(
         tax_plots=tax_plots,
         version=__version__,
         dir_path=str(dir_path.resolve()),
         curr_time=curr_time,
+        assets_url=assets_url,
+        plotly_version=get_plotlyjs_version(),
+        include_mathjax=include_mathjax,
     )
 
+
+def render_base(
+    tax_plots: Dict,
+    dir_path: Path,
+    output_path: Path,
+    assets: str = "embed",
+    assets_dir: Optional[Path] = None,
+    include_mathjax: bool = True,
+) -> None:
+    """
+    Render base template
+
+    Args:
+        tax_plots (dict): Dict containing results from
+            microview.plotting.generate_taxo_plots
+        dir_path (Path): Path to directory containing report files]
+        output_path (Path): Path to output file
+        assets (str): 'embed' to inline stylesheets and scripts in the report,
+            or 'external' to write them once to assets_dir and link to them.
+        assets_dir (Path): Directory to write shared assets to, by default
+            DEFAULT_ASSETS_DIR next to the report.
+        include_mathjax (bool): Load MathJax, which no plot currently needs
+    """
     result_path = (
         output_path
         if output_path.suffix == ".html"
         else output_path.with_suffix(".html")
     )
 
+    if assets == "external":
+        if assets_dir is None:
+            assets_dir = result_path.parent / DEFAULT_ASSETS_DIR
+        write_assets(assets_dir)
+        # Links are relative to the report, so reports and assets can be moved together
+        assets_url = Path(
+            os.path.relpath(Path(assets_dir).resolve(), result_path.parent.resolve())
+        ).as_posix()
+    elif assets == "embed":
+        assets_url = None
+    else:
+        raise ValueError(f"Unknown assets mode: {assets}")
+
+    stream = render_report(tax_plots, dir_path, assets_url, include_mathjax)
+
+    # Write the report as it's rendered, rather than building it in memory
     with open(result_path, "w", encoding="utf-8") as f:
-        f.write(rendered_template)
+        stream.dump(f)
@@ -0,0 +1,311 @@
+"""
+MicroView module for serving reports of any selection of samples on demand
+"""
+
+import json
+import mimetypes
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from pandas import DataFrame
+from plotly.offline import get_plotlyjs_version
+
+from microview.defaults import (
+    DEFAULT_HTML_CACHE_SIZE,
+    DEFAULT_MAX_BAR_SAMPLES,
+    DEFAULT_PCOA_DIMENSIONS,
+    DEFAULT_TOP_TAXA,
+)
+from microview.plotting import generate_taxo_plots
+from microview.rendering import plotly_js, preload_assets, render_report
+from microview.state import AggregateState, summarize_subset
+from microview.templates import HERE
+
+# URL reports link their stylesheets and scripts from
+ASSETS_URL = "/assets"
+
+
+class HTMLCache:
+    """
+    Least recently used cache of rendered reports, bounded by their total size
+    """
+
+    def __init__(self, max_size: int = DEFAULT_HTML_CACHE_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self._entries: OrderedDict = OrderedDict()
+        # Requests are handled in threads of their own
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key) -> Optional[bytes]:
+        """
+        Get a cached report, marking it as the most recently used
+        """
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+            return html
+
+    def put(self, key, html: bytes) -> None:
+        """
+        Cache a report, evicting the least recently used ones beyond max_size
+        """
+        with self._lock:
+            if key in self._entries:
+                self.size -= len(self._entries.pop(key))
+
+            self._entries[key] = html
+            self.size += len(html)
+
+            while self.size > self.max_size and len(self._entries) > 0:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class ReportServer(ThreadingHTTPServer):
+    """
+    HTTP server rendering reports from an aggregate state kept in memory
+
+    Endpoints:
+        GET /samples: JSON list of every sample name.
+        GET /report?samples=a,b&groups=x,y: Report of the given samples,
+            or of every sample without samples, optionally grouped.
+            GET / is the report of every sample.
+        POST /report: Same as GET, with a JSON body such as
+            {"samples": ["a", "b"], "groups": ["x", "y"]}.
+        GET /assets/...: Stylesheets and scripts reports link to.
+    """
+
+    def __init__(
+        self,
+        server_address: Tuple[str, int],
+        state: AggregateState,
+        dir_path: Path,
+        html_cache_size: int = DEFAULT_HTML_CACHE_SIZE,
+        pcoa_method: str = "auto",
+        pcoa_dimensions: int = DEFAULT_PCOA_DIMENSIONS,
+        max_bar_samples: int = DEFAULT_MAX_BAR_SAMPLES,
+        include_mathjax: bool = True,
+        top_taxa: int = DEFAULT_TOP_TAXA,
+        top_taxa_mode: str = "sample",
+    ):
+        super().__init__(server_address, ReportHandler)
+        self.state = state
+        self.dir_path = dir_path
+        self.html_cache = HTMLCache(html_cache_size)
+        self.pcoa_method = pcoa_method
+        self.pcoa_dimensions = pcoa_dimensions
+        self.max_bar_samples = max_bar_samples
+        self.include_mathjax = include_mathjax
+        self.top_taxa = top_taxa
+        self.top_taxa_mode = top_taxa_mode
+        # Each selection being rendered has a lock, so it's rendered only
+        # once, while other selections render alongside it
+        self._lock = Lock()
+        self._rendering: Dict[Tuple, Lock] = {}
+
+        preload_assets()
+
+    def render(
+        self, samples: Optional[List[str]] = None, groups: Optional[List[str]] = None
+    ) -> bytes:
+        """
+        Render the report of some samples, or get it from the cache
+
+        Args:
+            samples (List[str]): Names of the samples to include, in order,
+                every sample if None.
+            groups (List[str]): Group of each sample, if any.
+
+        Returns:
+            bytes: The report, UTF-8 encoded.
+
+        Raises:
+            ValueError: If a sample is unknown or repeated, or groups don't
+                match samples.
+        """
+        sample_index = self.state.counts.sample_index
+        if samples is None:
+            samples = self.state.counts.samples
+
+        unknown = [sample for sample in samples if sample not in sample_index]
+        if len(unknown) > 0:
+            raise ValueError(f"Unknown samples: {', '.join(unknown)}")
+        if len(samples) == 0:
+            raise ValueError("No samples selected")
+        if len(set(samples)) < len(samples):
+            raise ValueError("Samples must be selected only once")
+        if groups is not None and len(groups) != len(samples):
+            raise ValueError("There must be one group for each sample")
+
+        key = (tuple(samples), None if groups is None else tuple(groups))
+        html = self.html_cache.get(key)
+        if html is not None:
+            return html
+
+        with self._lock:
+            render_lock = self._rendering.setdefault(key, Lock())
+        try:
+            with render_lock:
+                return self._render_once(key, samples, groups)
+        finally:
+            with self._lock:
+                if self._rendering.get(key) is render_lock:
+                    del self._rendering[key]
+
+    def _render_once(
+        self, key: Tuple, samples: List[str], groups: Optional[List[str]]
+    ) -> bytes:
+        """
+        Render a report, unless a request for it rendered it meanwhile
+        """
+        html = self.html_cache.get(key)
+        if html is not None:
+            return html
+
+        sample_index = self.state.counts.sample_index
+        tax_data = summarize_subset(
+            self.state,
+            [sample_index[sample] for sample in samples],
+            self.pcoa_method,
+            self.pcoa_dimensions,
+            self.top_taxa,
+            self.top_taxa_mode,
+        )
+        contrast_df = (
+            None if groups is None else DataFrame({"sample": samples, "group": groups})
+        )
+        tax_plots = generate_taxo_plots(
+            tax_data, contrast_df, max_bar_samples=self.max_bar_samples
+        )
+        html = "".join(
+            render_report(tax_plots, self.dir_path, ASSETS_URL, self.include_mathjax)
+        ).encode("utf-8")
+
+        self.html_cache.put(key, html)
+        return html
+
+
+def read_asset(asset_path: str) -> Optional[bytes]:
+    """
+    Read a stylesheet or script reports link to
+
+    Args:
+        asset_path (str): Path of the asset, relative to ASSETS_URL
+
+    Returns:
+        bytes: Contents of the asset, or None if there's no such asset.
+    """
+    if asset_path == f"js/plotly-{get_plotlyjs_version()}.min.js":
+        return plotly_js().encode("utf-8")
+
+    assets_dir = HERE / "assets"
+    path = (assets_dir / asset_path).resolve()
+    if assets_dir not in path.parents or not path.is_file():
+        return None
+    return path.read_bytes()
+
+
+def is_string_list(value) -> bool:
+    """
+    Check if a value from a JSON body is a list of strings, or missing
+    """
+    return value is None or (
+        isinstance(value, list) and all(isinstance(item, str) for item in value)
+    )
+
+
+def split_param(values: Optional[List[str]]) -> Optional[List[str]]:
+    """
+    Split a comma-separated query parameter, possibly given more than once
+    """
+    if values is None:
+        return None
+    return [value for joined in values for value in joined.split(",") if value]
+
+
+class ReportHandler(BaseHTTPRequestHandler):
+    """
+    Handle requests to a ReportServer
+    """
+
+    server: ReportServer
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+
+        if url.path == "/samples":
+            self.send_body(
+                json.dumps(self.server.state.counts.samples).encode("utf-8"),
+                "application/json",
+            )
+        elif url.path in ["/", "/report"]:
+            query = parse_qs(url.query)
+            self.send_report(
+                split_param(query.get("samples")), split_param(query.get("groups"))
+            )
+        elif url.path.startswith(f"{ASSETS_URL}/"):
+            asset = read_asset(url.path[len(ASSETS_URL) + 1 :])
+            if asset is None:
+                self.send_error(HTTPStatus.NOT_FOUND)
+            else:
+                content_type, _ = mimetypes.guess_type(url.path)
+                self.send_body(asset, content_type or "application/octet-stream")
+        else:
+            self.send_error(HTTPStatus.NOT_FOUND)
+
+    def do_POST(self):
+        if urlsplit(self.path).path != "/report":
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            selection = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            selection = None
+        if not isinstance(selection, dict):
+            self.send_error(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+            return
+
+        samples, groups = selection.get("samples"), selection.get("groups")
+        for name, value in [("samples", samples), ("groups", groups)]:
+            if not is_string_list(value):
+                self.send_error(
+                    HTTPStatus.BAD_REQUEST, f"{name} must be a list of strings"
+                )
+                return
+
+        self.send_report(samples, groups)
+
+    def send_report(self, samples: Optional[List[str]], groups: Optional[List[str]]):
+        try:
+            html = self.server.render(samples, groups)
+        except ValueError as error:
+            # Sample names may not fit in a status line, so they go in the body
+            self.send_error(HTTPStatus.BAD_REQUEST, explain=str(error))
+            return
+        except Exception as error:
+            self.log_error("Could not render the report: %r", error)
+            self.send_error(
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+                explain=f"Could not render the report: {error}",
+            )
+            return
+        self.send_body(html, "text/html; charset=utf-8")
+
+    def send_body(self, body: bytes, content_type: str):
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
@@ -0,0 +1,321 @@
+"""
+MicroView module for persisting aggregate results between runs
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from numpy import (
+    arange,
+    array,
+    concatenate,
+    flatnonzero,
+    int64,
+    load,
+    ndarray,
+    savez,
+    zeros,
+)
+from pandas import DataFrame, concat, factorize
+from scipy.sparse import csr_matrix
+from scipy.sparse import vstack as sparse_vstack
+from scipy.spatial.distance import squareform
+
+from microview.cache import ReportCache
+from microview.defaults import DEFAULT_PCOA_DIMENSIONS, DEFAULT_TOP_TAXA
+from microview.distance import braycurtis_distances, braycurtis_rows
+from microview.file_finder import Sample, check_report_names
+from microview.parallel import thread_map
+from microview.parse_taxonomy import (
+    TaxonCounts,
+    calculate_alpha_diversity,
+    first_occurrences,
+    get_taxon_counts,
+    parse_reports,
+    summarize_tax_data,
+)
+from microview.profiling import Profiler
+
+# Bump whenever the saved arrays change shape
+STATE_FORMAT = 5
+
+
+@dataclass
+class AggregateState:
+    """
+    Aggregate results of every sample seen so far
+
+    Rows of the count matrix, of the alpha diversity table and of the
+    (square) distance matrix all follow the order of counts.samples.
+    Fingerprints hold the size and modification time of each sample's
+    report, so modified reports are recomputed.
+    """
+
+    counts: TaxonCounts
+    alpha: DataFrame
+    distances: ndarray
+    fingerprints: ndarray
+
+
+def fingerprint(sample: Sample) -> List[int]:
+    """
+    Get the size and modification time of a sample's report
+    """
+    stat = sample.report.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def save_state(
+    state: AggregateState, state_path: Path, rank: Optional[str] = None
+) -> None:
+    """
+    Save aggregate state to a .npz file
+
+    Args:
+        state (AggregateState): State to save
+        state_path (Path): Path to the state file
+        rank (str): Rank code counts were rolled up to, if any
+    """
+    with open(state_path, "wb") as f:
+        savez(
+            f,
+            format=STATE_FORMAT,
+            rank=rank or "",
+            **state.counts.to_arrays(),
+            alpha_columns=array(state.alpha.columns[1:], dtype=str),
+            alpha=state.alpha.iloc[:, 1:].to_numpy(dtype=float),
+            distances=squareform(state.distances, checks=False),
+            fingerprints=state.fingerprints,
+        )
+
+
+def load_state(
+    state_path: Path, rank: Optional[str] = None
+) -> Optional[AggregateState]:
+    """
+    Load aggregate state from a .npz file
+
+    Args:
+        state_path (Path): Path to the state file
+        rank (str): Rank code counts should be rolled up to, if any
+
+    Returns:
+        AggregateState: The saved state, or None if the file doesn't
+            exist, was saved in another format or at another rank.
+    """
+    if not Path(state_path).exists():
+        return None
+
+    with load(state_path) as saved:
+        if saved["format"] != STATE_FORMAT or saved["rank"] != (rank or ""):
+            return None
+
+        counts = TaxonCounts.from_arrays(saved)
+
+        alpha = DataFrame(saved["alpha"], columns=saved["alpha_columns"].tolist())
+        alpha.insert(0, "index", counts.samples)
+        alpha["N Taxas"] = alpha["N Taxas"].astype(int64)
+
+        return AggregateState(
+            counts=counts,
+            alpha=alpha,
+            distances=squareform(saved["distances"]),
+            fingerprints=saved["fingerprints"],
+        )
+
+
+def subset_state(state: AggregateState, rows) -> AggregateState:
+    """
+    Keep only some samples of an aggregate state
+    """
+    return AggregateState(
+        counts=TaxonCounts(
+            samples=[state.counts.samples[i] for i in rows],
+            taxids=state.counts.taxids,
+            names=state.counts.names,
+            matrix=state.counts.matrix[rows],
+        ),
+        alpha=state.alpha.iloc[rows].reset_index(drop=True),
+        distances=state.distances[rows][:, rows],
+        fingerprints=state.fingerprints[rows],
+    )
+
+
+def merge_counts(old: TaxonCounts, new: TaxonCounts) -> TaxonCounts:
+    """
+    Stack the rows of two count matrices, merging their taxon indexes
+
+    Taxa already in old keep their columns and names, new ones are appended.
+    """
+    columns, taxids = factorize(concatenate([old.taxids, new.taxids]))
+    new_columns = columns[len(old.taxids) :]
+    names = concatenate([old.names, new.names])[first_occurrences(columns)]
+
+    old_matrix = csr_matrix(
+        (old.matrix.data, old.matrix.indices, old.matrix.indptr),
+        shape=(old.matrix.shape[0], len(taxids)),
+    )
+    new_matrix = csr_matrix(
+        (new.matrix.data, new_columns[new.matrix.indices], new.matrix.indptr),
+        shape=(new.matrix.shape[0], len(taxids)),
+    )
+    new_matrix.sort_indices()
+
+    return TaxonCounts(
+        samples=old.samples + new.samples,
+        taxids=taxids.astype(int64),
+        names=names,
+        matrix=sparse_vstack([old_matrix, new_matrix], format="csr"),
+    )
+
+
+def update_state(
+    state: Optional[AggregateState],
+    samples: List[Sample],
+    jobs: int = 1,
+    cache: Optional[ReportCache] = None,
+    profiler: Optional[Profiler] = None,
+    rank: Optional[str] = None,
+) -> AggregateState:
+    """
+    Bring aggregate state up to date with the given samples
+
+    Samples already in the state, with unmodified reports, are reused as is.
+    Only the remaining k samples are parsed, getting their alpha diversity and
+    their distances to all N samples calculated, which is O(kN) instead of
+    the O(N^2) of calculating every pairwise distance.
+
+    Args:
+        state (AggregateState): Previously saved state, if any
+        samples (List[Sample]): Every sample the state should contain
+        jobs (int): Number of worker processes to parse reports with.
+        cache (ReportCache): Cache of previously parsed reports, if any.
+        profiler (Profiler): Profiler to record parsing with, if any.
+        rank (str): Rank code to roll Kraken-style counts up to, if any,
+            which must be the one the state was built with.
+
+    Returns:
+        AggregateState: State with every sample, in the order given.
+    """
+    check_report_names(sample.report for sample in samples)
+    sample_names = [sample.report.name for sample in samples]
+    fingerprints = array(thread_map(fingerprint, samples), dtype=int64)
+    fingerprints = fingerprints.reshape(len(samples), 2)
+
+    if state is not None:
+        current = dict(zip(sample_names, map(tuple, fingerprints)))
+        kept = [
+            i
+            for i, sample_name in enumerate(state.counts.samples)
+            if current.get(sample_name) == tuple(state.fingerprints[i])
+        ]
+        state = subset_state(state, kept)
+        state_samples = set(state.counts.samples)
+    else:
+        state_samples = set()
+
+    new_samples = [
+        sample for sample in samples if sample.report.name not in state_samples
+    ]
+
+    if len(new_samples) > 0:
+        new_counts = get_taxon_counts(
+            parse_reports(new_samples, jobs, cache, profiler), rank
+        )
+        new_alpha = calculate_alpha_diversity(new_counts)
+
+        if state is None or len(state.counts.samples) == 0:
+            counts, alpha = new_counts, new_alpha
+            n_old = 0
+        else:
+            counts = merge_counts(state.counts, new_counts)
+            alpha = concat([state.alpha, new_alpha], ignore_index=True)
+            n_old = len(state.counts.samples)
+
+        if n_old == 0:
+            # Nothing to reuse, calculate every pairwise distance in parallel
+            distances = braycurtis_distances(counts.matrix, jobs)
+        else:
+            new_rows = arange(n_old, len(counts.samples))
+            new_distances = braycurtis_rows(counts.matrix, new_rows)
+
+            distances = zeros((len(counts.samples), len(counts.samples)))
+            distances[:n_old, :n_old] = state.distances
+            distances[:, new_rows] = new_distances.T
+            distances[new_rows, :] = new_distances
+
+        state = AggregateState(
+            counts=counts,
+            alpha=alpha,
+            distances=distances,
+            fingerprints=zeros((len(counts.samples), 2), dtype=int64),
+        )
+
+    # Follow the order samples were given in
+    order = [state.counts.sample_index[sample_name] for sample_name in sample_names]
+    state = subset_state(state, order)
+    state.fingerprints = fingerprints
+
+    return state
+
+
+def drop_empty_taxa(counts: TaxonCounts) -> TaxonCounts:
+    """
+    Keep only the taxa with counts in some sample
+    """
+    present = flatnonzero(counts.matrix.getnnz(axis=0))
+    return TaxonCounts(
+        samples=counts.samples,
+        taxids=counts.taxids[present],
+        names=counts.names[present],
+        matrix=counts.matrix[:, present],
+    )
+
+
+def summarize_subset(
+    state: AggregateState,
+    rows,
+    pcoa_method: str = "auto",
+    pcoa_dimensions: int = DEFAULT_PCOA_DIMENSIONS,
+    top_taxa: int = DEFAULT_TOP_TAXA,
+    top_taxa_mode: str = "sample",
+) -> Dict:
+    """
+    Gather the results get_tax_data would give for some samples of a state
+
+    Only the PCoA is calculated, everything else is taken from the state.
+
+    Args:
+        state (AggregateState): State with every sample
+        rows (list): Indices of the samples to keep, in order
+        pcoa_method (str): 'exact', 'approximate' or 'auto', see
+            microview.ordination.run_pcoa
+        pcoa_dimensions (int): Number of PCoA axes calculated when approximating.
+        top_taxa (int): Number of most common taxa to show for each sample
+        top_taxa_mode (str): 'sample' or 'global', see
+            microview.parse_taxonomy.get_common_taxas
+
+    Returns:
+        dict: Dict with the same keys as microview.parse_taxonomy.get_tax_data
+    """
+    subset = subset_state(state, rows)
+    counts = drop_empty_taxa(subset.counts)
+
+    if len(counts.samples) > 1:
+        # Imported here, so parsing alone doesn't load scikit-bio
+        from skbio import DistanceMatrix
+
+        from microview.ordination import run_pcoa
+
+        betadiv_pcoa = run_pcoa(
+            DistanceMatrix(subset.distances, counts.samples),
+            pcoa_method,
+            pcoa_dimensions,
+        )
+    else:
+        betadiv_pcoa = None
+
+    return summarize_tax_data(
+        counts, subset.alpha, betadiv_pcoa, top_taxa, top_taxa_mode
+    )
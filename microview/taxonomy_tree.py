@@ -0,0 +1,148 @@
+"""
+MicroView module for taxonomy trees of Kraken-style reports
+"""
+
+from dataclasses import dataclass
+from typing import List
+
+from numpy import (
+    add,
+    argsort,
+    array,
+    concatenate,
+    full,
+    int32,
+    int64,
+    ndarray,
+    searchsorted,
+    split,
+    where,
+)
+
+
+@dataclass
+class TaxonTree:
+    """
+    Taxonomy tree of a report, as parent pointers in integer arrays
+
+    Nodes are in report order, where each node comes after its parent.
+    parents[i] is the position of node i's parent, or -1 for a root, and
+    depths[i] its indentation level. n_reads holds the reads assigned
+    directly to each node, not to its descendants.
+    """
+
+    taxids: ndarray
+    names: ndarray
+    ranks: ndarray
+    depths: ndarray
+    parents: ndarray
+    n_reads: ndarray
+
+    def __len__(self) -> int:
+        return len(self.taxids)
+
+
+def depth_levels(depths: ndarray) -> List[ndarray]:
+    """
+    Group node positions by depth, shallowest first, each group in report order
+    """
+    by_depth = argsort(depths, kind="stable")
+    boundaries = searchsorted(depths[by_depth], range(1, depths.max() + 1))
+    return split(by_depth, boundaries)
+
+
+def build_parents(depths: ndarray) -> ndarray:
+    """
+    Find the parent of each node from the indentation levels of a report
+
+    The parent of a node is the last node before it one level up,
+    found for a whole level at once.
+
+    Args:
+        depths (ndarray): Indentation level of each node, in report order
+
+    Returns:
+        ndarray: Position of each node's parent, or -1 for roots.
+    """
+    parents = full(len(depths), -1, dtype=int32)
+    if len(depths) == 0:
+        return parents
+
+    levels = depth_levels(depths)
+    for upper, nodes in zip(levels, levels[1:]):
+        if len(upper) == 0:
+            continue
+        preceding = searchsorted(upper, nodes) - 1
+        parents[nodes] = where(preceding >= 0, upper[preceding], -1)
+
+    return parents
+
+
+def build_tree(taxids, names, ranks, depths, n_reads) -> TaxonTree:
+    """
+    Build a taxonomy tree from the columns of a report
+
+    Args:
+        taxids: Taxonomy ID of each line
+        names: Taxon name of each line, without indentation
+        ranks: Rank code of each line
+        depths: Indentation level of each line
+        n_reads: Reads assigned directly to each line's taxon
+
+    Returns:
+        TaxonTree: The report's tree
+    """
+    depths = array(depths, dtype=int32)
+    return TaxonTree(
+        taxids=array(taxids, dtype=int64),
+        names=array(names, dtype=object),
+        ranks=array(ranks, dtype=str),
+        depths=depths,
+        parents=build_parents(depths),
+        n_reads=array(n_reads, dtype=int64),
+    )
+
+
+def concat_trees(trees: List[TaxonTree]) -> TaxonTree:
+    """
+    Join trees into a single forest, so they can all be processed at once
+    """
+    offsets = concatenate([[0], [len(tree) for tree in trees]]).cumsum()[:-1]
+    parents = concatenate(
+        [
+            where(tree.parents >= 0, tree.parents + offset, -1)
+            for tree, offset in zip(trees, offsets)
+        ]
+    )
+    return TaxonTree(
+        taxids=concatenate([tree.taxids for tree in trees]),
+        names=concatenate([tree.names for tree in trees]),
+        ranks=concatenate([tree.ranks for tree in trees]),
+        depths=concatenate([tree.depths for tree in trees]),
+        parents=parents.astype(int32),
+        n_reads=concatenate([tree.n_reads for tree in trees]),
+    )
+
+
+def clade_counts(tree: TaxonTree) -> ndarray:
+    """
+    Count the reads assigned to each node or to any of its descendants
+
+    A single bottom-up pass, a level at a time, adds the counts of
+    every node at a level to its parent's.
+
+    Args:
+        tree (TaxonTree): Tree, or forest, to count reads in
+
+    Returns:
+        ndarray: Clade read count of each node
+    """
+    counts = tree.n_reads.astype(int64)
+    if len(tree) == 0:
+        return counts
+
+    for nodes in reversed(depth_levels(tree.depths)):
+        nodes = nodes[tree.parents[nodes] >= 0]
+        add.at(counts, tree.parents[nodes], counts[nodes])
+
+    return counts
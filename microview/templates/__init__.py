@@ -4,10 +4,25 @@ MicroView module containing Jinja2 templates
 
 from pathlib import Path
 
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 
 HERE = Path(__file__).parent.resolve()
 
-JINJA_ENV = Environment(
-    loader=FileSystemLoader(str(HERE)),
-)
+JINJA_ENV = Environment(loader=FileSystemLoader(str(HERE)))
+
+
+def use_bytecode_cache(cache_dir: Path) -> None:
+    """
+    Keep compiled templates in a cache directory, shared between runs
+
+    Templates are compiled in memory otherwise. If the directory can't be
+    created, they still are.
+
+    Args:
+        cache_dir (Path): Directory to keep compiled templates in
+    """
+    try:
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    except OSError:
+        return
+    JINJA_ENV.bytecode_cache = FileSystemBytecodeCache(str(cache_dir))
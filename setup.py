@@ -51,13 +51,22 @@ setup(
     long_description=readme,
     long_description_content_type="text/markdown",
     include_package_data=True,
-    entry_points={"console_scripts": ["microview = microview.cli:main"]},
+    entry_points={
+        "console_scripts": [
+            "microview = microview.cli:main",
+            "microview-serve = microview.cli:serve",
+        ]
+    },
     keywords="metagenomics workflow visualization report",
     name="MicroView",
     packages=find_packages(include=["microview", "microview.*"]),
     test_suite="tests",
     tests_require=test_requirements,
-    extras_require={"dev": extra_requirements},
+    extras_require={
+        "dev": extra_requirements,
+        "zstd": ["zstandard"],
+        "parquet": ["pyarrow"],
+    },
     url="https://github.com/jvfe/microview",
     project_urls={
         "Bug Tracker": "https://github.com/jvfe/microview/issues",
@@ -1,25 +1,27 @@
-from collections import Counter, defaultdict
 from pathlib import Path
 
 import pytest
+from numpy import array
+from scipy.sparse import csr_matrix
+
+from microview.parse_taxonomy import SampleStats, TaxonCounts
 
 
 @pytest.fixture
 def parsed_stats():
     sample_stats = {
-        "sample1": defaultdict(
-            lambda: {"n_reads": 0, "percent": 0},
-            {"assigned": {"tax1": {"n_reads": 5, "percent": 1}}},
+        "sample1": SampleStats(
+            taxids=array([1]),
+            names=array(["tax1"], dtype=object),
+            n_reads=array([5]),
+            percent=array([1.0]),
         ),
-        "sample2": defaultdict(
-            lambda: {"n_reads": 0, "percent": 0},
-            {
-                "assigned": {
-                    "tax1": {"n_reads": 5, "percent": 0.33},
-                    "tax2": {"n_reads": 10, "percent": 0.66},
-                },
-                "unclassified": {"n_reads": 1, "percent": 0.01},
-            },
+        "sample2": SampleStats(
+            taxids=array([1, 2]),
+            names=array(["tax1", "tax2"], dtype=object),
+            n_reads=array([5, 10]),
+            percent=array([0.33, 0.66]),
+            unassigned={"unclassified": 1},
         ),
     }
 
@@ -28,10 +30,12 @@ def parsed_stats():
 
 @pytest.fixture
 def all_sample_counts():
-    counts = {
-        "sample1": Counter({"tax1": 5}),
-        "sample2": Counter({"tax1": 5, "tax2": 10}),
-    }
+    counts = TaxonCounts(
+        samples=["sample1", "sample2"],
+        taxids=array([1, 2]),
+        names=array(["tax1", "tax2"], dtype=object),
+        matrix=csr_matrix(array([[5, 0], [5, 10]])),
+    )
 
     return counts
 
@@ -46,6 +50,11 @@ def get_kaiju_data():
     return Path(__file__).parent.resolve() / "test_data" / "kaiju_test.txt"
 
 
+@pytest.fixture
+def get_kaiju_na_data():
+    return Path(__file__).parent.resolve() / "test_data" / "kaiju_test_na.txt"
+
+
 @pytest.fixture
 def get_centrifuge_data():
     return Path(__file__).parent.resolve() / "test_data" / "centrifuge_test.txt"
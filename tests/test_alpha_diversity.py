@@ -0,0 +1,59 @@
+import pytest
+from numpy import allclose, array, isnan
+from numpy.random import default_rng
+from scipy.sparse import csr_matrix
+from skbio.diversity import alpha
+
+from microview.alpha_diversity import alpha_diversity
+
+SKBIO_METRICS = {
+    "Shannon Diversity": alpha.shannon,
+    "N Taxas": alpha.observed_otus,
+    "Pielou Evenness": alpha.pielou_e,
+    "Simpson": alpha.simpson,
+    "Inverse Simpson": alpha.enspie,
+    "Berger-Parker": alpha.berger_parker_d,
+    "Chao1": alpha.chao1,
+    "ACE": alpha.ace,
+}
+
+
+def test_alpha_diversity():
+    rng = default_rng(0)
+    # Small counts, so there are singletons, doubletons and rare taxa
+    counts = rng.integers(1, 30, (20, 40))
+    counts[rng.random((20, 40)) > 0.5] = 0
+    counts[:, :2] = [2, 1]
+
+    metrics = alpha_diversity(csr_matrix(counts))
+
+    for metric, skbio_metric in SKBIO_METRICS.items():
+        expected = [skbio_metric(row) for row in counts]
+        assert allclose(metrics[metric], expected), metric
+
+
+def test_alpha_diversity_edge_cases():
+    matrix = csr_matrix(array([[7, 0, 0], [1, 1, 0], [12, 15, 0]]))
+
+    metrics = alpha_diversity(matrix, ["Pielou Evenness", "ACE"])
+
+    # A single taxon has no evenness, rather than NaN
+    assert metrics["Pielou Evenness"][0] == 0
+    # ACE has no estimate when every rare taxon is a singleton
+    assert isnan(metrics["ACE"][1])
+    # Nor anything to estimate without rare taxa
+    assert metrics["ACE"][2] == 2
+
+    with pytest.raises(ValueError):
+        alpha_diversity(matrix, ["Fisher"])
+
+
+def test_alpha_diversity_empty_rows():
+    matrix = csr_matrix(array([[0, 0, 0], [3, 1, 0]]))
+
+    metrics = alpha_diversity(matrix, ["Simpson", "Inverse Simpson"])
+
+    # A sample without reads has no dominance, rather than Simpson 1 and inf
+    assert isnan(metrics["Simpson"][0]) and isnan(metrics["Inverse Simpson"][0])
+    assert allclose(metrics["Simpson"][1], 0.375)
+    assert allclose(metrics["Inverse Simpson"][1], 1.6)
@@ -0,0 +1,50 @@
+import pytest
+from rich.console import Console
+
+from microview.batch import read_manifest, run_batch
+from microview.profiling import Profiler
+
+
+@pytest.fixture
+def manifest(get_kaiju_data, get_kraken_data, tmp_path):
+    manifest_path = tmp_path / "manifest.csv"
+    manifest_path.write_text(
+        "report,sample,output,group\n"
+        f"first,{get_kaiju_data},first/report.html,one\n"
+        f"first,{get_kraken_data},first/report.html,two\n"
+        f"second,{get_kraken_data},second/report.html,one\n"
+        f"second,{get_kaiju_data.with_name('kaiju_test_2.txt')},second/report.html,two\n"
+    )
+    return manifest_path
+
+
+def test_read_manifest(manifest, get_kraken_data, tmp_path):
+    reports = read_manifest(manifest)
+
+    assert [report.name for report in reports] == ["first", "second"]
+    assert reports[0].output == tmp_path / "first" / "report.html"
+    assert reports[1].samples[0] == get_kraken_data
+    assert reports[1].contrast_df()["group"].tolist() == ["one", "two"]
+
+
+def test_read_manifest_shared_output(manifest):
+    manifest.write_text(
+        manifest.read_text().replace("second/report.html", "first/other.html")
+    )
+
+    with pytest.raises(Exception, match="different directory"):
+        read_manifest(manifest)
+
+
+def test_run_batch(manifest, tmp_path):
+    profiler = Profiler()
+
+    outputs = run_batch(
+        read_manifest(manifest), manifest, Console(quiet=True), profiler=profiler
+    )
+
+    assert all(output.exists() for output in outputs)
+    # Three unique samples, each parsed once
+    assert len(profiler.samples) == 3
+    tables = tmp_path / "second" / "microview_tables"
+    assert (tables / "abund_diversity.tsv").read_text().count("\n") == 3
@@ -0,0 +1,67 @@
+from shutil import copy
+
+from microview import cache as cache_module
+from microview.cache import ReportCache
+from microview.file_finder import Sample, detect_report_type
+from microview.parse_taxonomy import parse_report, parse_reports
+
+
+def test_cache_roundtrip(tmp_path, get_kaiju_data):
+    report_cache = ReportCache(tmp_path / "cache")
+    _, stats = parse_report(Sample(report=get_kaiju_data, report_type="kaiju"))
+
+    report_cache.put(get_kaiju_data, "kaiju", stats)
+    report_cache.save()
+
+    reloaded = ReportCache(tmp_path / "cache")
+    entry = reloaded.get(get_kaiju_data)
+
+    assert reloaded.report_type(get_kaiju_data) == "kaiju"
+    assert list(entry["stats"].taxids) == list(stats.taxids)
+
+
+def test_cache_modified_report(tmp_path, get_kaiju_data, get_kraken_data):
+    report = tmp_path / "report.txt"
+    copy(get_kaiju_data, report)
+
+    report_cache = ReportCache(tmp_path / "cache")
+    parse_reports([Sample(report=report, report_type="kaiju")], cache=report_cache)
+
+    copy(get_kraken_data, report)
+    reloaded = ReportCache(tmp_path / "cache")
+
+    assert reloaded.get(report) is None
+
+
+def test_cache_version_invalidation(tmp_path, get_kaiju_data, monkeypatch):
+    samples = [Sample(report=get_kaiju_data, report_type="kaiju")]
+    parse_reports(samples, cache=ReportCache(tmp_path / "cache"))
+
+    monkeypatch.setattr(cache_module, "__version__", "0.0.0")
+    reloaded = ReportCache(tmp_path / "cache")
+
+    assert reloaded.get(get_kaiju_data) is None
+    assert list((tmp_path / "cache" / "entries").glob("*.pkl")) == []
+
+
+def test_cache_eviction(tmp_path, get_kaiju_data, get_kraken_data):
+    samples = [
+        Sample(report=get_kaiju_data, report_type="kaiju"),
+        Sample(report=get_kraken_data, report_type="kraken"),
+    ]
+    report_cache = ReportCache(tmp_path / "cache", max_size=0)
+    parse_reports(samples, cache=report_cache)
+
+    assert report_cache.index["entries"] == {}
+
+
+def test_detect_from_cache(tmp_path, get_kraken_data):
+    report_cache = ReportCache(tmp_path / "cache")
+    samples = detect_report_type([get_kraken_data], None, cache=report_cache)
+    parse_reports(samples, cache=report_cache)
+
+    cached = detect_report_type(
+        [get_kraken_data], None, cache=ReportCache(tmp_path / "cache")
+    )
+
+    assert cached == samples
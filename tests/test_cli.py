@@ -1,7 +1,17 @@
+import json
+import subprocess
+import sys
 from pathlib import Path
 
+import pytest
 from click.testing import CliRunner
+from pandas import read_parquet, read_table
+from plotly.offline import get_plotlyjs_version
 from microview import cli
+from microview.templates import JINJA_ENV
+
+# Microseconds importing the CLI may take, a fraction of what any stage's libraries take
+IMPORT_TIME_BUDGET = 500_000
 
 
 def test_with_source_table(get_contrast_data):
@@ -32,6 +42,43 @@ def test_with_path(get_contrast_data):
     assert output_path.exists()
 
 
+def test_with_jobs(get_contrast_data):
+    output_path = Path(__file__).parent.resolve() / "test_data" / "path_report.html"
+
+    if output_path.exists():
+        output_path.unlink()
+
+    command = f"-t {str(get_contrast_data.parent)} -o {str(output_path)} --jobs 2"
+
+    result = CliRunner().invoke(cli.main, command.split())
+
+    assert result.exit_code == 0
+    assert output_path.exists()
+
+
+def test_with_cache(get_contrast_data, tmp_path, monkeypatch):
+    # Compiled templates are cached in tmp_path too, only during this test
+    monkeypatch.setattr(JINJA_ENV, "bytecode_cache", None)
+    output_path = Path(__file__).parent.resolve() / "test_data" / "table_report.html"
+
+    command = (
+        f"-df {str(get_contrast_data)} -o {str(output_path)} "
+        f"--cache --cache-dir {str(tmp_path)}"
+    )
+
+    for _ in range(2):
+        if output_path.exists():
+            output_path.unlink()
+
+        result = CliRunner().invoke(cli.main, command.split())
+
+        assert result.exit_code == 0
+        assert output_path.exists()
+
+    # Both samples in the table have the same contents, so they share an entry
+    assert len(list(tmp_path.glob("entries/*.pkl"))) == 1
+
+
 def test_with_failing_table(get_failing_contrast_data):
     output_path = Path(__file__).parent.resolve() / "test_data" / "table_report.html"
 
@@ -44,3 +91,123 @@ def test_with_failing_table(get_failing_contrast_data):
 
     assert result.exit_code == 1
     assert output_path.exists() == False
+
+
+def test_with_profile_trace(get_contrast_data, tmp_path):
+    output_path = Path(__file__).parent.resolve() / "test_data" / "path_report.html"
+    trace_path = tmp_path / "trace.json"
+
+    command = (
+        f"-t {str(get_contrast_data.parent)} -o {str(output_path)} "
+        f"--profile-trace {str(trace_path)}"
+    )
+
+    result = CliRunner().invoke(cli.main, command.split())
+
+    assert result.exit_code == 0
+    trace = json.loads(trace_path.read_text())
+    assert [stage["name"] for stage in trace["stages"]][-2:] == [
+        "generate_taxo_plots",
+        "render_base",
+    ]
+    assert len(trace["samples"]) > 0
+    assert all("max_rss" in stage for stage in trace["stages"])
+
+
+def test_with_parquet_tables(get_contrast_data, tmp_path):
+    pytest.importorskip("pyarrow")
+    output_path = tmp_path / "report.html"
+
+    command = (
+        f"-df {str(get_contrast_data)} -o {str(output_path)} --table-format parquet"
+    )
+
+    result = CliRunner().invoke(cli.main, command.split())
+
+    assert result.exit_code == 0
+    tables = {path.name for path in (tmp_path / "microview_tables").iterdir()}
+    assert {"abund_diversity.parquet", "counts.parquet", "counts.npz"} <= tables
+    counts = read_parquet(tmp_path / "microview_tables" / "counts.parquet")
+    assert list(counts.columns) == ["sample", "taxid", "taxon", "reads"]
+
+
+def test_with_external_assets(get_contrast_data, tmp_path):
+    output_path = tmp_path / "reports" / "report.html"
+    output_path.parent.mkdir()
+    assets_dir = tmp_path / "assets"
+
+    command = (
+        f"-t {str(get_contrast_data.parent)} -o {str(output_path)} "
+        f"--assets external --assets-dir {str(assets_dir)} --no-mathjax"
+    )
+
+    result = CliRunner().invoke(cli.main, command.split())
+
+    assert result.exit_code == 0
+    plotly_js = f"js/plotly-{get_plotlyjs_version()}.min.js"
+    assert (assets_dir / plotly_js).exists()
+    report = output_path.read_text()
+    assert f'src="../assets/{plotly_js}"' in report
+    assert "MathJax" not in report
+    assert output_path.stat().st_size < 1024**2
+
+
+def test_with_manifest(get_kaiju_data, get_kraken_data, tmp_path):
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text(
+        "report,sample,output\n"
+        f"first,{get_kaiju_data},first/report.html\n"
+        f"first,{get_kraken_data},first/report.html\n"
+        f"second,{get_kraken_data},second/report.html\n"
+    )
+
+    result = CliRunner().invoke(cli.main, ["-m", str(manifest), "--jobs", "2"])
+
+    assert result.exit_code == 0
+    assert (tmp_path / "first" / "report.html").exists()
+    assert (tmp_path / "second" / "report.html").exists()
+
+
+def test_import_time():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import microview.cli"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    cumulative = {}
+    for line in result.stderr.splitlines()[1:]:
+        _, module_time, module = line.split("|")
+        cumulative[module.strip()] = int(module_time)
+
+    # Stages import these as they run
+    assert not {"pandas", "scipy", "skbio", "plotly", "frictionless"} & set(cumulative)
+    assert cumulative["microview.cli"] < IMPORT_TIME_BUDGET
+
+
+def test_with_rank(get_contrast_data, tmp_path):
+    output_path = tmp_path / "report.html"
+
+    command = f"-t {str(get_contrast_data.parent)} -o {str(output_path)} --rank g"
+
+    result = CliRunner().invoke(cli.main, command.split())
+
+    assert result.exit_code == 0
+    classified = (tmp_path / "microview_tables" / "classified_reads.tsv").read_text()
+    assert "above rank" in classified
+
+
+def test_with_top_taxa(get_contrast_data, tmp_path):
+    output_path = tmp_path / "report.html"
+
+    command = (
+        f"-t {str(get_contrast_data.parent)} -o {str(output_path)} "
+        "--top-taxa 3 --top-taxa-mode global"
+    )
+
+    result = CliRunner().invoke(cli.main, command.split())
+
+    assert result.exit_code == 0
+    common = read_table(tmp_path / "microview_tables" / "common_taxas.tsv")
+    assert common.groupby("index").size().eq(4).all()
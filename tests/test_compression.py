@@ -0,0 +1,73 @@
+import bz2
+import gzip
+import lzma
+
+import pytest
+
+from microview.compression import ThreadedReader, open_report
+from microview.file_finder import (
+    Sample,
+    detect_report_type,
+    find_reports,
+    validate_report_type,
+)
+from microview.parse_taxonomy import parse_report
+
+COMPRESSORS = {".gz": gzip.compress, ".bz2": bz2.compress, ".xz": lzma.compress}
+
+
+def compress_to(report, directory, suffix):
+    compressed = directory / f"{report.name}{suffix}"
+    if suffix == ".zst":
+        zstandard = pytest.importorskip("zstandard")
+        compressed.write_bytes(zstandard.compress(report.read_bytes()))
+    else:
+        compressed.write_bytes(COMPRESSORS[suffix](report.read_bytes()))
+    return compressed
+
+
+@pytest.mark.parametrize("suffix", [".gz", ".bz2", ".xz", ".zst"])
+def test_parse_compressed(tmp_path, get_kraken_data, get_kaiju_data, suffix):
+    for report, report_type in [(get_kraken_data, "kraken"), (get_kaiju_data, "kaiju")]:
+        compressed = compress_to(report, tmp_path, suffix)
+
+        samples = detect_report_type([compressed], None)
+        assert samples[0].report_type == report_type
+        assert validate_report_type(compressed) == report_type
+
+        _, expected = parse_report(Sample(report=report, report_type=report_type))
+        name, parsed = parse_report(samples[0])
+
+        assert name == compressed.name
+        assert list(parsed.taxids) == list(expected.taxids)
+        assert list(parsed.n_reads) == list(expected.n_reads)
+
+
+def test_find_compressed_reports(tmp_path, get_kraken_data, get_kaiju_data):
+    compress_to(get_kraken_data, tmp_path, ".gz")
+    compress_to(get_kaiju_data, tmp_path, ".bz2")
+
+    samples = find_reports(tmp_path, None)
+
+    assert sorted(sample.report.name for sample in samples) == [
+        "kaiju_test.txt.bz2",
+        "kraken_test.txt.gz",
+    ]
+
+
+def test_threaded_reader(tmp_path, get_kraken_data):
+    compressed = compress_to(get_kraken_data, tmp_path, ".gz")
+
+    with open_report(compressed, threaded=True) as f:
+        assert f.read() == get_kraken_data.read_bytes()
+
+
+def test_threaded_reader_close_early(tmp_path):
+    report = tmp_path / "large.txt.gz"
+    report.write_bytes(gzip.compress(b"0" * 10_000_000))
+
+    reader = ThreadedReader(gzip.open(report, "rb"), block_size=1024, max_blocks=2)
+    reader.read(10)
+    reader.close()
+
+    assert reader.closed
@@ -0,0 +1,50 @@
+from numpy import allclose, array
+from numpy.random import default_rng
+from scipy.sparse import csr_matrix
+from skbio.diversity import beta_diversity
+
+from microview.distance import (
+    braycurtis_condensed,
+    braycurtis_distances,
+    braycurtis_rows,
+)
+
+
+def random_counts(n_samples, n_taxa, seed=0):
+    rng = default_rng(seed)
+    counts = rng.integers(1, 100, (n_samples, n_taxa))
+    counts[rng.random((n_samples, n_taxa)) > 0.1] = 0
+    # Every sample needs at least one read
+    counts[:, 0] = 1
+    return csr_matrix(counts)
+
+
+def test_braycurtis_distances():
+    matrix = csr_matrix(
+        array([[5, 0, 3, 0], [5, 10, 0, 1], [0, 2, 2, 2], [1, 1, 1, 1]])
+    )
+
+    expected = beta_diversity(metric="braycurtis", counts=matrix.toarray())
+
+    assert allclose(braycurtis_distances(matrix), expected.data)
+
+
+def test_tiled_braycurtis():
+    matrix = random_counts(50, 200)
+
+    expected = beta_diversity(metric="braycurtis", counts=matrix.toarray())
+
+    assert allclose(
+        braycurtis_condensed(matrix, tile_size=7), expected.condensed_form()
+    )
+    assert allclose(
+        braycurtis_rows(matrix, [3, 40], tile_size=7), expected.data[[3, 40]]
+    )
+
+
+def test_parallel_braycurtis():
+    matrix = random_counts(30, 100)
+
+    condensed = braycurtis_condensed(matrix, jobs=2, tile_size=4)
+
+    assert allclose(condensed, braycurtis_condensed(matrix))
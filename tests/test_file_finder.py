@@ -1,9 +1,21 @@
+import shutil
+
+import pytest
+from rich.console import Console
+
 from microview.file_finder import (
+    Sample,
     detect_report_type,
+    discover_reports,
+    find_reports,
     get_validation_dict,
+    sniff_report_type,
     validate_paths,
+    validate_report_type,
 )
+from microview.parse_taxonomy import parse_reports
 from microview.schemas import contrast_table_schema
+from microview.state import update_state
 
 
 def test_detect_kraken(get_kraken_data):
@@ -47,3 +59,74 @@ def test_path_validation(get_kaiju_data, get_contrast_data):
     validated = validate_paths([get_kaiju_data], get_contrast_data)
 
     assert validated[0] == full_kaiju
+
+
+def test_sniff_matches_validation(get_kraken_data, get_kaiju_data, get_centrifuge_data):
+    for report in [get_kraken_data, get_kaiju_data, get_centrifuge_data]:
+        assert sniff_report_type(report) == validate_report_type(report)
+
+
+def test_sniff_invalid_report(get_contrast_data):
+    assert sniff_report_type(get_contrast_data) is None
+
+
+def test_detect_strict_validation(get_kaiju_data):
+    samples = detect_report_type(
+        [get_kaiju_data], Console(quiet=True), strict_validation=True
+    )
+
+    assert samples[0].report_type == "kaiju"
+    assert samples[0].detection_time > 0
+
+
+def test_path_validation_per_path(get_kaiju_data, get_contrast_data):
+    validated = validate_paths(
+        [get_kaiju_data, get_kaiju_data.relative_to(get_contrast_data.parent)],
+        get_contrast_data,
+    )
+
+    assert validated == [get_kaiju_data, get_kaiju_data]
+
+
+def test_path_validation_missing(get_kaiju_data, get_contrast_data):
+    with pytest.raises(Exception, match="missing.txt"):
+        validate_paths(
+            [get_kaiju_data, get_kaiju_data.with_name("missing.txt")], get_contrast_data
+        )
+
+
+def test_discover_reports(tmp_path):
+    for path in ["a.txt", "b.txt.gz", "notes.md", "run1/c.txt", "run1/tmp/d.txt"]:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).touch()
+
+    def names(reports):
+        return [report.relative_to(tmp_path).as_posix() for report in reports]
+
+    assert names(discover_reports(tmp_path)) == ["a.txt", "b.txt.gz"]
+    assert names(discover_reports(tmp_path, recursive=True, exclude=["tmp"])) == [
+        "a.txt",
+        "b.txt.gz",
+        "run1/c.txt",
+    ]
+    assert names(
+        discover_reports(tmp_path, recursive=True, include=["run1/*.txt"])
+    ) == ["run1/c.txt"]
+
+
+def test_reports_with_the_same_name(tmp_path, get_kaiju_data):
+    for run in ["run1", "run2"]:
+        (tmp_path / run).mkdir()
+        shutil.copyfile(get_kaiju_data, tmp_path / run / "report.txt")
+
+    with pytest.raises(Exception, match="different file names"):
+        find_reports(tmp_path, Console(quiet=True), recursive=True)
+
+    samples = [
+        Sample(report=tmp_path / run / "report.txt", report_type="kaiju")
+        for run in ["run1", "run2"]
+    ]
+    with pytest.raises(Exception, match="different file names"):
+        parse_reports(samples)
+    with pytest.raises(Exception, match="different file names"):
+        update_state(None, samples)
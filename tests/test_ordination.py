@@ -0,0 +1,41 @@
+from numpy import abs, allclose
+from numpy.random import default_rng
+from scipy.sparse import csr_matrix
+from skbio import DistanceMatrix
+from skbio.stats.ordination import pcoa
+
+from microview import ordination
+from microview.distance import braycurtis_distances
+from microview.ordination import approximate_pcoa, run_pcoa
+
+
+def get_distances(n_samples=40, n_taxa=60):
+    rng = default_rng(0)
+    counts = rng.integers(0, 50, (n_samples, n_taxa))
+    ids = [f"sample{i}" for i in range(n_samples)]
+    return DistanceMatrix(braycurtis_distances(csr_matrix(counts)), ids)
+
+
+def test_approximate_pcoa():
+    distances = get_distances()
+
+    exact = pcoa(distances)
+    approximate = approximate_pcoa(distances, dimensions=5)
+
+    assert list(approximate.samples.columns) == ["PC1", "PC2", "PC3", "PC4", "PC5"]
+    assert allclose(approximate.eigvals, exact.eigvals[:5])
+    # Axes are the same up to their sign
+    assert allclose(
+        abs(approximate.samples.to_numpy()), abs(exact.samples.iloc[:, :5].to_numpy())
+    )
+
+
+def test_run_pcoa_threshold(monkeypatch):
+    distances = get_distances()
+
+    assert run_pcoa(distances).samples.shape == (40, 40)
+    assert run_pcoa(distances, "approximate", 3).samples.shape == (40, 3)
+
+    monkeypatch.setattr(ordination, "APPROXIMATE_PCOA_THRESHOLD", 10)
+    assert run_pcoa(distances).samples.shape == (40, 10)
+    assert run_pcoa(distances, "exact").samples.shape == (40, 40)
@@ -1,32 +1,225 @@
+from numpy import arange, argsort, array
+from numpy.random import default_rng
+from pandas import concat
+from rich.console import Console
+from scipy.sparse import csr_matrix
+
+from microview.distance import row_sums
+from microview.file_finder import Sample, detect_report_type
 from microview.parse_taxonomy import (
+    ABOVE_RANK,
+    CATEGORY_TAXIDS,
+    NO_TAXID,
+    TaxonCounts,
     calculate_abund_diver,
     get_common_taxas,
     get_read_assignment,
     get_taxon_counts,
+    iter_kraken_records,
+    load_counts,
+    parse_kraken_report,
+    parse_report,
+    parse_reports,
+    save_counts,
 )
+from microview.taxonomy_tree import clade_counts
 
 
 def test_get_taxon_counts(parsed_stats):
     results = get_taxon_counts(parsed_stats)
 
-    assert results["sample1"]["tax1"] == 5
-    assert results["sample2"]["tax2"] == 10
+    assert results.matrix[0, results.taxon_index[1]] == 5
+    assert results.matrix[1, results.taxon_index[2]] == 10
+    assert results.matrix[0, results.taxon_index[CATEGORY_TAXIDS["unclassified"]]] == 0
+    assert list(results.names) == ["tax1", "tax2", "unclassified"]
 
 
 def test_build_taxonomy_stats(parsed_stats):
-    n_reads = get_read_assignment(parsed_stats)
+    n_reads = get_read_assignment(get_taxon_counts(parsed_stats))
 
     assert n_reads["sample2"]["assigned"] == 93.75
     assert n_reads["sample2"]["unassigned"] == 6.25
 
 
+def common_shares(most_common):
+    return most_common.set_index(["index", "variable"])["value"]
+
+
 def test_get_common_taxas(all_sample_counts):
-    most_common = get_common_taxas(all_sample_counts)
+    most_common = common_shares(get_common_taxas(all_sample_counts))
+
+    assert most_common["sample2", "tax2"] == 66.67
+    assert most_common["sample1", "other"] == 0
+
+
+def test_get_common_taxas_ties():
+    rng = default_rng(0)
+    matrix = csr_matrix(rng.integers(0, 4, size=(50, 30)))
+    counts = TaxonCounts(
+        samples=[f"sample{i}" for i in range(50)],
+        taxids=arange(30),
+        names=array([f"tax{i}" for i in range(30)], dtype=object),
+        matrix=matrix,
+    )
+
+    # Small counts tie often, and are broken as a stable sort would
+    most_common = common_shares(get_common_taxas(counts, top_taxa=3))
+    dense = matrix.toarray()
+    for i, sample in enumerate(counts.samples):
+        top = argsort(-dense[i], kind="stable")[:3]
+        expected = (dense[i, top] / dense[i].sum() * 100).round(2)
+        assert [most_common[sample, f"tax{j}"] for j in top] == list(expected)
+        assert len(most_common[sample]) == 4
+
+
+def test_get_common_taxas_global(all_sample_counts):
+    most_common = get_common_taxas(
+        all_sample_counts, top_taxa=1, top_taxa_mode="global"
+    )
+
+    # tax1 is the most abundant on average, so both samples show it
+    assert set(most_common["variable"]) == {"tax1", "other"}
+    assert common_shares(most_common)["sample2", "tax1"] == 33.33
+
+
+def test_taxa_sharing_a_name(all_sample_counts):
+    counts = TaxonCounts(
+        samples=all_sample_counts.samples,
+        taxids=array([1, 2]),
+        names=array(["environmental samples"] * 2, dtype=object),
+        matrix=all_sample_counts.matrix,
+    )
 
-    assert most_common["sample2"]["tax2"] == 66.67
+    # Taxa are told apart by taxonomy ID, and labelled apart by it too
+    most_common = common_shares(get_common_taxas(counts))
+    assert most_common["sample2", "environmental samples (2)"] == 66.67
+    assert most_common["sample2", "environmental samples (1)"] == 33.33
 
 
 def test_calculate_abund_diver(all_sample_counts):
     abund_div_df = calculate_abund_diver(all_sample_counts)
 
     assert round(abund_div_df[0]["Shannon Diversity"][1], 2) == 0.92
+
+
+def test_parallel_parse_reports(get_kraken_data, get_kaiju_data, get_centrifuge_data):
+    samples = [
+        Sample(report=get_kraken_data, report_type="kraken"),
+        Sample(report=get_kaiju_data, report_type="kaiju"),
+        Sample(report=get_centrifuge_data, report_type="kraken"),
+    ]
+
+    serial = parse_reports(samples)
+    parallel = parse_reports(samples, jobs=2)
+
+    assert list(parallel.keys()) == list(serial.keys())
+    for sample_name, sample_stats in serial.items():
+        assert (parallel[sample_name].taxids == sample_stats.taxids).all()
+        assert (parallel[sample_name].n_reads == sample_stats.n_reads).all()
+        assert parallel[sample_name].unassigned == sample_stats.unassigned
+
+
+def test_parse_kaiju(get_kaiju_data):
+    _, sample_stats = parse_report(Sample(report=get_kaiju_data, report_type="kaiju"))
+
+    assert sample_stats.taxids[0] == 1647474
+    assert sample_stats.names[0] == "Gordonia phage GTE6"
+    assert sample_stats.n_reads[0] == 19357
+    assert len(sample_stats.taxids) == len(sample_stats.n_reads)
+
+
+def test_parse_kaiju_without_taxid(get_kaiju_na_data):
+    sample = Sample(report=get_kaiju_na_data, report_type="kaiju")
+    assert detect_report_type([get_kaiju_na_data], Console(quiet=True)) == [sample]
+
+    _, sample_stats = parse_report(sample)
+
+    # Rows without a taxonomy ID are categories, named after the row
+    assert list(sample_stats.taxids) == [1647474, 12178]
+    assert sample_stats.unassigned == {
+        "unclassified": 100,
+        "cannot be assigned": 50,
+        "belong to a (non-viral) species with less than 1% of all reads": 100,
+    }
+
+    counts = get_taxon_counts({"sample": sample_stats})
+    assert counts.matrix[0, counts.taxon_index[NO_TAXID]] == 100
+    assert get_read_assignment(counts)["sample"]["unassigned"] == 15
+
+
+def test_parse_kraken(get_centrifuge_data):
+    _, sample_stats = parse_report(
+        Sample(report=get_centrifuge_data, report_type="kraken")
+    )
+
+    assert list(sample_stats.names) == ["root", "Siphoviridae"]
+    assert list(sample_stats.n_reads) == [1, 5]
+    assert sample_stats.unassigned == {"unclassified": 2165}
+
+
+def test_stream_kraken_records(get_kraken_data):
+    chunks = list(iter_kraken_records(get_kraken_data, chunk_size=10))
+
+    assert len(chunks) > 1
+    # Lines are kept while they or their descendants have reads
+    assert all((chunk["reads_root"] > 0).all() for chunk in chunks)
+
+    streamed = parse_kraken_report(chunks)
+    _, whole = parse_report(Sample(report=get_kraken_data, report_type="kraken"))
+
+    assert list(streamed.taxids) == list(whole.taxids)
+    assert list(streamed.n_reads) == list(whole.n_reads)
+
+
+def test_save_counts(all_sample_counts, tmp_path):
+    save_counts(all_sample_counts, tmp_path / "counts.npz")
+    loaded = load_counts(tmp_path / "counts.npz")
+
+    assert loaded.samples == all_sample_counts.samples
+    assert list(loaded.taxids) == list(all_sample_counts.taxids)
+    assert list(loaded.names) == list(all_sample_counts.names)
+    assert (loaded.matrix != all_sample_counts.matrix).nnz == 0
+    assert all_sample_counts.to_long()["reads"].tolist() == [5, 5, 10]
+
+
+def test_kraken_tree(get_kraken_data):
+    chunks = list(iter_kraken_records(get_kraken_data))
+    _, stats = parse_report(Sample(report=get_kraken_data, report_type="kraken"))
+    tree = stats.tree
+
+    # Siphoviridae is the parent of unclassified Siphoviridae
+    child = list(tree.names).index("unclassified Siphoviridae")
+    assert tree.names[tree.parents[child]] == "Siphoviridae"
+
+    # A bottom-up pass recovers the clade counts of the report
+    classified = concat(chunks).query("rank_code != 'U'")
+    assert list(clade_counts(tree)) == classified["reads_root"].tolist()
+
+
+def test_rollup_to_rank(get_kraken_data, get_kaiju_data):
+    parsed_stats = parse_reports(
+        [
+            Sample(report=get_kraken_data, report_type="kraken"),
+            Sample(report=get_kaiju_data, report_type="kaiju"),
+        ]
+    )
+    direct = get_taxon_counts(parsed_stats)
+    species = get_taxon_counts(parsed_stats, rank="S")
+    genera = get_taxon_counts(parsed_stats, rank="G")
+
+    # Reads are moved between taxa, never counted twice
+    assert (row_sums(species.matrix) == row_sums(direct.matrix)).all()
+    assert (row_sums(genera.matrix) == row_sums(direct.matrix)).all()
+
+    kraken = species.sample_index[get_kraken_data.name]
+    assert species.matrix[kraken, species.taxon_index[CATEGORY_TAXIDS[ABOVE_RANK]]] > 0
+    assert genera.matrix[kraken, genera.taxon_index[1623281]] == 2621
+    assert "above rank" in get_read_assignment(genera)[get_kraken_data.name]
+
+    # Kaiju tables are already at a single rank
+    def kaiju_counts(counts):
+        long = counts.to_long()
+        long = long[long["sample"] == get_kaiju_data.name]
+        return dict(zip(long["taxon"], long["reads"]))
+
+    assert kaiju_counts(species) == kaiju_counts(direct)
@@ -0,0 +1,63 @@
+from pandas import DataFrame
+
+from microview.plotting import bin_samples, plot_rarefaction
+
+
+def get_bars(n_samples):
+    return DataFrame(
+        {
+            "index": [f"s{i:02d}" for i in range(n_samples) for _ in range(2)],
+            "variable": ["tax1", "other"] * n_samples,
+            "value": [60.0, 40.0] * n_samples,
+        }
+    )
+
+
+def test_bin_samples():
+    bars = get_bars(10)
+
+    assert bin_samples(bars, max_samples=10) is bars
+
+    binned = bin_samples(bars, max_samples=3)
+
+    assert binned["index"].nunique() == 3
+    assert "s00 … s03 (n=4)" in set(binned["index"])
+    assert (binned.groupby("index")["value"].sum().round(6) == 100).all()
+
+
+def test_bin_samples_top():
+    bars = DataFrame(
+        {
+            "index": ["s1", "s1", "s2", "s2", "s3"],
+            "variable": ["tax1", "tax2", "tax3", "other", "tax1"],
+            "value": [50.0, 50.0, 90.0, 10.0, 100.0],
+            "group": ["a", "a", "a", "a", "b"],
+        }
+    )
+
+    binned = bin_samples(bars, max_samples=1, top=1)
+    group_a = binned[binned["group"] == "a"].set_index("variable")["value"]
+
+    assert group_a.to_dict() == {"tax3": 45.0, "other": 55.0}
+    assert binned[binned["group"] == "b"]["index"].tolist() == ["s3 … s3 (n=1)"]
+
+
+def test_plot_rarefaction():
+    curves = DataFrame(
+        {
+            "index": ["s1", "s1", "s1", "s2", "s2"],
+            "Depth": [1, 10, 20, 1, 5],
+            "Expected Taxas": [1.0, 3.2, 4.0, 1.0, 2.0],
+        }
+    )
+
+    assert len(plot_rarefaction(curves, None, max_samples=2).data) == 2
+
+    # Samples of a group are still drawn as lines of their own
+    grouped = curves.assign(group="one")
+    traces = plot_rarefaction(grouped, None, max_samples=2).data
+    assert [len(trace.x) for trace in traces] == [3, 2]
+
+    # Beyond max_samples, curves are a single line broken between samples
+    (trace,) = plot_rarefaction(curves, None, max_samples=1).data
+    assert len(trace.x) == 7
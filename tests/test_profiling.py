@@ -0,0 +1,40 @@
+from microview.file_finder import Sample
+from microview.parse_taxonomy import get_tax_data
+from microview.profiling import Profiler, profile_stage
+
+
+def test_profiler_stage():
+    profiler = Profiler()
+
+    with profile_stage(profiler, "sum"):
+        sum(range(10000))
+
+    with profile_stage(None, "ignored"):
+        pass
+
+    assert [record["name"] for record in profiler.stages] == ["sum"]
+    assert profiler.stages[0]["wall_time"] >= 0
+    assert profiler.stages[0]["cpu_time"] >= 0
+
+
+def test_profiled_tax_data(get_kraken_data, get_kaiju_data):
+    samples = [
+        Sample(report=get_kraken_data, report_type="kraken"),
+        Sample(report=get_kaiju_data, report_type="kaiju"),
+    ]
+    profiler = Profiler()
+
+    get_tax_data(samples, jobs=2, profiler=profiler)
+
+    stages = [record["name"] for record in profiler.stages]
+    assert stages == [
+        "parse_reports",
+        "get_taxon_counts",
+        "calculate_abund_diver",
+        "summarize_tax_data",
+    ]
+    assert [record["name"] for record in profiler.samples] == [
+        "kraken_test.txt",
+        "kaiju_test.txt",
+    ]
+    assert profiler.summary().row_count == len(stages) + len(samples)
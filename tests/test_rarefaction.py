@@ -0,0 +1,52 @@
+from math import comb
+
+from numpy import array, isnan
+from numpy.random import default_rng
+from scipy.sparse import csr_matrix
+
+from microview.rarefaction import expected_richness, rarefaction_curves
+
+
+def test_expected_richness():
+    rng = default_rng(0)
+    counts = rng.integers(1, 40, (20, 30))
+    counts[rng.random((20, 30)) > 0.4] = 0
+    depths = array([1, 3, 10, 50, 200, 400])
+
+    richness = expected_richness(csr_matrix(counts), depths)
+
+    for i, row in enumerate(counts):
+        total = row.sum()
+        for j, depth in enumerate(depths):
+            if depth > total:
+                assert isnan(richness[i, j])
+                continue
+            expected = sum(
+                1 - comb(total - count, depth) / comb(total, depth)
+                for count in row[row > 0]
+            )
+            assert abs(richness[i, j] - expected) < 1e-9
+
+
+def test_expected_richness_deep_samples():
+    # Deep enough for binomial coefficients to overflow floats
+    matrix = csr_matrix(array([[10**8, 10**6, 1, 1]]))
+
+    richness = expected_richness(matrix, array([1, 10**4, 10**8]))
+
+    # Log-gamma differences of deep samples are precise to about 1e-7
+    assert abs(richness[0, 0] - 1) < 1e-6
+    assert 2 < richness[0, 1] < 3
+    assert richness[0, 2] > 3.9
+
+
+def test_rarefaction_curves():
+    matrix = csr_matrix(array([[5, 0, 3, 1], [50, 10, 0, 1]]))
+
+    curves = rarefaction_curves(matrix, ["s1", "s2"])
+
+    # Each curve ends at its sample's depth, with every observed taxon
+    ends = curves.groupby("index").last()
+    assert ends.loc["s1", "Depth"] == 9
+    assert ends.loc["s2", "Expected Taxas"] == 3
+    assert curves.groupby("index")["Expected Taxas"].is_monotonic_increasing.all()
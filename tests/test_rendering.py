@@ -0,0 +1,49 @@
+from pathlib import Path
+
+from microview.rendering import (
+    embed_local_file,
+    preload_assets,
+    render_base,
+    write_assets,
+)
+from microview.templates import JINJA_ENV, use_bytecode_cache
+
+
+def test_render_base_reuses_assets(tmp_path):
+    preload_assets()
+    hits = embed_local_file.cache_info().hits
+
+    for name in ["first.html", "second.html"]:
+        render_base(tax_plots={}, dir_path=Path(tmp_path), output_path=tmp_path / name)
+
+    assert embed_local_file.cache_info().hits > hits
+    first = (tmp_path / "first.html").read_text()
+    assert first.rstrip().endswith("</html>")
+    assert len(first) == len((tmp_path / "second.html").read_text())
+
+
+def test_use_bytecode_cache(tmp_path, monkeypatch):
+    # Templates are only compiled to disk once a cache directory is given
+    assert JINJA_ENV.bytecode_cache is None
+    monkeypatch.setattr(JINJA_ENV, "bytecode_cache", None)
+
+    use_bytecode_cache(tmp_path / "templates")
+    JINJA_ENV.cache.clear()
+    JINJA_ENV.get_template("base.html")
+
+    assert len(list((tmp_path / "templates").iterdir())) > 0
+
+
+def test_write_assets_replaces_stale_files(tmp_path):
+    write_assets(tmp_path)
+    written = {path: path.read_bytes() for path in tmp_path.rglob("*.*")}
+
+    # A truncated plotly.js and a same-size edit of a stylesheet are rewritten
+    plotly_path = next(tmp_path.glob("js/plotly-*.min.js"))
+    plotly_path.write_bytes(written[plotly_path][:100])
+    stylesheet = next(tmp_path.rglob("*.css"))
+    stylesheet.write_bytes(b" " * len(written[stylesheet]))
+
+    write_assets(tmp_path)
+
+    assert {path: path.read_bytes() for path in tmp_path.rglob("*.*")} == written
@@ -0,0 +1,138 @@
+import json
+from threading import Event, Thread
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+from rich.console import Console
+
+from microview import serve
+from microview.file_finder import find_reports
+from microview.serve import HTMLCache, ReportServer
+from microview.state import update_state
+
+
+@pytest.fixture
+def report_server(get_kaiju_data):
+    samples = find_reports(get_kaiju_data.parent, Console(quiet=True))
+    server = ReportServer(
+        ("127.0.0.1", 0), update_state(None, samples), get_kaiju_data.parent
+    )
+    server.RequestHandlerClass.log_message = lambda *args: None
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    host, port = server.server_address[:2]
+    yield server, f"http://{host}:{port}"
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_html_cache():
+    cache = HTMLCache(max_size=10)
+    cache.put("first", b"12345")
+    cache.put("second", b"12345")
+    cache.get("first")
+    cache.put("third", b"12345")
+
+    assert cache.get("second") is None
+    assert cache.get("first") == b"12345"
+    assert len(cache) == 2 and cache.size == 10
+
+
+def test_serve_samples(report_server):
+    server, url = report_server
+
+    with urlopen(f"{url}/samples") as response:
+        assert json.load(response) == server.state.counts.samples
+
+
+def test_serve_report(report_server):
+    server, url = report_server
+    query = "samples=kaiju_test.txt,kraken_test.txt&groups=one,two"
+
+    for _ in range(2):
+        with urlopen(f"{url}/report?{query}") as response:
+            html = response.read().decode()
+
+    assert len(server.html_cache) == 1
+    assert "betadiv_pcoa" in html
+
+    plotly_src = html.split('src="/assets/')[-1].split('"')[0]
+    with urlopen(f"{url}/assets/{plotly_src}") as response:
+        assert len(response.read()) > 0
+
+
+def test_serve_post_report(report_server):
+    _, url = report_server
+    body = json.dumps({"samples": ["kaiju_test.txt"]}).encode()
+
+    with urlopen(Request(f"{url}/report", data=body)) as response:
+        assert response.headers["Content-Type"].startswith("text/html")
+
+
+def test_serve_unknown_sample(report_server):
+    _, url = report_server
+
+    with pytest.raises(HTTPError) as error:
+        urlopen(f"{url}/report?samples=missing.txt")
+
+    assert error.value.code == 400
+
+
+@pytest.mark.parametrize(
+    "selection",
+    [{"samples": [1]}, {"samples": [["kaiju_test.txt"]]}, {"samples": "abc"}, []],
+)
+def test_serve_post_invalid_selection(report_server, selection):
+    _, url = report_server
+    body = json.dumps(selection).encode()
+
+    with pytest.raises(HTTPError) as error:
+        urlopen(Request(f"{url}/report", data=body))
+
+    assert error.value.code == 400
+
+
+def test_serve_render_error(report_server, monkeypatch):
+    server, url = report_server
+
+    def render(samples, groups):
+        raise RuntimeError("no plots")
+
+    monkeypatch.setattr(server, "render", render)
+
+    with pytest.raises(HTTPError) as error:
+        urlopen(f"{url}/report")
+
+    assert error.value.code == 500
+    assert "no plots" in error.value.read().decode()
+
+
+def test_serve_cached_report_during_render(report_server, monkeypatch):
+    _, url = report_server
+    with urlopen(f"{url}/report?samples=kaiju_test.txt") as response:
+        cached = response.read()
+
+    started, finish = Event(), Event()
+    summarize_subset = serve.summarize_subset
+
+    def slow_summarize_subset(*args, **kwargs):
+        started.set()
+        finish.wait(10)
+        return summarize_subset(*args, **kwargs)
+
+    monkeypatch.setattr(serve, "summarize_subset", slow_summarize_subset)
+    slow = Thread(target=urlopen, args=(f"{url}/report?samples=kraken_test.txt",))
+    slow.start()
+    started.wait(10)
+
+    try:
+        # Served from the cache, without waiting for the other report
+        with urlopen(f"{url}/report?samples=kaiju_test.txt", timeout=5) as response:
+            assert response.read() == cached
+        assert slow.is_alive()
+    finally:
+        finish.set()
+        slow.join()
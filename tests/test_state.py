@@ -0,0 +1,68 @@
+from numpy import allclose
+
+from microview.distance import braycurtis_distances
+from microview.file_finder import Sample
+from microview.parse_taxonomy import (
+    get_tax_data,
+    get_taxon_counts,
+    parse_reports,
+)
+from microview.state import load_state, update_state
+
+
+def get_samples(kraken, kaiju, centrifuge):
+    return [
+        Sample(report=kraken, report_type="kraken"),
+        Sample(report=kaiju, report_type="kaiju"),
+        Sample(report=centrifuge, report_type="kraken"),
+    ]
+
+
+def test_incremental_state(
+    tmp_path, get_kraken_data, get_kaiju_data, get_centrifuge_data
+):
+    samples = get_samples(get_kraken_data, get_kaiju_data, get_centrifuge_data)
+    state_path = tmp_path / "state.npz"
+
+    get_tax_data(samples[:2], state_path=state_path)
+    incremental = get_tax_data(samples, state_path=state_path)
+    full = get_tax_data(samples)
+
+    assert allclose(
+        incremental["abund and div"].iloc[:, 1:].to_numpy(dtype=float),
+        full["abund and div"].iloc[:, 1:].to_numpy(dtype=float),
+    )
+    assert allclose(
+        incremental["beta div"].proportion_explained,
+        full["beta div"].proportion_explained,
+    )
+
+    state = load_state(state_path)
+    counts = get_taxon_counts(parse_reports(samples))
+
+    assert state.counts.samples == counts.samples
+    assert allclose(state.distances, braycurtis_distances(counts.matrix))
+
+
+def test_state_drops_removed_samples(
+    tmp_path, get_kraken_data, get_kaiju_data, get_centrifuge_data
+):
+    samples = get_samples(get_kraken_data, get_kaiju_data, get_centrifuge_data)
+
+    state = update_state(None, samples)
+    state = update_state(state, samples[1:])
+
+    assert state.counts.samples == [sample.report.name for sample in samples[1:]]
+    assert state.distances.shape == (2, 2)
+
+
+def test_state_keeps_its_rank(
+    tmp_path, get_kraken_data, get_kaiju_data, get_centrifuge_data
+):
+    samples = get_samples(get_kraken_data, get_kaiju_data, get_centrifuge_data)
+    state_path = tmp_path / "state.npz"
+
+    get_tax_data(samples, state_path=state_path, rank="S")
+
+    assert load_state(state_path, rank="S") is not None
+    assert load_state(state_path) is None